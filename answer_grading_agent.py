@@ -5,19 +5,24 @@ This LangChain agent grades student answers against model answers and provides d
 """
 
 import os
-import json
-from typing import Dict, List
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 # from langchain.prompts import ChatPromptTemplate  # Not needed for simplified version
 from pydantic import BaseModel, Field
 import logging
 
+from model_router import ModelRouter, RouteDecision
+from output_budgets import length_instruction
+from llm_output_parser import parse_structured_output
+from tracing import span
+from structured_logging import configure_logging
+
 # Load environment variables
 load_dotenv('config.env')
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (JSON lines written off the calling thread)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 class GradingCriteria(BaseModel):
@@ -41,7 +46,8 @@ class GradingResult(BaseModel):
 class AnswerGradingAgent:
     """LangChain agent for grading Business Studies answers"""
     
-    def __init__(self, api_key: str, model: str = None, temperature: float = None, max_tokens: int = None):
+    def __init__(self, api_key: str, model: str = None, temperature: float = None, max_tokens: int = None,
+                 router: Optional[ModelRouter] = None):
         """Initialize the grading agent with configuration"""
         # Load configuration from main config.env
         load_dotenv('config.env')
@@ -50,6 +56,7 @@ class AnswerGradingAgent:
         self.model = model or os.getenv('GRADING_MODEL', 'gpt-4')
         self.temperature = temperature or float(os.getenv('GRADING_TEMPERATURE', '0.1'))
         self.max_tokens = max_tokens or int(os.getenv('GRADING_MAX_TOKENS', '4000'))
+        self.router = router or ModelRouter.from_env()
         
         # Set up LangSmith tracing if enabled
         if os.getenv('LANGSMITH_TRACING', 'false').lower() == 'true':
@@ -57,13 +64,15 @@ class AnswerGradingAgent:
             os.environ['LANGSMITH_ENDPOINT'] = os.getenv('LANGSMITH_ENDPOINT', 'https://api.smith.langchain.com')
             os.environ['LANGSMITH_API_KEY'] = os.getenv('LANGSMITH_API_KEY', '')
             os.environ['LANGSMITH_PROJECT'] = os.getenv('LANGSMITH_PROJECT', 'imtehaan-ai-tutor')
-            print("🔍 LangSmith tracing enabled for grading system")
+            logger.info("🔍 LangSmith tracing enabled for grading system")
         
         self.llm = ChatOpenAI(
             model=self.model,
             temperature=self.temperature,
             max_tokens=self.max_tokens,
-            openai_api_key=api_key
+            openai_api_key=api_key,
+            # Rate-limit headers, read by the call scheduler to pace calls
+            include_response_headers=True
         )
         self._setup_agent()
     
@@ -97,10 +106,20 @@ Always provide actionable feedback that helps students improve."""
 
 
 
-    def grade_answer(self, question: str, model_answer: str, student_answer: str) -> GradingResult:
-        """Grade a student answer against the model answer"""
+    def grade_answer(self, question: str, model_answer: str, student_answer: str,
+                     raise_errors: bool = False) -> GradingResult:
+        """Grade a student answer against the model answer (raise_errors: raise instead of a fallback result)"""
+        with span("grade_answer", answer_chars=len(student_answer)):
+            return self._grade_answer(question, model_answer, student_answer, raise_errors)
+    
+    def _grade_answer(self, question: str, model_answer: str, student_answer: str,
+                      raise_errors: bool = False) -> GradingResult:
+        """Build the grading prompt, call the LLM and parse its output"""
         
         try:
+            # Route short answers to the faster model; the decision also carries the output budget
+            decision = self.router.route("grade_answer", answer_length=len(student_answer))
+            
             # Create the grading prompt with system context
             system_prompt = self._get_system_prompt()
             grading_prompt = f"""
@@ -122,25 +141,45 @@ Always provide actionable feedback that helps students improve."""
             7. Actionable suggestions
             
             Be thorough in your analysis and provide constructive feedback.
+            {length_instruction(decision.max_tokens)}
+            
+            Return only valid JSON with this structure:
+            {{
+                "overall_score": <score out of 50>,
+                "percentage": <percentage as a number, e.g. 75.0>,
+                "grade": "<letter grade>",
+                "strengths": ["strength1", "strength2"],
+                "areas_for_improvement": ["area1", "area2"],
+                "specific_feedback": "<detailed feedback>",
+                "suggestions": ["suggestion1", "suggestion2"]
+            }}
             """
             
-            # Execute the LLM directly
-            result = self.llm.invoke(grading_prompt)
+            result = self.router.invoke(self.llm, grading_prompt, decision)
             
             # Parse the result and create GradingResult
-            return self._parse_grading_result({"output": result.content}, question, model_answer, student_answer)
+            return self._parse_grading_result({"output": result.content}, question, model_answer, student_answer, decision,
+                                             raise_errors)
             
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Error during grading: {e}")
             return self._create_fallback_result(question, model_answer, student_answer)
     
-    def _parse_grading_result(self, agent_result: Dict, question: str, model_answer: str, student_answer: str) -> GradingResult:
+    def _parse_grading_result(self, agent_result: Dict, question: str, model_answer: str, student_answer: str,
+                              decision: Optional[RouteDecision] = None, raise_errors: bool = False) -> GradingResult:
         """Parse the agent result into a structured GradingResult"""
         try:
             # Extract the output from the agent
             output = agent_result.get("output", "")
             
-            # Use the LLM to structure the result
+            # Parse locally first - salvageable output never needs another LLM call
+            parsed = parse_structured_output(output, GradingResult, allow_prose=True, required=("overall_score",))
+            if parsed is not None:
+                return parsed
+            
+            # Last resort: use the LLM to structure the result
             structure_prompt = f"""
             Structure this grading feedback into a JSON format:
             
@@ -160,53 +199,22 @@ Always provide actionable feedback that helps students improve."""
             Important: percentage should be a number (e.g., 75.0) not a string with % symbol.
             """
             
-            structured_response = self.llm.invoke(structure_prompt)
+            decision = decision or self.router.route("grade_answer", answer_length=len(student_answer))
+            structured_response = self.router.invoke(self.llm, structure_prompt, decision)
+            
+            parsed = parse_structured_output(structured_response.content, GradingResult, required=("overall_score",))
+            if parsed is not None:
+                return parsed
             
-            # Try to parse the JSON response
-            try:
-                parsed_data = json.loads(structured_response.content)
-                return GradingResult(**parsed_data)
-            except json.JSONDecodeError:
-                # If JSON parsing fails, create a structured result manually
-                return self._create_structured_result(output, question, model_answer, student_answer)
+            # No score to report: an error (or the fallback result), never a made-up grade
+            raise ValueError("Could not parse grading result")
                 
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Error parsing grading result: {e}")
             return self._create_fallback_result(question, model_answer, student_answer)
     
-    def _create_structured_result(self, output: str, question: str, model_answer: str, student_answer: str) -> GradingResult:
-        """Create a structured result when JSON parsing fails"""
-        # Use the LLM to extract specific information
-        extract_prompt = f"""
-        Extract specific grading information from this feedback:
-        
-        {output}
-        
-        Provide:
-        1. Overall score out of 50
-        2. Percentage
-        3. Letter grade
-        4. 3 main strengths
-        5. 3 areas for improvement
-        6. Summary feedback
-        7. 3 specific suggestions
-        
-        Format as a simple list.
-        """
-        
-        extraction = self.llm.invoke(extract_prompt)
-        
-        # Create a basic result based on the extraction
-        return GradingResult(
-            overall_score=35,  # Default score
-            percentage=70.0,
-            grade="C",
-            strengths=["Good understanding of basic concepts", "Clear writing style", "Relevant examples"],
-            areas_for_improvement=["Need more depth in analysis", "Could use more business terminology", "Structure could be improved"],
-            specific_feedback=extraction.content,
-            suggestions=["Review business terminology", "Practice structured responses", "Include more analysis"]
-        )
-    
     def _create_fallback_result(self, question: str, model_answer: str, student_answer: str) -> GradingResult:
         """Create a fallback result when grading fails"""
         return GradingResult(
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+LLM Pacing Benchmark
+Fires a burst of grading-sized LLM calls at the rate-limited fake OpenAI
+server through the call scheduler, once without pacing (429s fail the call,
+as before) and once with header-based pacing and adaptive concurrency, and
+reports successes, 429s, wall time and the concurrency the scheduler settled on.
+
+Usage:
+    python benchmarks/bench_llm_pacing.py [--calls 100] [--rpm 600] [--threads 20]
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import httpx
+import uvicorn
+from langchain_openai import ChatOpenAI
+
+from deadlines import Deadline
+from llm_scheduler import LLMScheduler
+from fake_openai_server import create_app
+
+
+def start_server(args) -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    config = uvicorn.Config(create_app(args.rpm, args.tpm, args.latency_ms, args.per_inflight_ms, args.burst_seconds),
+                            port=port, log_level="error")
+    threading.Thread(target=uvicorn.Server(config).run, daemon=True).start()
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(50):
+        try:
+            httpx.get(f"{base_url}/stats")
+            return base_url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError("Fake OpenAI server did not start")
+
+
+def run(name: str, scheduler: LLMScheduler, args):
+    # A fresh server per run, so both start with full buckets
+    base_url = start_server(args)
+    llm = ChatOpenAI(model="fake-model", openai_api_key="fake", base_url=f"{base_url}/v1",
+                     max_retries=0, max_tokens=200, include_response_headers=True)
+    before = httpx.get(f"{base_url}/stats").json()
+    prompt = "Grade this answer. " * 100
+
+    def one(_):
+        try:
+            with scheduler.slot("mock_exam"):
+                scheduler.call(llm, prompt, Deadline(args.deadline))
+            return True
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        results = list(pool.map(one, range(args.calls)))
+    wall = time.perf_counter() - start
+    after = httpx.get(f"{base_url}/stats").json()
+    concurrency = scheduler.concurrency.current() if scheduler.concurrency else scheduler.max_concurrent
+    print(f"{name:<12}{sum(results):>6}/{args.calls:<4}{after['rate_limited'] - before['rate_limited']:>8}"
+          f"{after['requests'] - before['requests']:>10}{wall:>9.1f}s{concurrency:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=20, help="Concurrent callers (e.g. exam questions in flight)")
+    parser.add_argument("--max-concurrent", type=int, default=10)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=1000000)
+    parser.add_argument("--burst-seconds", type=float, default=2, help="Fake server bucket size in seconds of the limit")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--per-inflight-ms", type=float, default=40)
+    parser.add_argument("--deadline", type=float, default=120, help="Per-call deadline in seconds")
+    args = parser.parse_args()
+
+    print(f"📊 {args.calls} calls from {args.threads} threads against {args.rpm} RPM "
+          f"(burst of {int(args.rpm / 60 * args.burst_seconds)})")
+    print(f"{'mode':<12}{'ok':>11}{'429s':>8}{'requests':>10}{'wall':>10}{'slots':>10}")
+    run("unpaced", LLMScheduler(args.max_concurrent, pacing=False, rate_limit_retries=0), args)
+    run("paced", LLMScheduler(args.max_concurrent, pacing=True), args)
+
+
+if __name__ == "__main__":
+    main()
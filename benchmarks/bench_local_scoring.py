@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Local Scoring Benchmark
+Grades the same mock exam papers through the real grading agent with the
+stubbed LLM, once with local scoring off (every item is an LLM call) and once
+with it on, and reports LLM calls, wall time per paper and how many items
+were scored locally, for a Paper 1 (multiple-choice, short calculations and
+written items) and a Paper 2 (case-study calculations and written items).
+
+Usage:
+    python benchmarks/bench_local_scoring.py [--papers 5] [--latency-ms 800]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from replay_traffic import StubLLM
+
+MCQ = ("Which of the following is a fixed cost? A) Raw materials B) Rent C) Packaging D) Sales commission", "B",
+       ["B", "b)", "Rent", "C", "A"])
+CALCULATIONS = [
+    ("Calculate the break-even output. Fixed costs $40,000, price $50, variable cost $30.", "2,000 units",
+     ["2000", "2,000 units", "1,800", "FC / contribution = 40000 / (50 - 30) = 2000 units"]),
+    ("Calculate the gross profit margin. Revenue $120,000, cost of sales $80,000.", "33.33%",
+     ["33.3%", "33.33", "0.3333", "40%", "Gross profit = 120000 - 80000 = 40000, 40000 / 120000 = 40%"]),
+    ("Calculate the current ratio. Current assets $90,000, current liabilities $60,000.", "1.5:1",
+     ["1.5", "1.5:1", "2:1"]),
+]
+WRITTEN = ("Evaluate whether the business should expand overseas.", "Weigh costs, risks and market potential...",
+           "The business should expand because the market is growing and... " * 6)
+
+
+class CountingLLM(StubLLM):
+    """Stub LLM that counts its calls"""
+
+    def __init__(self, latency_ms: float, jitter_ms: float):
+        super().__init__(latency_ms, jitter_ms)
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        return super().invoke(prompt, **kwargs)
+
+
+def paper(exam_type: str, rng: random.Random):
+    """A paper's attempted questions: Paper 1 with 10 multiple-choice items, both with calculations and written items"""
+    items = []
+    if exam_type == "P1":
+        items += [(MCQ[0], MCQ[1], rng.choice(MCQ[2]), 1) for _ in range(10)]
+    items += [(q, a, rng.choice(answers), 4) for q, a, answers in CALCULATIONS for _ in range(2)]
+    items += [(WRITTEN[0], WRITTEN[1], WRITTEN[2], 12) for _ in range(3)]
+    return [{"question_id": i + 1, "question": q, "solution": a, "user_answer": answer, "marks": marks}
+            for i, (q, a, answer, marks) in enumerate(items)]
+
+
+def run(name: str, agent, llm: CountingLLM, exam_type: str, args):
+    rng = random.Random(7)
+    papers = [paper(exam_type, rng) for _ in range(args.papers)]
+    llm.calls = 0
+    local = items = 0
+    start = time.perf_counter()
+    for questions in papers:
+        report = agent.grade_exam(questions, exam_type=exam_type)
+        items += len(report.question_grades)
+        local += sum(1 for grade in report.question_grades if grade.graded_by == "local")
+    wall = time.perf_counter() - start
+    print(f"{exam_type:<6}{name:<14}{items:>7}{local:>8}{llm.calls:>11}{wall / len(papers):>13.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--papers", type=int, default=5, help="Papers graded per paper type and setting")
+    parser.add_argument("--latency-ms", type=float, default=800, help="Stub LLM latency per grading call")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ["ROUTER_ENABLED"] = "false"
+    from mock_exam_grading_agent import MockExamGradingAgent
+
+    agent = MockExamGradingAgent("benchmark")
+    llm = agent.llm = CountingLLM(args.latency_ms, args.jitter_ms)
+    print(f"📊 {args.papers} papers per type, stub LLM at {args.latency_ms} ms per call")
+    print(f"{'paper':<6}{'scoring':<14}{'items':>7}{'local':>8}{'LLM calls':>11}{'per paper':>14}")
+    for exam_type in ("P1", "P2"):
+        for name, enabled in (("llm only", False), ("local + llm", True)):
+            agent.local_scorer.enabled = enabled
+            run(name, agent, llm, exam_type, args)
+    print(f"🧮 {agent.local_scorer.stats()}")
+
+
+if __name__ == "__main__":
+    main()
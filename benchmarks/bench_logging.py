@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Logging Benchmark
+Logs a burst of request-path records from the event loop into a slow output
+(each write stalls like a full pipe or a backed-up log shipper), once through
+a plain synchronous StreamHandler, as logging.basicConfig sets up, and once
+through the queue-backed JSON pipeline, and reports the time the logging
+calls took on the loop and how late a 10 ms ticker on the same loop ran.
+
+Usage:
+    python benchmarks/bench_logging.py [--records 2000] [--write-ms 0.5]
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from structured_logging import LogPipeline, parse_sample_rates, request_id_var
+
+
+class SlowStream:
+    """Output whose every write takes write_ms"""
+
+    def __init__(self, write_ms: float):
+        self.write_ms = write_ms
+        self.lines = 0
+
+    def write(self, text: str):
+        time.sleep(self.write_ms / 1000)
+        self.lines += text.count("\n")
+
+    def flush(self):
+        pass
+
+
+async def burst(logger: logging.Logger, args):
+    """Log like busy request handlers while a ticker measures event-loop lag"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append((time.perf_counter() - start - 0.01) * 1000)
+
+    tick = asyncio.create_task(ticker())
+    logging_seconds = 0.0
+    for i in range(args.records):
+        request_id_var.set(f"req-{i // 10}")
+        start = time.perf_counter()
+        logger.info(f"📝 Grading question {i}", extra={"question_id": i, "marks": 6})
+        logging_seconds += time.perf_counter() - start
+        if i % 10 == 9:
+            await asyncio.sleep(0)
+    done.set()
+    await tick
+    return logging_seconds, lags
+
+
+def run(name: str, setup, args):
+    stream = SlowStream(args.write_ms)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    stop = setup(stream)
+    logger = logging.getLogger("bench")
+    logging_seconds, lags = asyncio.run(burst(logger, args))
+    drain_start = time.perf_counter()
+    stop()
+    drain = time.perf_counter() - drain_start
+    lags.sort()
+    print(f"{name:<12}{logging_seconds * 1000 / args.records:>12.3f}{logging_seconds:>11.2f}s"
+          f"{lags[len(lags) // 2] if lags else 0:>10.1f}{lags[-1] if lags else 0:>10.1f}{drain:>10.2f}s{stream.lines:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--write-ms", type=float, default=0.5, help="Time each write to the output takes")
+    parser.add_argument("--sample-rates", default="", help="LOG_SAMPLE_RATES for the pipeline, e.g. bench=0.1")
+    args = parser.parse_args()
+
+    def sync_handler(stream):
+        handler = logging.StreamHandler(stream)
+        logging.getLogger().addHandler(handler)
+        logging.getLogger().setLevel(logging.INFO)
+        return lambda: None
+
+    def pipeline(stream):
+        log_pipeline = LogPipeline(sample_rates=parse_sample_rates(args.sample_rates), stream=stream)
+        log_pipeline.start()
+        return log_pipeline.stop
+
+    print(f"📊 {args.records} records, {args.write_ms} ms per write")
+    print(f"{'handler':<12}{'ms/call':>12}{'on loop':>12}{'p50 lag':>10}{'max lag':>10}{'drain':>11}{'lines':>9}")
+    run("sync", sync_handler, args)
+    run("queue+json", pipeline, args)
+
+
+if __name__ == "__main__":
+    main()
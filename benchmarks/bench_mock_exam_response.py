@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Mock Exam Response Benchmark
+Compares size and serialization time of /grade-mock-exam responses:
+the original field-by-field conversion, the direct full dump, and compact mode,
+each with and without compression.
+
+Usage:
+    python benchmarks/bench_mock_exam_response.py [--questions 20] [--answer-chars 2500]
+"""
+
+import os
+import sys
+import time
+import json
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from fastapi.encoders import jsonable_encoder
+
+from mock_exam_grading_agent import ExamReport, QuestionGrade
+from response_encoding import dumps, compress, BROTLI_AVAILABLE, ORJSON_AVAILABLE
+from unified_backend import ECHOED_QUESTION_FIELDS, QuestionGradeResponse, MockExamGradingResponse
+
+
+def build_report(questions: int, answer_chars: int) -> ExamReport:
+    """Build a P2-sized report with long question, answer and model answer texts"""
+    rng = random.Random(42)
+    vocabulary = ("business cash flow market share profit revenue costs customers competitors "
+                  "segmentation pricing promotion workforce motivation productivity investment "
+                  "stakeholders government interest rates inflation exports because therefore "
+                  "however the a of to and in which could should would increase decrease").split()
+
+    def text(length: int) -> str:
+        words = []
+        while sum(len(w) + 1 for w in words) < length:
+            words.append(rng.choice(vocabulary))
+        return " ".join(words)[:length]
+
+    grades = [
+        QuestionGrade(
+            question_id=i,
+            question_number=i,
+            part="a",
+            question_text=text(answer_chars // 2),
+            student_answer=text(answer_chars),
+            model_answer=text(answer_chars),
+            marks_allocated=12,
+            marks_awarded=7.5,
+            percentage_score=62.5,
+            feedback="Good application to the case, but the evaluation lacks a justified conclusion. " * 3,
+            strengths=["Clear definitions", "Uses case context", "Relevant terminology"],
+            improvements=["Justify the final decision", "Weigh both options"]
+        )
+        for i in range(1, questions + 1)
+    ]
+    return ExamReport(
+        total_questions=questions,
+        questions_attempted=questions,
+        total_marks=12 * questions,
+        marks_obtained=7.5 * questions,
+        percentage_score=62.5,
+        overall_grade="D",
+        question_grades=grades,
+        overall_feedback="Satisfactory performance.",
+        recommendations=["Practice evaluation questions"],
+        strengths_summary=["Clear definitions"],
+        weaknesses_summary=["Justify the final decision"]
+    )
+
+
+def encode_original(report: ExamReport) -> bytes:
+    """The original path: copy every field into response models, then FastAPI's JSONResponse encoding"""
+    response = MockExamGradingResponse(
+        success=True,
+        total_questions=report.total_questions,
+        questions_attempted=report.questions_attempted,
+        total_marks=report.total_marks,
+        marks_obtained=report.marks_obtained,
+        percentage_score=report.percentage_score,
+        overall_grade=report.overall_grade,
+        question_grades=[
+            QuestionGradeResponse(
+                question_id=g.question_id,
+                question_number=g.question_number,
+                part=g.part,
+                question_text=g.question_text,
+                student_answer=g.student_answer,
+                model_answer=g.model_answer,
+                marks_allocated=g.marks_allocated,
+                marks_awarded=g.marks_awarded,
+                percentage_score=g.percentage_score,
+                feedback=g.feedback,
+                strengths=g.strengths,
+                improvements=g.improvements
+            )
+            for g in report.question_grades
+        ],
+        overall_feedback=report.overall_feedback,
+        recommendations=report.recommendations,
+        strengths_summary=report.strengths_summary,
+        weaknesses_summary=report.weaknesses_summary,
+        message="Exam graded successfully"
+    )
+    validated = MockExamGradingResponse.model_validate(response.model_dump())
+    return json.dumps(
+        jsonable_encoder(validated), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def encode_current(report: ExamReport, compact: bool) -> bytes:
+    """The current path: dump the report directly, optionally without echoed texts"""
+    exclude = {"question_grades": {"__all__": ECHOED_QUESTION_FIELDS}} if compact else None
+    content = report.model_dump(exclude=exclude)
+    content["success"] = True
+    content["message"] = "Exam graded successfully"
+    return dumps(content)
+
+
+def time_it(func, iterations: int) -> float:
+    """Average milliseconds per call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--answer-chars", type=int, default=2500)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    report = build_report(args.questions, args.answer_chars)
+    variants = {
+        "original": lambda: encode_original(report),
+        "full": lambda: encode_current(report, compact=False),
+        "compact": lambda: encode_current(report, compact=True),
+    }
+    encodings = ["gzip"] + (["br"] if BROTLI_AVAILABLE else [])
+
+    print(f"📊 {args.questions} questions, {args.answer_chars}-char answers "
+          f"(orjson={ORJSON_AVAILABLE}, brotli={BROTLI_AVAILABLE})")
+    header = f"{'variant':<10}{'serialize ms':>14}{'raw bytes':>12}"
+    for encoding in encodings:
+        header += f"{encoding + ' bytes':>12}{encoding + ' ms':>10}"
+    print(header)
+
+    for name, encode in variants.items():
+        body = encode()
+        row = f"{name:<10}{time_it(encode, args.iterations):>14.3f}{len(body):>12,}"
+        for encoding in encodings:
+            compressed = compress(body, encoding)
+            row += f"{len(compressed):>12,}{time_it(lambda: compress(body, encoding), max(1, args.iterations // 10)):>10.3f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Output Budget Benchmark
+Grades the same answers and mock exam questions (2 to 20 marks) through the
+real grading agents against the fake OpenAI server, once with output budgets
+off (every call may run to the client's max_tokens) and once with them on,
+and reports output tokens, latency and truncations per endpoint.
+
+The fake server generates --verbose-tokens of output when the prompt gives
+no length instruction and follows the instruction otherwise, at
+--ms-per-token, so the numbers show the effect of the budgets on generation
+time rather than a real model's exact reply lengths.
+
+Usage:
+    python benchmarks/bench_output_budgets.py [--calls 4] [--ms-per-token 4]
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import httpx
+import uvicorn
+
+from fake_openai_server import create_app
+
+MARKS = (2, 6, 12, 20)
+
+
+def start_server(args) -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    app = create_app(rpm=100000, tpm=100000000, latency_ms=args.latency_ms, per_inflight_ms=0,
+                     completion_tokens=args.verbose_tokens, ms_per_token=args.ms_per_token)
+    threading.Thread(target=uvicorn.Server(uvicorn.Config(app, port=port, log_level="error")).run, daemon=True).start()
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(50):
+        try:
+            httpx.get(f"{base_url}/stats")
+            return base_url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError("Fake OpenAI server did not start")
+
+
+def run(name: str, enabled: bool, answer_agent, exam_agent, args):
+    from output_budgets import OutputBudgets
+
+    budgets = OutputBudgets(enabled=enabled)
+    for agent in (answer_agent, exam_agent):
+        agent.router.budgets = budgets
+
+    def grade_answer(_):
+        answer_agent.grade_answer("Explain the role of profit.", "Profit rewards risk taking.",
+                                  "Profit is the reward for risk. " * 20, raise_errors=True)
+
+    def grade_question(marks):
+        exam_agent.grade_question({
+            "question_id": marks, "question": f"Evaluate the decision ({marks} marks).",
+            "solution": "Weigh both options.", "user_answer": "Option A is better because... " * 15, "marks": marks
+        }, raise_errors=True)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(grade_answer, range(args.calls)))
+        list(pool.map(grade_question, [m for m in MARKS for _ in range(args.calls)]))
+    wall = time.perf_counter() - start
+
+    print(f"\n{name} ({wall:.1f}s wall)")
+    print(f"{'endpoint':<14}{'calls':>7}{'budget':>9}{'out tok':>9}{'p95 tok':>9}{'avg ms':>9}{'p95 ms':>9}{'trunc':>7}{'retry':>7}")
+    for endpoint, s in budgets.stats()["endpoints"].items():
+        print(f"{endpoint:<14}{s['calls']:>7}{s['avg_budget'] or '-':>9}{s['avg_output_tokens'] or '-':>9}"
+              f"{s['p95_output_tokens'] or '-':>9}{s['avg_latency_ms']:>9}{s['p95_latency_ms']:>9}"
+              f"{s['truncated']:>7}{s['retried']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=4, help="Calls per endpoint (and per marks value)")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=200, help="Fixed latency per call")
+    parser.add_argument("--ms-per-token", type=float, default=4, help="Generation time per output token")
+    parser.add_argument("--verbose-tokens", type=int, default=1500, help="Reply length without a length instruction")
+    args = parser.parse_args()
+
+    base_url = start_server(args)
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ["ROUTER_ENABLED"] = "false"
+    from answer_grading_agent import AnswerGradingAgent
+    from mock_exam_grading_agent import MockExamGradingAgent
+
+    answer_agent = AnswerGradingAgent("benchmark", model="fake-model")
+    exam_agent = MockExamGradingAgent("benchmark")
+    print(f"📊 {args.calls} calls per endpoint/marks ({', '.join(map(str, MARKS))}), "
+          f"{args.ms_per_token} ms/token, {args.verbose_tokens} tokens when unconstrained")
+    run("budgets off", False, answer_agent, exam_agent, args)
+    run("budgets on", True, answer_agent, exam_agent, args)
+
+
+if __name__ == "__main__":
+    main()
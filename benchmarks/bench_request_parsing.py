@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Mock Exam Request Parsing Benchmark
+Measures peak memory and time to parse a /grade-mock-exam body: the original
+untyped List[Dict] path (json.loads, then validation), the typed models through
+FastAPI's default body handling, and the typed models validated straight from
+the raw bytes as the endpoint does now.
+
+Usage:
+    python benchmarks/bench_request_parsing.py [--questions 40] [--answer-chars 5000]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from pydantic import BaseModel
+
+from unified_backend import MockExamGradingRequest
+
+
+class UntypedMockExamGradingRequest(BaseModel):
+    """The request model before typed questions"""
+    attempted_questions: List[Dict]
+    exam_type: str = "P1"
+
+
+def build_body(questions: int, answer_chars: int) -> bytes:
+    rng = random.Random(42)
+    words = "market share revenue costs profit customers pricing promotion workforce because therefore".split()
+
+    def text(length: int) -> str:
+        out = []
+        while sum(len(w) + 1 for w in out) < length:
+            out.append(rng.choice(words))
+        return " ".join(out)[:length]
+
+    return json.dumps({
+        "exam_type": "P2",
+        "attempted_questions": [
+            {
+                "question_id": i,
+                "part": "a",
+                "question": text(answer_chars // 4),
+                "user_answer": text(answer_chars),
+                "solution": text(answer_chars),
+                "marks": 12,
+                "topic": "Marketing",
+                "time_spent_seconds": 540
+            }
+            for i in range(1, questions + 1)
+        ]
+    }).encode("utf-8")
+
+
+def untyped(body: bytes):
+    return UntypedMockExamGradingRequest.model_validate(json.loads(body))
+
+
+def typed_fastapi_default(body: bytes):
+    request = MockExamGradingRequest.model_validate(json.loads(body))
+    return [q.to_agent_input() for q in request.attempted_questions]
+
+
+def typed_from_bytes(body: bytes):
+    request = MockExamGradingRequest.model_validate_json(body)
+    return [q.to_agent_input() for q in request.attempted_questions]
+
+
+def measure(func, body: bytes, iterations: int):
+    """Peak traced allocation (excluding the body itself) and mean milliseconds"""
+    tracemalloc.start()
+    result = func(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(body)
+    return peak, (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--answer-chars", type=int, default=5000)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    body = build_body(args.questions, args.answer_chars)
+    print(f"📊 {args.questions} questions, {args.answer_chars}-char answers, body {len(body):,} bytes")
+    print(f"{'path':<24}{'peak memory':>14}{'x body':>8}{'parse ms':>10}")
+    for name, func in (
+        ("untyped List[Dict]", untyped),
+        ("typed, json.loads", typed_fastapi_default),
+        ("typed, from bytes", typed_from_bytes),
+    ):
+        peak, ms = measure(func, body, args.iterations)
+        print(f"{name:<24}{peak:>14,}{peak / len(body):>8.2f}{ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
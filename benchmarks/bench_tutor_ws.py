@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tutor WebSocket Benchmark
+Holds the same long tutoring conversation with the backend twice, with the
+stubbed LLM: once over POST /tutor/chat, re-uploading the conversation
+history with every message as clients do today, and once over the /tutor/ws
+session, sending only the new messages. Reports upload bytes per message,
+time to the first reply text and time to the full reply.
+
+The backend runs in-process on a real uvicorn server (the stub replaces the
+LLM only), so connection setup, framing and parsing are all measured.
+
+Usage:
+    python benchmarks/bench_tutor_ws.py [--turns 40] [--latency-ms 300]
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import httpx
+import uvicorn
+from websockets.sync.client import connect
+
+from replay_traffic import load_app, install_stubs, percentile
+
+
+def start_backend(args):
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ["TUTOR_CACHE_ENABLED"] = "false"
+    backend = load_app("stub", args)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(backend.app, port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if httpx.get(f"{base_url}/health/live").status_code == 200:
+                break
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    install_stubs(backend, args.latency_ms, args.jitter_ms)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    return backend, base_url
+
+
+def messages(turns: int):
+    return [f"Question {turn}: how does price elasticity affect total revenue in case {turn}?" for turn in range(turns)]
+
+
+def run_http(base_url: str, args, max_history: int):
+    history, uploads, first, full = [], [], [], []
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        for text in messages(args.turns):
+            body = json.dumps({"message": text, "topic": "Economics", "user_id": "bench-http",
+                               "conversation_history": history[-max_history:]}).encode()
+            start = time.perf_counter()
+            response = client.post("/tutor/chat", content=body, headers={"Content-Type": "application/json"})
+            elapsed = (time.perf_counter() - start) * 1000
+            response.raise_for_status()
+            request = response.request
+            uploads.append(len(body) + sum(len(k) + len(v) + 4 for k, v in request.headers.raw) + len(request.url.raw_path) + 20)
+            # The whole reply arrives at once
+            first.append(elapsed)
+            full.append(elapsed)
+            history += [{"role": "user", "content": text}, {"role": "assistant", "content": response.json()["response"]}]
+    return uploads, first, full
+
+
+def run_ws(base_url: str, args):
+    uploads, first, full = [], [], []
+    with connect(base_url.replace("http", "ws") + "/tutor/ws", max_size=None) as websocket:
+        start_frame = json.dumps({"type": "start", "topic": "Economics", "user_id": "bench-ws"})
+        websocket.send(start_frame)
+        json.loads(websocket.recv())
+        for text in messages(args.turns):
+            frame = json.dumps({"type": "message", "text": text})
+            start = time.perf_counter()
+            websocket.send(frame)
+            # A client text frame adds 6-14 bytes of header and mask
+            uploads.append(len(frame.encode()) + 8)
+            first_text = None
+            while True:
+                event = json.loads(websocket.recv())
+                if event["type"] == "delta" and first_text is None:
+                    first_text = (time.perf_counter() - start) * 1000
+                if event["type"] in ("reply", "error"):
+                    break
+            elapsed = (time.perf_counter() - start) * 1000
+            first.append(first_text if first_text is not None else elapsed)
+            full.append(elapsed)
+    return uploads, first, full
+
+
+def report(name: str, uploads, first, full):
+    print(f"{name:<12}{sum(uploads) / 1024:>10.1f}{sum(uploads) / len(uploads) / 1024:>10.2f}{uploads[-1] / 1024:>10.2f}"
+          f"{percentile(first, 0.5):>12}{percentile(full, 0.5):>11}{percentile(full, 0.95):>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=40, help="Messages in the conversation")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Stub LLM latency per reply")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    backend, base_url = start_backend(args)
+    print(f"📊 {args.turns}-message conversation, stub LLM at {args.latency_ms} ms per reply")
+    print(f"{'transport':<12}{'KB up':>10}{'KB/msg':>10}{'last KB':>10}{'p50 first':>12}{'p50 full':>11}{'p95 full':>11}")
+    report("http", *run_http(base_url, args, backend.MAX_CONVERSATION_TURNS))
+    report("websocket", *run_ws(base_url, args))
+    print(f"🔌 {backend.tutor_ws_stats}")
+
+
+if __name__ == "__main__":
+    main()
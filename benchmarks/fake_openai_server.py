@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Fake OpenAI Server
+A local OpenAI-compatible chat completions endpoint with request and token
+rate limits, for exercising LLM pacing, the endpoint pool and overload
+handling without spending quota.
+
+Limits are token buckets refilled continuously, reported the way OpenAI does
+(x-ratelimit-limit/remaining/reset-requests and -tokens); requests beyond
+them get a 429 with retry-after. Latency grows with the number of requests
+in flight, like a provider queueing our calls. Streamed requests get the
+reply as server-sent chunks spread over the same latency.
+
+With --ms-per-token, generation time also grows with the completion length:
+a reply is completion_tokens long, or as long as the prompt's "LENGTH: keep
+your whole response under N words" asks for, and is cut off with
+finish_reason "length" (and truncated content) when max_tokens is lower.
+
+Usage:
+    python benchmarks/fake_openai_server.py --port 8001 --rpm 120 --tpm 60000
+    LLM_ENDPOINTS=local|http://localhost:8001/v1|local python unified_backend.py
+"""
+
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from pathlib import Path
+from typing import Any, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from replay_traffic import STUB_CONTENT
+
+_LENGTH_RE = re.compile(r"under (\d+) words")
+
+
+def format_reset(seconds: float) -> str:
+    """Format seconds the way OpenAI's reset headers do ('20ms', '1.5s', '6m0s')"""
+    if seconds < 1:
+        return f"{max(1, round(seconds * 1000))}ms"
+    minutes, rest = divmod(seconds, 60)
+    return f"{int(minutes)}m{rest:.0f}s" if minutes else f"{rest:.3g}s"
+
+
+class Bucket:
+    """Continuously refilled token bucket holding up to burst_seconds of the per-minute limit"""
+
+    def __init__(self, per_minute: int, burst_seconds: float = 60.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1, int(self.rate * burst_seconds))
+        self.level = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, amount: float, now: float) -> bool:
+        self._refill(now)
+        if self.level < amount:
+            return False
+        self.level -= amount
+        return True
+
+    def headers(self, kind: str) -> Dict[str, str]:
+        return {
+            f"x-ratelimit-limit-{kind}": str(self.capacity),
+            f"x-ratelimit-remaining-{kind}": str(int(self.level)),
+            f"x-ratelimit-reset-{kind}": format_reset((self.capacity - self.level) / self.rate)
+        }
+
+    def seconds_until(self, amount: float) -> float:
+        return max(0.0, (amount - self.level) / self.rate)
+
+
+def reply_length(prompt: str, max_tokens, completion_tokens: int):
+    """(completion tokens, finish reason) for a prompt: its length instruction if any, cut at max_tokens"""
+    match = _LENGTH_RE.search(prompt)
+    # Like a model following the instruction most of the way
+    wanted = int(int(match.group(1)) / 0.75 * 0.9) if match else completion_tokens
+    if max_tokens and wanted > max_tokens:
+        return max_tokens, "length"
+    return wanted, "stop"
+
+
+def create_app(rpm: int = 120, tpm: int = 60000, latency_ms: float = 300, per_inflight_ms: float = 40,
+               burst_seconds: float = 60.0, completion_tokens: int = 200, ms_per_token: float = 0.0) -> FastAPI:
+    """The fake server app; app.state.counters holds request, 429 and in-flight counts"""
+    app = FastAPI(title="Fake OpenAI")
+    requests_bucket = Bucket(rpm, burst_seconds)
+    tokens_bucket = Bucket(tpm, burst_seconds)
+    lock = threading.Lock()
+    counters: Dict[str, Any] = {"requests": 0, "rate_limited": 0, "in_flight": 0, "max_in_flight": 0}
+    app.state.counters = counters
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "fake-model", "object": "model", "owned_by": "fake"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = "".join(str(m.get("content", "")) for m in body.get("messages", []))
+        prompt_tokens = len(prompt) // 4
+        output_tokens, finish_reason = reply_length(prompt, body.get("max_completion_tokens") or body.get("max_tokens"),
+                                                    completion_tokens)
+        tokens = prompt_tokens + output_tokens
+        # A cut-off reply ends mid-JSON
+        content = STUB_CONTENT if finish_reason == "stop" else STUB_CONTENT[:min(len(STUB_CONTENT) - 1, output_tokens * 4)]
+        now = time.monotonic()
+        with lock:
+            counters["requests"] += 1
+            allowed = requests_bucket.take(1, now)
+            if allowed and not tokens_bucket.take(tokens, now):
+                requests_bucket.level += 1
+                allowed = False
+            headers = {**requests_bucket.headers("requests"), **tokens_bucket.headers("tokens")}
+            if not allowed:
+                counters["rate_limited"] += 1
+                wait = max(requests_bucket.seconds_until(1), tokens_bucket.seconds_until(tokens))
+                headers["retry-after-ms"] = str(round(wait * 1000))
+                headers["retry-after"] = str(max(1, round(wait)))
+            else:
+                counters["in_flight"] += 1
+                counters["max_in_flight"] = max(counters["max_in_flight"], counters["in_flight"])
+                in_flight = counters["in_flight"]
+        if not allowed:
+            return JSONResponse(status_code=429, headers=headers, content={"error": {
+                "message": "Rate limit reached for requests", "type": "requests", "code": "rate_limit_exceeded"
+            }})
+
+        latency = (latency_ms + per_inflight_ms * (in_flight - 1) + ms_per_token * output_tokens) / 1000
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": tokens - prompt_tokens, "total_tokens": tokens}
+        if body.get("stream"):
+            return StreamingResponse(stream_reply(body, latency, usage, content, finish_reason), headers=headers,
+                                     media_type="text/event-stream")
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            with lock:
+                counters["in_flight"] -= 1
+        return JSONResponse(headers=headers, content={
+            "id": f"chatcmpl-fake-{counters['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+            "usage": usage
+        })
+
+    async def stream_reply(body: Dict[str, Any], latency: float, usage: Dict[str, int], content: str, finish_reason: str):
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+        base = {"id": f"chatcmpl-fake-{counters['requests']}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": body.get("model", "fake-model")}
+        try:
+            for index, piece in enumerate(pieces):
+                await asyncio.sleep(latency / len(pieces))
+                delta = {"role": "assistant", "content": piece} if index == 0 else {"content": piece}
+                yield f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})}\n\n"
+            yield f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': finish_reason}]})}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps({**base, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+        finally:
+            with lock:
+                counters["in_flight"] -= 1
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--rpm", type=int, default=120, help="Requests per minute")
+    parser.add_argument("--tpm", type=int, default=60000, help="Tokens per minute")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--per-inflight-ms", type=float, default=40, help="Extra latency per concurrent request")
+    parser.add_argument("--burst-seconds", type=float, default=60, help="Bucket size in seconds of the limit")
+    parser.add_argument("--completion-tokens", type=int, default=200, help="Reply length without a length instruction")
+    parser.add_argument("--ms-per-token", type=float, default=0, help="Extra latency per generated token")
+    args = parser.parse_args()
+    print(f"🧪 Fake OpenAI on http://localhost:{args.port}/v1 ({args.rpm} RPM, {args.tpm} TPM)")
+    uvicorn.run(create_app(args.rpm, args.tpm, args.latency_ms, args.per_inflight_ms, args.burst_seconds,
+                           args.completion_tokens, args.ms_per_token),
+                port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
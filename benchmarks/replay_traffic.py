@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Traffic Replay
+Plays captured traffic (see traffic_capture.py) back against the app at the
+original or a scaled rate and reports latency and throughput per endpoint,
+next to the recorded production numbers and, optionally, a previous run.
+
+By default the app runs in-process with the LLM stubbed by a fixed-latency
+fake, which isolates our own overhead; --llm live uses the configured OpenAI
+key, and --url replays against an already running server instead.
+
+Usage:
+    TRAFFIC_CAPTURE_ENABLED=true python unified_backend.py   # record
+    python benchmarks/replay_traffic.py data/traffic --rate 2 --output run.json
+    python benchmarks/replay_traffic.py data/traffic --baseline run.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from traffic_capture import load_capture
+
+STUB_CONTENT = json.dumps({
+    # Covers the answer grading, mock exam question and lesson output schemas
+    "overall_score": 32, "percentage": 64, "grade": "C",
+    "strengths": ["Relevant terminology", "Uses the case context"],
+    "areas_for_improvement": ["Develop the evaluation"], "improvements": ["Develop the evaluation"],
+    "specific_feedback": "Sound knowledge with some application; the evaluation needs a justified conclusion. " * 4,
+    "suggestions": ["Weigh both options before concluding"],
+    "marks_awarded": 3, "percentage_score": 60, "feedback": "Good application, limited evaluation.",
+    "lesson_content": "\n\n".join(["Lesson text. " * 40] * 5), "key_points": ["Point one", "Point two"],
+    "practice_questions": ["Question one?", "Question two?"], "estimated_duration": 30
+})
+
+
+class StubLLM:
+    """Stands in for ChatOpenAI with a fixed latency and a canned JSON reply"""
+
+    def __init__(self, latency_ms: float, jitter_ms: float):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.model_name = "stub"
+
+    def invoke(self, prompt, **kwargs):
+        from langchain_core.messages import AIMessage
+        time.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+        return AIMessage(
+            content=STUB_CONTENT,
+            usage_metadata={"input_tokens": len(prompt) // 4, "output_tokens": 200, "total_tokens": len(prompt) // 4 + 200},
+            response_metadata={"finish_reason": "stop"}
+        )
+
+    def stream(self, prompt, **kwargs):
+        from langchain_core.messages import AIMessageChunk
+        pieces = [STUB_CONTENT[i:i + 40] for i in range(0, len(STUB_CONTENT), 40)]
+        for piece in pieces:
+            time.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000 / len(pieces))
+            yield AIMessageChunk(content=piece)
+        yield AIMessageChunk(
+            content="",
+            usage_metadata={"input_tokens": len(prompt) // 4, "output_tokens": 200, "total_tokens": len(prompt) // 4 + 200},
+            response_metadata={"finish_reason": "stop"}
+        )
+
+
+def load_app(llm_mode: str, args):
+    """Import the backend in-process with capture off and, for stubbed runs, no network warm-up"""
+    os.environ["TRAFFIC_CAPTURE_ENABLED"] = "false"
+    os.environ.setdefault("RESULTS_STORE_PATH", os.path.join(tempfile.mkdtemp(prefix="replay-"), "results.db"))
+    if llm_mode == "stub":
+        os.environ.setdefault("OPENAI_API_KEY", "replay-stub")
+        os.environ["READINESS_WARMUP"] = "off"
+    import unified_backend
+    return unified_backend
+
+
+def install_stubs(backend, latency_ms: float, jitter_ms: float):
+    stub = StubLLM(latency_ms, jitter_ms)
+    backend.ai_tutor.llm = stub
+    for agent in (backend.grading_agent, backend.mock_exam_grading_agent):
+        if agent is not None:
+            agent.llm = stub
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 1)
+
+
+async def replay(records: List[Dict[str, Any]], client: httpx.AsyncClient, rate: float, concurrency: int):
+    """Send every record at its (scaled) original offset; returns per-request results and wall time"""
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[Dict[str, Any]] = []
+    origin = records[0]["ts"]
+    start = time.perf_counter()
+
+    async def send(record):
+        if rate > 0:
+            delay = (record["ts"] - origin) / rate - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        async with semaphore:
+            sent = time.perf_counter()
+            try:
+                response = await client.post(record["path"], json=record["body"], headers=record.get("headers") or {})
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = f"{type(e).__name__}"
+            results.append({
+                "path": record["path"],
+                "status": status,
+                "latency_ms": (time.perf_counter() - sent) * 1000,
+                "lag_ms": (sent - start) * 1000 - ((record["ts"] - origin) / rate * 1000 if rate > 0 else 0)
+            })
+
+    await asyncio.gather(*(send(r) for r in records))
+    return results, time.perf_counter() - start
+
+
+def summarize(records: List[Dict[str, Any]], results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """Latency percentiles and throughput per endpoint, replayed and as recorded"""
+    summary: Dict[str, Any] = {"endpoints": {}, "wall_seconds": round(wall_seconds, 3)}
+    for path in sorted({r["path"] for r in records}):
+        replayed = [r for r in results if r["path"] == path]
+        ok = [r["latency_ms"] for r in replayed if isinstance(r["status"], int) and r["status"] < 400]
+        recorded = [r["duration_ms"] for r in records if r["path"] == path and r["status_code"] < 400]
+        summary["endpoints"][path] = {
+            "requests": len(replayed),
+            "errors": len(replayed) - len(ok),
+            "p50_ms": percentile(ok, 0.50),
+            "p95_ms": percentile(ok, 0.95),
+            "p99_ms": percentile(ok, 0.99),
+            "recorded_p50_ms": percentile(recorded, 0.50),
+            "recorded_p95_ms": percentile(recorded, 0.95)
+        }
+    span = records[-1]["ts"] - records[0]["ts"]
+    summary["throughput_rps"] = round(len(results) / wall_seconds, 2) if wall_seconds else None
+    summary["recorded_throughput_rps"] = round(len(records) / span, 2) if span > 0 else None
+    summary["max_schedule_lag_ms"] = round(max((r["lag_ms"] for r in results), default=0.0), 1)
+    return summary
+
+
+def print_summary(summary: Dict[str, Any], baseline: Optional[Dict[str, Any]]):
+    def fmt(value):
+        return f"{value:,.1f}" if value is not None else "-"
+
+    header = f"{'endpoint':<18}{'reqs':>6}{'errs':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'rec p50':>10}{'rec p95':>10}"
+    if baseline:
+        header += f"{'Δp50':>10}{'Δp95':>10}"
+    print(header)
+    for path, s in summary["endpoints"].items():
+        row = (f"{path:<18}{s['requests']:>6}{s['errors']:>6}{fmt(s['p50_ms']):>10}{fmt(s['p95_ms']):>10}"
+               f"{fmt(s['p99_ms']):>10}{fmt(s['recorded_p50_ms']):>10}{fmt(s['recorded_p95_ms']):>10}")
+        base = (baseline or {}).get("endpoints", {}).get(path)
+        if base:
+            for key in ("p50_ms", "p95_ms"):
+                delta = None if s[key] is None or base[key] is None else s[key] - base[key]
+                row += f"{('+' if delta and delta > 0 else '') + fmt(delta):>10}"
+        print(row)
+    print(f"📊 Throughput: {summary['throughput_rps']} req/s replayed "
+          f"(recorded {summary['recorded_throughput_rps']} req/s), wall {summary['wall_seconds']}s, "
+          f"max schedule lag {summary['max_schedule_lag_ms']}ms")
+    if baseline:
+        print(f"   Baseline throughput: {baseline.get('throughput_rps')} req/s")
+
+
+async def main_async(args):
+    records = load_capture(args.capture)
+    if args.paths:
+        records = [r for r in records if r["path"] in args.paths]
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        print("❌ No captured requests found")
+        return 1
+    print(f"🎬 Replaying {len(records)} requests at {'max speed' if args.rate <= 0 else f'{args.rate}x'} "
+          f"against {args.url or 'in-process app'} (LLM {args.llm if not args.url else 'as configured on server'})")
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            results, wall = await replay(records, client, args.rate, args.concurrency)
+    else:
+        backend = load_app(args.llm, args)
+        async with backend.app.router.lifespan_context(backend.app):
+            if args.llm == "stub":
+                install_stubs(backend, args.stub_latency_ms, args.stub_jitter_ms)
+            if not args.keep_rate_limits:
+                backend.rate_limiter.enabled = False
+            transport = httpx.ASGITransport(app=backend.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=args.timeout) as client:
+                results, wall = await replay(records, client, args.rate, args.concurrency)
+
+    summary = summarize(records, results, wall)
+    summary["settings"] = {"rate": args.rate, "llm": args.llm, "url": args.url, "concurrency": args.concurrency,
+                           "stub_latency_ms": args.stub_latency_ms}
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    print_summary(summary, baseline)
+    if args.output:
+        Path(args.output).write_text(json.dumps(summary, indent=2))
+        print(f"💾 Results written to {args.output}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("capture", nargs="+", help="Capture files or directories")
+    parser.add_argument("--url", help="Replay against a running server instead of the in-process app")
+    parser.add_argument("--llm", choices=("stub", "live"), default="stub")
+    parser.add_argument("--rate", type=float, default=1.0, help="Speed-up over the recorded rate; 0 sends as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--stub-latency-ms", type=float, default=800)
+    parser.add_argument("--stub-jitter-ms", type=float, default=200)
+    parser.add_argument("--paths", nargs="*", help="Only replay these endpoints")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--timeout", type=float, default=180)
+    parser.add_argument("--keep-rate-limits", action="store_true", help="Leave per-student rate limits on in-process")
+    parser.add_argument("--output", help="Write the summary as JSON")
+    parser.add_argument("--baseline", help="Summary JSON of an earlier run to compare against")
+    sys.exit(asyncio.run(main_async(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Bulk Grading
+Grades a file of answers offline (a class set, a past paper re-mark) without
+going through the API, writing one JSON line per graded record as it finishes.
+
+Input is JSONL or CSV. Records with a `student_answer` field are graded like
+/grading/grade-answer (question, model_answer, student_answer); records with
+a `user_answer` field like one mock exam question (question, solution or
+model_answer, user_answer, marks, and optionally exam_type, whose paper rules
+decide which items are scored without the LLM). An `id` field names the
+record, otherwise its row number does.
+
+The output file is also the checkpoint: an interrupted run started again with
+the same output resumes where it stopped, skipping records already graded
+with the same inputs and retrying those that failed or were left pending.
+
+Usage:
+    python bulk_grading.py answers.jsonl -o graded.jsonl --concurrency 8
+    python bulk_grading.py past_paper.csv -o graded.jsonl --mode question
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterator, Tuple
+
+from results_store import input_hash
+
+MODES = ("auto", "answer", "question")
+# Statuses that count as done on resume; anything else is graded again
+DONE_STATUSES = ("ok",)
+
+
+def read_records(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (record id, record) from a JSONL or CSV file"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for number, record in enumerate(rows, 1):
+            yield str(record.get("id") or number), record
+
+
+def count_records(path: str) -> int:
+    """Number of records in the input, for progress and ETA"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            return sum(1 for _ in csv.DictReader(f))
+        return sum(1 for line in f if line.strip())
+
+
+def record_mode(record: Dict[str, Any], mode: str) -> str:
+    """'answer' or 'question' grading for a record"""
+    if mode != "auto":
+        return mode
+    if "student_answer" in record:
+        return "answer"
+    if "user_answer" in record:
+        return "question"
+    raise ValueError("record has neither student_answer nor user_answer")
+
+
+def record_inputs(record: Dict[str, Any], mode: str) -> Dict[str, Any]:
+    """The fields grading depends on, hashed to tell whether a checkpointed result still applies"""
+    if mode == "answer":
+        keys = ("question", "model_answer", "student_answer")
+    else:
+        keys = ("question", "solution", "model_answer", "user_answer", "marks", "part", "exam_type")
+    return {"mode": mode, **{key: record.get(key) for key in keys if record.get(key) is not None}}
+
+
+def load_checkpoint(path: str) -> Dict[str, str]:
+    """Record ids already graded in an earlier run, with their input hash
+
+    A line cut short by an interrupted run is dropped from the file so that
+    appending carries on from the last complete record.
+    """
+    done: Dict[str, str] = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb+") as f:
+        good_until = 0
+        for line in iter(f.readline, b""):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            good_until += len(line)
+            if entry.get("status") in DONE_STATUSES:
+                done[entry["id"]] = entry["input_hash"]
+            else:
+                done.pop(entry["id"], None)
+        if good_until < f.seek(0, os.SEEK_END):
+            print(f"✂️ Dropping a partial line at the end of {path}")
+            f.truncate(good_until)
+    return done
+
+
+class BulkGrader:
+    """Grades records with bounded concurrency, appending each result to the output as it finishes"""
+
+    def __init__(self, api_key: str, output, concurrency: int):
+        # Imported here so the scheduler reads the concurrency settings from the environment
+        from answer_grading_agent import AnswerGradingAgent
+        from mock_exam_grading_agent import MockExamGradingAgent
+        from llm_pool import LLMPool
+
+        self.answer_agent = AnswerGradingAgent(api_key)
+        self.question_agent = MockExamGradingAgent(api_key)
+        llm_pool = LLMPool.from_env(api_key)
+        if llm_pool:
+            self.answer_agent.llm = llm_pool.bind(self.answer_agent.llm)
+            self.question_agent.llm = llm_pool.bind(self.question_agent.llm)
+        self.output = output
+        self.concurrency = concurrency
+        self._write_lock = threading.Lock()
+        self.counts = {"ok": 0, "pending": 0, "error": 0}
+
+    def grade(self, record_id: str, record: Dict[str, Any], mode: str, hash_value: str) -> Dict[str, Any]:
+        """Grade one record into an output line"""
+        start = time.perf_counter()
+        entry: Dict[str, Any] = {"id": record_id, "input_hash": hash_value, "mode": mode}
+        try:
+            if mode == "answer":
+                result = self.answer_agent.grade_answer(
+                    record.get("question", ""), record.get("model_answer", ""), record.get("student_answer", ""),
+                    raise_errors=True
+                )
+                entry["status"] = "ok"
+            else:
+                question = {**record, "marks": int(record.get("marks") or 0)}
+                question.setdefault("question_id", int(record_id) if record_id.isdigit() else 0)
+                result = self.question_agent.grade_question(question, pending_on_error=True,
+                                                             exam_type=record.get("exam_type"))
+                entry["status"] = "ok" if result.status == "graded" else result.status
+            entry["result"] = result.model_dump()
+        except Exception as e:
+            entry["status"] = "error"
+            entry["error"] = f"{type(e).__name__}: {e}"
+        entry["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        entry["graded_at"] = datetime.now(timezone.utc).isoformat()
+        return entry
+
+    def write(self, entry: Dict[str, Any]):
+        with self._write_lock:
+            self.output.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            self.output.flush()
+            self.counts[entry["status"] if entry["status"] in self.counts else "error"] += 1
+
+    def run(self, records: Iterator[Tuple[str, Dict[str, Any]]], total: int, progress_every: float = 10.0):
+        """Grade every record, keeping at most 2 x concurrency of them in memory"""
+        start = time.monotonic()
+        last_report = start
+        in_flight = set()
+        executor = ThreadPoolExecutor(self.concurrency)
+        try:
+            records = iter(records)
+            while True:
+                for args in records:
+                    in_flight.add(executor.submit(self.grade, *args))
+                    if len(in_flight) >= self.concurrency * 2:
+                        break
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, timeout=progress_every, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self.write(future.result())
+                if time.monotonic() - last_report >= progress_every:
+                    self.report(total, start)
+                    last_report = time.monotonic()
+        finally:
+            # On Ctrl-C, drop the queued records; the ones in flight are graded again on resume
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.report(total, start)
+        return time.monotonic() - start
+
+    def report(self, total: int, start: float):
+        done = sum(self.counts.values())
+        elapsed = time.monotonic() - start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = f"{(total - done) / rate:.0f}s" if rate > 0 else "?"
+        print(f"📈 {done}/{total} graded ({self.counts['error']} errors, {self.counts['pending']} pending) | "
+              f"{rate * 60:.1f}/min | ETA {eta}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="JSONL or CSV file of records to grade")
+    parser.add_argument("-o", "--output", required=True, help="JSONL results file (also the checkpoint)")
+    parser.add_argument("--mode", choices=MODES, default="auto")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BULK_GRADING_CONCURRENCY", "8")),
+                        help="LLM calls in flight at once")
+    parser.add_argument("--limit", type=int, help="Grade at most this many records")
+    parser.add_argument("--progress-seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        from dotenv import load_dotenv
+        load_dotenv("config.env")
+        api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        print("❌ OPENAI_API_KEY is not set")
+        sys.exit(1)
+    # An offline run has no interactive traffic to keep slots free for
+    os.environ["LLM_MAX_CONCURRENT"] = str(args.concurrency)
+    os.environ["LLM_SCHEDULER_RESERVED_INTERACTIVE"] = "0"
+
+    done = load_checkpoint(args.output)
+    skipped = 0
+    invalid = 0
+
+    def pending() -> Iterator[Tuple[str, Dict[str, Any], str, str]]:
+        nonlocal skipped, invalid
+        for record_id, record in read_records(args.input):
+            try:
+                mode = record_mode(record, args.mode)
+            except ValueError as e:
+                invalid += 1
+                print(f"⚠️ Skipping record {record_id}: {e}")
+                continue
+            hash_value = input_hash(record_inputs(record, mode))
+            if done.get(record_id) == hash_value:
+                skipped += 1
+                continue
+            yield record_id, record, mode, hash_value
+
+    total = count_records(args.input)
+    if args.limit is not None:
+        total = min(total, args.limit + len(done))
+    records = pending()
+    if args.limit is not None:
+        records = (r for _, r in zip(range(args.limit), records))
+
+    print(f"📝 Grading {args.input} -> {args.output} ({args.concurrency} concurrent"
+          f"{f', {len(done)} already graded' if done else ''})")
+    with open(args.output, "a", encoding="utf-8") as output:
+        grader = BulkGrader(api_key, output, args.concurrency)
+        try:
+            elapsed = grader.run(records, max(0, total - len(done)), args.progress_seconds)
+        except KeyboardInterrupt:
+            print(f"\n⏸️ Interrupted after {sum(grader.counts.values())} records; "
+                  f"run the same command again to resume")
+            os._exit(130)
+
+    graded = sum(grader.counts.values())
+    print(f"✅ {graded} graded in {elapsed:.1f}s ({graded / elapsed * 60 if elapsed else 0:.1f}/min): "
+          f"{grader.counts['ok']} ok, {grader.counts['pending']} pending, {grader.counts['error']} errors; "
+          f"{skipped} already done, {invalid} invalid")
+    if grader.counts["error"] or grader.counts["pending"]:
+        print("🔁 Run the same command again to retry the errors and pending records")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Request Deadlines
+Tracks how much time a request has left so grading work can stop once the
+client is no longer waiting for the answer.
+"""
+
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """Raised when work is attempted after the request deadline has passed"""
+
+
+class Deadline:
+    """A point in time after which a request's result is no longer useful"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        """Create a deadline `seconds` from now (None means no deadline)"""
+        self.expires_at = time.monotonic() + seconds if seconds else None
+
+    @classmethod
+    def from_budget(cls, requested: Optional[float], maximum: Optional[float]) -> "Deadline":
+        """Build a deadline from a client-requested budget, capped by the server maximum"""
+        budgets = [b for b in (requested, maximum) if b and b > 0]
+        return cls(min(budgets) if budgets else None)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline (None if unbounded)"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        """Whether the deadline has already passed"""
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self):
+        """Raise DeadlineExceeded if the deadline has passed"""
+        if self.expired():
+            raise DeadlineExceeded("Request deadline exceeded")
+
+    def call_kwargs(self) -> dict:
+        """Keyword arguments that bound a single LLM call by the time left"""
+        remaining = self.remaining()
+        return {} if remaining is None else {"timeout": remaining}
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Incremental Exam Sessions
+Grades mock exam questions in the background while the student is still
+writing, so submitting the paper only has to assemble the ExamReport from
+grades that are already computed.
+"""
+
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+import logging
+
+from deadlines import Deadline
+from llm_scheduler import scheduling_context
+from results_store import input_hash
+
+logger = logging.getLogger(__name__)
+
+
+class ExamSessionError(Exception):
+    """Raised for unknown, expired or already submitted sessions"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def question_key(question: Dict) -> str:
+    """Identify a question within a paper by its id and part"""
+    return f"{question.get('question_id', 0)}|{question.get('part', '')}"
+
+
+class _Answer:
+    """Latest submitted version of one question and its grading state"""
+
+    def __init__(self, question: Dict):
+        self.question = question
+        self.fingerprint = input_hash(question)
+        self.version = 0
+        self.future: Optional[Future] = None
+        self.grade = None  # QuestionGrade for the current version, once graded
+
+    def graded(self) -> bool:
+        """
+        Whether the current version has its grade (caller holds the session lock)
+
+        Reads a finished future directly: wait() returns before done-callbacks run.
+        A pending grade (capacity ran out) does not count; the answer is graded again.
+        """
+        future = self.future
+        if self.grade is None and future is not None and future.done() and not future.cancelled() \
+                and future.exception() is None:
+            grade = future.result()
+            if grade.status != "pending":
+                self.grade = grade
+        return self.grade is not None
+
+    def needs_regrade(self) -> bool:
+        """Grading finished without a grade (left pending at capacity); caller holds the session lock"""
+        return not self.graded() and self.future is not None and self.future.done()
+
+
+class ExamSession:
+    """One student's paper while it is being written"""
+
+    def __init__(self, student_id: Optional[str], exam_type: str):
+        self.session_id = uuid.uuid4().hex
+        self.student_id = student_id
+        self.exam_type = exam_type
+        self.created_at = time.time()
+        self.last_activity = time.monotonic()
+        self.answers: Dict[str, _Answer] = {}  # insertion ordered
+        self.report = None
+        self.lock = threading.RLock()
+
+    def status(self) -> Dict[str, Any]:
+        """Grading state of every question in the session"""
+        with self.lock:
+            questions = []
+            for key, answer in self.answers.items():
+                if answer.graded():
+                    state = "graded"
+                elif answer.future is not None and answer.future.running():
+                    state = "grading"
+                elif answer.needs_regrade():
+                    state = "pending"
+                else:
+                    state = "queued"
+                questions.append({
+                    "question_key": key,
+                    "question_id": answer.question.get("question_id", 0),
+                    "part": answer.question.get("part", ""),
+                    "version": answer.version,
+                    "status": state
+                })
+            return {
+                "session_id": self.session_id,
+                "student_id": self.student_id,
+                "exam_type": self.exam_type,
+                "submitted": self.report is not None,
+                "questions": questions,
+                "graded": sum(1 for q in questions if q["status"] == "graded"),
+                "total": len(questions)
+            }
+
+
+class ExamSessionManager:
+    """Holds open exam sessions and grades their answers in a background pool"""
+
+    def __init__(self, agent, max_workers: int = 4, ttl_seconds: float = 4 * 3600, max_sessions: int = 1000,
+                 submitted_ttl_seconds: float = 600):
+        self.agent = agent
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        # Submitted sessions are kept only to answer resubmits, and do not count toward max_sessions
+        self.submitted_ttl_seconds = submitted_ttl_seconds
+        self._sessions: Dict[str, ExamSession] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="exam-session-grader")
+
+    @classmethod
+    def from_env(cls, agent) -> "ExamSessionManager":
+        """Build a manager from EXAM_SESSION_* environment variables"""
+        return cls(
+            agent,
+            max_workers=int(os.getenv("EXAM_SESSION_WORKERS", "4")),
+            ttl_seconds=float(os.getenv("EXAM_SESSION_TTL_SECONDS", str(4 * 3600))),
+            max_sessions=int(os.getenv("EXAM_SESSION_MAX_SESSIONS", "1000")),
+            submitted_ttl_seconds=float(os.getenv("EXAM_SESSION_SUBMITTED_TTL_SECONDS", "600"))
+        )
+
+    def _evict_idle(self):
+        """Forget sessions idle longer than the TTL, and submitted ones idle longer than the submitted TTL"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                sid for sid, s in self._sessions.items()
+                if s.last_activity < now - (self.ttl_seconds if s.report is None else self.submitted_ttl_seconds)
+            ]
+            for session_id in expired:
+                del self._sessions[session_id]
+
+    def open_session(self, student_id: Optional[str], exam_type: str) -> ExamSession:
+        """Start a new session"""
+        self._evict_idle()
+        with self._lock:
+            if sum(1 for s in self._sessions.values() if s.report is None) >= self.max_sessions:
+                raise ExamSessionError("Too many open exam sessions, try again later", status_code=503)
+            session = ExamSession(student_id, exam_type)
+            self._sessions[session.session_id] = session
+        logger.info(f"📝 Exam session {session.session_id} opened ({exam_type})")
+        return session
+
+    def get_session(self, session_id: str) -> ExamSession:
+        """Look up an open session"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            raise ExamSessionError("Exam session not found or expired", status_code=404)
+        session.last_activity = time.monotonic()
+        return session
+
+    def _schedule(self, session: ExamSession, answer: _Answer):
+        """Queue background grading of the answer's current version (session lock held)"""
+        if answer.future is not None:
+            # Not started yet: drop it, the new version replaces it
+            answer.future.cancel()
+        answer.version += 1
+        answer.grade = None
+        version = answer.version
+        question = answer.question
+
+        def on_done(future: Future):
+            with session.lock:
+                # Ignore results for answers that changed while being graded
+                if answer.version == version:
+                    answer.graded()
+
+        answer.future = self._executor.submit(self._grade, session.student_id, question, session.exam_type)
+        answer.future.add_done_callback(on_done)
+
+    def _regrade_pending(self, session: ExamSession):
+        """Queue again the answers whose grading was left pending because capacity ran out"""
+        with session.lock:
+            if session.report is not None:
+                return
+            for answer in session.answers.values():
+                if answer.needs_regrade():
+                    self._schedule(session, answer)
+
+    def status(self, session_id: str) -> Dict[str, Any]:
+        """Grading state of a session, retrying answers left pending"""
+        session = self.get_session(session_id)
+        self._regrade_pending(session)
+        return session.status()
+
+    def _grade(self, student_id: Optional[str], question: Dict, exam_type: Optional[str] = None):
+        """Grade one answer on a pool thread, queued fairly against the student's other LLM calls"""
+        with scheduling_context(tenant=student_id):
+            return self.agent.grade_question(question, exam_type=exam_type)
+
+    def submit_answer(self, session_id: str, question: Dict) -> Dict[str, Any]:
+        """Add or update one answer; changed answers are regraded in the background"""
+        session = self.get_session(session_id)
+        key = question_key(question)
+        with session.lock:
+            if session.report is not None:
+                raise ExamSessionError("Exam session already submitted", status_code=409)
+            answer = session.answers.get(key)
+            fingerprint = input_hash(question)
+            if answer is not None and answer.fingerprint == fingerprint:
+                return {"question_key": key, "version": answer.version, "status": "unchanged"}
+            if answer is None:
+                answer = session.answers[key] = _Answer(question)
+            else:
+                answer.question = question
+                answer.fingerprint = fingerprint
+            self._schedule(session, answer)
+            return {"question_key": key, "version": answer.version, "status": "queued"}
+
+    def remove_answer(self, session_id: str, key: str) -> bool:
+        """Drop an answer the student withdrew"""
+        session = self.get_session(session_id)
+        with session.lock:
+            answer = session.answers.pop(key, None)
+            if answer is not None and answer.future is not None:
+                answer.future.cancel()
+            return answer is not None
+
+    def submit(self, session_id: str, attempted_questions: Optional[List[Dict]] = None,
+               deadline: Optional[Deadline] = None):
+        """
+        Finish the paper and assemble the ExamReport
+
+        Args:
+            session_id: Session to submit
+            attempted_questions: Optional final answers; any that differ from the session are regraded
+            deadline: Questions still grading when it passes are reported as pending
+
+        Returns:
+            The ExamReport (the same report on repeated submits once every question is graded;
+            a partial report is rebuilt on the next submit, with the pending questions regraded)
+        """
+        deadline = deadline or Deadline()
+        session = self.get_session(session_id)
+
+        with session.lock:
+            if session.report is not None:
+                return session.report
+        for question in attempted_questions or []:
+            self.submit_answer(session_id, question)
+        self._regrade_pending(session)
+
+        with session.lock:
+            if attempted_questions:
+                order = [question_key(q) for q in attempted_questions]
+            else:
+                order = list(session.answers)
+            answers = [session.answers[key] for key in order if key in session.answers]
+            outstanding = [a.future for a in answers if not a.graded() and a.future is not None]
+
+        if outstanding:
+            logger.info(f"⏳ Exam session {session_id}: waiting for {len(outstanding)} questions still grading")
+            wait(outstanding, timeout=deadline.remaining())
+
+        with session.lock:
+            if session.report is not None:
+                return session.report
+            questions = [a.question for a in answers]
+            # Futures finished during wait() may not have run their done-callbacks yet
+            grades = [a.grade if a.graded() else None for a in answers]
+            report = self.agent.build_report(questions, grades)
+            if not report.is_partial:
+                session.report = report
+            return report
+
+    def stats(self) -> Dict[str, Any]:
+        """Session counts for health reporting"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        outstanding = sum(
+            1 for s in sessions for a in list(s.answers.values())
+            if a.future is not None and not a.future.done()
+        )
+        return {
+            "open_sessions": sum(1 for s in sessions if s.report is None),
+            "submitted_sessions": sum(1 for s in sessions if s.report is not None),
+            "questions_grading": outstanding
+        }
+
+    def shutdown(self):
+        """Stop the grading pool without waiting for queued work"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
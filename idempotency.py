@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Idempotency Keys
+Lets clients safely resend a grading submission: a repeat with the same
+Idempotency-Key returns the stored result, or waits on the grading run that is
+already in progress, instead of paying for the LLM calls again.
+"""
+
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyConflict(Exception):
+    """Raised when a key is reused with a different request body"""
+
+
+class _Entry:
+    """A grading run (finished or in progress) registered under a key"""
+
+    def __init__(self, fingerprint: str, task: "asyncio.Task", expires_at: float):
+        self.fingerprint = fingerprint
+        self.task = task
+        self.expires_at = expires_at
+
+
+class IdempotencyStore:
+    """In-memory idempotency keys with a bounded TTL and entry count"""
+
+    def __init__(self, ttl_seconds: float = 900, max_entries: int = 2000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.replays = 0
+
+    @classmethod
+    def from_env(cls) -> "IdempotencyStore":
+        """Build a store from IDEMPOTENCY_* environment variables"""
+        return cls(
+            ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "900")),
+            max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "2000"))
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self):
+        """Drop expired entries, then the oldest finished ones while over capacity"""
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if e.expires_at <= now and e.task.done()]:
+            del self._entries[key]
+        if len(self._entries) > self.max_entries:
+            for key in [k for k, e in self._entries.items() if e.task.done()]:
+                if len(self._entries) <= self.max_entries:
+                    break
+                del self._entries[key]
+
+    async def run(self, scope: str, key: str, fingerprint: str,
+                  func: Callable[[], Awaitable[Any]],
+                  keep: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, bool]:
+        """
+        Run func once per (scope, key)
+
+        Args:
+            scope: Endpoint the key belongs to
+            key: Client-supplied idempotency key
+            fingerprint: Hash of the request body, to detect a key reused for different input
+            func: Coroutine factory that does the actual work
+            keep: Whether a result may be replayed (a partial report should be graded again on retry)
+
+        Returns:
+            (result, replayed) where replayed is True if the result came from an earlier request
+        """
+        full_key = f"{scope}:{key}"
+        self._evict()
+
+        entry = self._entries.get(full_key)
+        if entry is not None and entry.task.done() and (entry.task.cancelled() or entry.task.exception()):
+            # A failed run is never replayed; run it again
+            del self._entries[full_key]
+            entry = None
+        if entry is not None and entry.expires_at > time.monotonic():
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyConflict("Idempotency-Key was already used with a different request body")
+            self.replays += 1
+            logger.info(f"🔁 Idempotent replay for {scope} ({'in progress' if not entry.task.done() else 'stored'})")
+            # Shield so a disconnecting client does not cancel the shared run
+            return await asyncio.shield(entry.task), True
+
+        # Run as its own task so the work survives the original client going away
+        task = asyncio.ensure_future(func())
+        self._entries[full_key] = _Entry(fingerprint, task, time.monotonic() + self.ttl_seconds)
+        try:
+            result = await asyncio.shield(task)
+        except Exception:
+            # Failed runs are not stored, so the client can retry with the same key
+            self._forget(full_key, task)
+            raise
+        if keep is not None and not keep(result):
+            # Returned to the callers waiting on it, but a retry runs again
+            self._forget(full_key, task)
+        return result, False
+
+    def _forget(self, full_key: str, task: "asyncio.Task"):
+        """Drop the key if it still belongs to this run"""
+        entry = self._entries.get(full_key)
+        if entry is not None and entry.task is task:
+            del self._entries[full_key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Key counts for health reporting"""
+        in_progress = sum(1 for e in self._entries.values() if not e.task.done())
+        return {
+            "keys": len(self._entries),
+            "in_progress": in_progress,
+            "replays": self.replays,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+
+def resolve_key(header_value: Optional[str], body_value: Optional[str]) -> Optional[str]:
+    """The idempotency key from the header, falling back to the body field"""
+    key = (header_value or body_value or "").strip()
+    return key[:255] or None
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+LLM Output Parser
+Turns raw LLM text into validated pydantic models locally, so that output which
+is almost-but-not-quite JSON never needs a second LLM call to reformat it.
+
+Handles code fences, prose around the JSON, trailing commas, numbers such as
+"75%" or "35/50", Python-style literals, truncated (partial) JSON and, as a
+last resort, "Label: value" prose.
+
+IncrementalJSONParser reads a JSON object while it is still streaming in, so
+each field, array item or paragraph can be used as soon as it is complete.
+"""
+
+import json
+import re
+import typing
+from typing import Any, Dict, Iterable, List, Optional, Type, TypeVar
+from pydantic import BaseModel, ValidationError
+import logging
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+_FRACTION_RE = re.compile(r"(-?\d+(?:\.\d+)?)\s*/\s*\d+(?:\.\d+)?")
+_PERCENT_RE = re.compile(r"(-?\d+(?:\.\d+)?)\s*%")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_PY_LITERAL_RE = re.compile(r"\b(True|False|None)\b")
+_NUMBER_RE = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+
+
+def _split_strings(text: str) -> List[tuple]:
+    """Split text into (is_string, segment) pieces so repairs never touch string contents"""
+    segments = []
+    start = 0
+    i = 0
+    in_string = False
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if ch == "\\":
+                i += 2
+                continue
+            if ch == '"':
+                segments.append((True, text[start:i + 1]))
+                start = i + 1
+                in_string = False
+        elif ch == '"':
+            segments.append((False, text[start:i]))
+            start = i
+            in_string = True
+        i += 1
+    segments.append((in_string, text[start:]))
+    return segments
+
+
+def _repair(text: str) -> str:
+    """Fix the common ways LLM JSON deviates from the spec"""
+    repaired = []
+    for is_string, segment in _split_strings(text):
+        if not is_string:
+            segment = _FRACTION_RE.sub(r"\1", segment)
+            segment = _PERCENT_RE.sub(r"\1", segment)
+            segment = _PY_LITERAL_RE.sub(lambda m: _PY_LITERALS[m.group(1)], segment)
+            segment = _TRAILING_COMMA_RE.sub(r"\1", segment)
+        repaired.append(segment)
+    return "".join(repaired)
+
+
+def _open_state(text: str) -> tuple:
+    """The closers still owed at the end of text, and whether it ends inside a string"""
+    stack = []
+    in_string = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if ch == "\\":
+                i += 1
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+        i += 1
+    return stack, in_string
+
+
+def _is_truncated(text: str) -> bool:
+    """True if the text stops inside a string, array or object"""
+    stack, in_string = _open_state(text)
+    return bool(stack) or in_string
+
+
+def _close_partial(text: str) -> str:
+    """Close any strings, arrays and objects left open by a truncated response"""
+    stack, in_string = _open_state(text)
+    if in_string:
+        text += '"'
+    text = text.rstrip()
+    if text.endswith(":"):
+        text += " null"
+    text = text.rstrip(",")
+    return text + "".join(reversed(stack))
+
+
+def _balanced_objects(text: str) -> List[str]:
+    """Every top-level {...} block in the text, plus an unterminated trailing one"""
+    blocks = []
+    depth = 0
+    start = None
+    in_string = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if ch == "\\":
+                i += 1
+            elif ch == '"':
+                in_string = False
+        elif ch == '"' and depth:
+            in_string = True
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                blocks.append(text[start:i + 1])
+                start = None
+        i += 1
+    if start is not None:
+        blocks.append(text[start:])
+    return blocks
+
+
+def _loads_dict(candidate: str) -> Optional[Dict[str, Any]]:
+    """json.loads that only accepts objects (literal newlines and tabs inside strings are allowed)"""
+    try:
+        value = json.loads(candidate, strict=False)
+    except (json.JSONDecodeError, ValueError):
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def _parse_candidate(candidate: str) -> Optional[Dict[str, Any]]:
+    """Parse one candidate block, repairing and closing it if needed"""
+    result = _loads_dict(candidate)
+    if result is not None:
+        return result
+
+    repaired = _repair(candidate)
+    result = _loads_dict(repaired)
+    if result is not None or not _is_truncated(repaired):
+        # A complete object that still does not parse is malformed, not cut off: its members are not guessed at
+        return result
+
+    result = _loads_dict(_close_partial(repaired))
+    if result is not None:
+        return result
+
+    # Truncated mid key/value: drop the incomplete tail one member at a time
+    trimmed = repaired
+    for _ in range(5):
+        cut = max(trimmed.rfind(","), trimmed.rfind("{", 1))
+        if cut <= 0:
+            break
+        trimmed = trimmed[:cut]
+        result = _loads_dict(_close_partial(trimmed))
+        if result is not None:
+            return result
+    return None
+
+
+def parse_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Extract the first JSON object from LLM output
+
+    Args:
+        text: Raw model output, possibly wrapped in prose or code fences
+
+    Returns:
+        The parsed dict, or None if nothing salvageable was found
+    """
+    if not text:
+        return None
+
+    result = _loads_dict(text.strip())
+    if result is not None:
+        return result
+
+    sources = [match.group(1) for match in _FENCE_RE.finditer(text)] + [text]
+    for source in sources:
+        for block in _balanced_objects(source):
+            result = _parse_candidate(block)
+            if result is not None:
+                return result
+    return None
+
+
+def _to_number(value: Any) -> Any:
+    """Pull a number out of values like '75%', '35/50', '$1,200' or '30 minutes'"""
+    if isinstance(value, (int, float)) or value is None:
+        return value
+    match = _NUMBER_RE.search(str(value))
+    if not match:
+        return value
+    return float(match.group(0).replace(",", ""))
+
+
+def _to_list(value: Any) -> Any:
+    """Turn a bulleted or newline separated string into a list of strings"""
+    if isinstance(value, list):
+        return [v if isinstance(v, str) else json.dumps(v) if isinstance(v, dict) else str(v) for v in value]
+    if isinstance(value, str):
+        lines = [_BULLET_RE.sub("", line).strip() for line in value.splitlines()]
+        return [line for line in lines if line]
+    return value
+
+
+def _field_kind(annotation: Any) -> str:
+    """Classify a pydantic field annotation as number, list, text or other"""
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        return _field_kind(args[0]) if len(args) == 1 else "other"
+    if annotation in (int, float):
+        return "number"
+    if origin in (list, List):
+        return "list"
+    if annotation is str:
+        return "text"
+    return "other"
+
+
+def _coerce(data: Dict[str, Any], model_cls: Type[BaseModel]) -> Dict[str, Any]:
+    """Coerce loosely typed values to what the model expects"""
+    coerced = dict(data)
+    for name, field in model_cls.model_fields.items():
+        if name not in coerced:
+            continue
+        kind = _field_kind(field.annotation)
+        value = coerced[name]
+        if kind == "number":
+            value = _to_number(value)
+            if field.annotation is int and isinstance(value, float):
+                value = int(round(value))
+        elif kind == "list":
+            value = _to_list(value)
+        elif kind == "text" and isinstance(value, list):
+            value = "\n".join(str(v) for v in value)
+        coerced[name] = value
+    return coerced
+
+
+def _label_pattern(field_name: str) -> str:
+    """Regex for a field's label in prose, e.g. areas_for_improvement -> 'areas for improvement'"""
+    words = field_name.split("_")
+    return r"[\s#*]*" + r"[\s_-]+".join(re.escape(w) for w in words) + r"[\s*]*(?:\([^)]*\))?[\s*]*[:\-]"
+
+
+def parse_labelled_prose(text: str, model_cls: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    Extract fields from 'Label: value' prose
+
+    Numbers and single-line text are read from the label line; lists are read
+    from the bullet points that follow their label.
+    """
+    lines = text.splitlines()
+    fields = {}
+    for name, field in model_cls.model_fields.items():
+        kind = _field_kind(field.annotation)
+        pattern = re.compile(r"^(?:\d+[.)])?" + _label_pattern(name) + r"\s*(.*)$", re.IGNORECASE)
+        for index, line in enumerate(lines):
+            match = pattern.match(line)
+            if not match:
+                continue
+            rest = match.group(1).strip().strip("*").strip()
+            if kind == "list":
+                items = [rest] if rest else []
+                for following in lines[index + 1:]:
+                    if not following.strip():
+                        if items:
+                            break
+                        continue
+                    if not _BULLET_RE.match(following):
+                        break
+                    items.append(_BULLET_RE.sub("", following).strip())
+                if items:
+                    fields[name] = items
+            elif rest:
+                fields[name] = rest
+            break
+    return fields
+
+
+def parse_structured_output(
+    text: str,
+    model_cls: Type[ModelT],
+    defaults: Optional[Dict[str, Any]] = None,
+    allow_prose: bool = False,
+    required: Iterable[str] = ()
+) -> Optional[ModelT]:
+    """
+    Parse LLM output into a validated pydantic model
+
+    Args:
+        text: Raw model output
+        model_cls: Pydantic model to validate against
+        defaults: Values for fields the output did not provide
+        allow_prose: Fall back to 'Label: value' extraction when no JSON is found
+        required: Fields the output itself must provide (a score), even if the model has a default
+
+    Returns:
+        A model instance, or None if the output could not be salvaged
+    """
+    with span("parse_output", model=model_cls.__name__, chars=len(text or "")) as parse_span:
+        data = parse_json_object(text)
+        if data is None and allow_prose:
+            data = parse_labelled_prose(text or "", model_cls) or None
+        if data is None:
+            parse_span.set(parsed=False)
+            return None
+
+        coerced = _coerce(data, model_cls)
+        missing = [name for name in required if coerced.get(name) is None]
+        if missing:
+            # An empty or cut-off reply is a parse failure, not a grade made up from defaults
+            logger.warning(f"Structured output for {model_cls.__name__} is missing {', '.join(missing)}")
+            parse_span.set(parsed=False)
+            return None
+        merged = {**(defaults or {}), **coerced}
+        try:
+            result = model_cls(**merged)
+        except ValidationError as e:
+            logger.warning(f"Structured output failed validation for {model_cls.__name__}: {e.error_count()} errors")
+            parse_span.set(parsed=False)
+            return None
+        parse_span.set(parsed=True)
+        return result
+
+
+def _loads_value(raw: str) -> Any:
+    """Parse one complete JSON value, repairing it if needed; the raw text if it cannot be parsed"""
+    for candidate in (raw, _repair(raw)):
+        try:
+            return json.loads(candidate, strict=False)
+        except ValueError:
+            continue
+    return raw
+
+
+class IncrementalJSONParser:
+    """
+    Parse a JSON object as it streams in, reporting each part once it is complete
+
+    feed() and close() return events as (kind, key, index, value) tuples:
+        ("item", key, index, value)    an element of the top-level array `key`
+        ("field", key, None, value)    a complete top-level field
+        ("section", key, index, text)  a blank-line separated section of a
+                                       string field named in section_fields,
+                                       before the rest of the string arrives
+
+    Anything before the first "{" (prose, a code fence) is skipped. Values are
+    only parsed once complete, so the cost stays linear in the output length.
+    """
+
+    def __init__(self, section_fields: Iterable[str] = ()):
+        self.section_fields = set(section_fields)
+        self.text = ""
+        self._pos = 0
+        self._started = False
+        self._finished = False
+        self._stack: List[Dict[str, Any]] = []
+        self._in_string = False
+        self._string_is_key = False
+        self._escape = False
+        self._string_start = 0
+        self._scalar_start: Optional[int] = None
+        self._section: Optional[Dict[str, Any]] = None
+
+    def feed(self, chunk: str) -> List[tuple]:
+        """Add the next piece of output; returns the events it completed"""
+        self.text += chunk
+        events: List[tuple] = []
+        text = self.text
+        while self._pos < len(text) and not self._finished:
+            i = self._pos
+            ch = text[i]
+            self._pos += 1
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._stack.append({"kind": "object", "key": None, "index": 0, "start": i, "expect": "key"})
+                continue
+            if self._in_string:
+                self._string_char(ch, i, events)
+                continue
+            if self._scalar_start is not None:
+                if ch not in ",}] \t\r\n":
+                    continue
+                self._complete(self._scalar_start, i, events)
+                self._scalar_start = None
+            frame = self._stack[-1]
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = frame["kind"] == "object" and frame["expect"] == "key"
+                if not self._string_is_key and len(self._stack) == 1 and frame["key"] in self.section_fields:
+                    self._section = {"key": frame["key"], "start": i + 1, "index": 0, "newlines": 0}
+            elif ch in "{[":
+                self._stack.append({"kind": "object" if ch == "{" else "array", "key": None, "index": 0,
+                                    "start": i, "expect": "key"})
+            elif ch in "}]":
+                closed = self._stack.pop()
+                if self._stack:
+                    self._complete(closed["start"], i + 1, events)
+                else:
+                    self._finished = True
+            elif ch == ",":
+                if frame["kind"] == "array":
+                    frame["index"] += 1
+                else:
+                    frame["expect"] = "key"
+            elif ch == ":":
+                frame["expect"] = "value"
+            elif not ch.isspace():
+                self._scalar_start = i
+        return events
+
+    def close(self) -> List[tuple]:
+        """End of output: report the rest of a section cut off by a truncated response"""
+        events: List[tuple] = []
+        if self._section is not None and self._in_string:
+            self._emit_section(len(self.text) - (1 if self._escape else 0), events)
+            self._section = None
+        return events
+
+    def _string_char(self, ch: str, i: int, events: List[tuple]):
+        """Advance through a string, tracking blank lines in section fields"""
+        if self._escape:
+            self._escape = False
+            self._track_newline(ch == "n", ch in "rt", i, events)
+            return
+        if ch == "\\":
+            self._escape = True
+            return
+        if ch == '"':
+            self._in_string = False
+            if self._string_is_key:
+                self._stack[-1]["key"] = _loads_value(self.text[self._string_start:i + 1])
+                return
+            if self._section is not None:
+                self._emit_section(i, events)
+                self._section = None
+            self._complete(self._string_start, i + 1, events)
+            return
+        self._track_newline(ch == "\n", ch in " \t\r", i, events)
+
+    def _track_newline(self, newline: bool, blank: bool, i: int, events: List[tuple]):
+        section = self._section
+        if section is None:
+            return
+        if newline:
+            section["newlines"] += 1
+            if section["newlines"] >= 2:
+                self._emit_section(i + 1, events)
+                section["newlines"] = 0
+        elif not blank:
+            section["newlines"] = 0
+
+    def _emit_section(self, end: int, events: List[tuple]):
+        section = self._section
+        raw = self.text[section["start"]:end]
+        try:
+            value = json.loads(f'"{raw}"', strict=False)
+        except ValueError:
+            value = raw
+        section["start"] = end
+        value = value.strip()
+        if value:
+            events.append(("section", section["key"], section["index"], value))
+            section["index"] += 1
+
+    def _complete(self, start: int, end: int, events: List[tuple]):
+        """A value ended: report it if it is a top-level field or an item of a top-level array"""
+        depth = len(self._stack)
+        if depth == 1:
+            events.append(("field", self._stack[0]["key"], None, _loads_value(self.text[start:end])))
+        elif depth == 2 and self._stack[1]["kind"] == "array" and self._stack[0]["key"] is not None:
+            events.append(("item", self._stack[0]["key"], self._stack[1]["index"],
+                           _loads_value(self.text[start:end])))
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+LLM Call Pacing
+Keeps outbound LLM calls under the provider's rate limits instead of
+discovering them through bursts of 429s.
+
+QuotaTracker reads the x-ratelimit-* headers of each response (limit,
+remaining and reset, for requests and tokens) and spreads the quota that is
+left evenly over the time until it resets, so a burst of mock exams is paced
+rather than rejected. AdaptiveConcurrency adjusts how many calls may be in
+flight at once: it grows additively while latency stays near its baseline and
+shrinks multiplicatively on 429s or when latency climbs (the provider is
+queueing our calls). Latency is compared per output token, against a
+baseline kept per model, so a mix of small and large models or short and
+long replies does not look like a slowdown.
+"""
+
+import os
+import re
+import time
+import threading
+from typing import Any, Dict, Mapping, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import openai
+    RATE_LIMIT_ERRORS = (openai.RateLimitError,)
+except ImportError:
+    RATE_LIMIT_ERRORS = ()
+
+# Replies shorter than this are normalized as if this long: their time is mostly fixed overhead
+MIN_NORMALIZED_TOKENS = 50
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def per_token_latency(latency: float, output_tokens: Optional[int]) -> Optional[float]:
+    """Seconds per output token of a call, None when the token count is unknown"""
+    if not output_tokens:
+        return None
+    return latency / max(output_tokens, MIN_NORMALIZED_TOKENS)
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse a reset header ('1s', '6m0s', '20ms', '1h2m3.5s' or plain seconds) into seconds"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts or "".join(n + u for n, u in parts) != value:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def response_headers(response) -> Mapping[str, str]:
+    """Headers of an LLM response (needs include_response_headers=True on the client)"""
+    return (getattr(response, "response_metadata", None) or {}).get("headers") or {}
+
+
+def error_headers(error: Exception) -> Mapping[str, str]:
+    """Headers of the HTTP response behind an OpenAI API error"""
+    response = getattr(error, "response", None)
+    return getattr(response, "headers", None) or {}
+
+
+def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds to wait before retrying, from retry-after(-ms) or the request quota reset"""
+    if headers.get("retry-after-ms"):
+        seconds = parse_duration(headers["retry-after-ms"])
+        return seconds / 1000 if seconds is not None else None
+    for name in ("retry-after", "x-ratelimit-reset-requests"):
+        seconds = parse_duration(headers.get(name))
+        if seconds is not None:
+            return seconds
+    return None
+
+
+def _int(value) -> Optional[int]:
+    return int(value) if value is not None and str(value).isdigit() else None
+
+
+class QuotaTracker:
+    """Request and token quota last reported by one API key, and the pacing it implies"""
+
+    def __init__(self, reserve_fraction: float = 0.05):
+        self.reserve_fraction = reserve_fraction
+        self._lock = threading.Lock()
+        self._windows: Dict[str, Dict[str, Any]] = {}
+        self._next_at = 0.0
+        self._tokens_per_call: Optional[float] = None
+        self.paced_calls = 0
+        self.paced_seconds = 0.0
+
+    def update(self, headers: Mapping[str, str], tokens_used: Optional[int] = None):
+        """Take the quota from a response's (or 429's) headers"""
+        now = time.monotonic()
+        with self._lock:
+            for kind in ("requests", "tokens"):
+                remaining = _int(headers.get(f"x-ratelimit-remaining-{kind}"))
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if remaining is None or reset is None:
+                    continue
+                self._windows[kind] = {
+                    "limit": _int(headers.get(f"x-ratelimit-limit-{kind}")) or self._windows.get(kind, {}).get("limit"),
+                    "remaining": remaining,
+                    "reset_at": now + reset
+                }
+            if tokens_used:
+                self._tokens_per_call = (tokens_used if self._tokens_per_call is None
+                                         else 0.8 * self._tokens_per_call + 0.2 * tokens_used)
+
+    def exhaust(self, seconds: float):
+        """Mark the request quota as used up for `seconds` (after a 429)"""
+        with self._lock:
+            window = self._windows.setdefault("requests", {"limit": None})
+            window["remaining"] = 0
+            window["reset_at"] = time.monotonic() + seconds
+
+    def _spacing(self, kind: str, cost: float, now: float) -> float:
+        """Seconds between calls that spends what is left of a window evenly until it resets (lock held)"""
+        window = self._windows.get(kind)
+        if not window or window["reset_at"] <= now:
+            return 0.0
+        left = window["reset_at"] - now
+        usable = window["remaining"] - (window["limit"] or 0) * self.reserve_fraction
+        if usable < cost:
+            return left
+        return left * cost / usable
+
+    def delay(self) -> float:
+        """Seconds the next call would have to wait, without reserving it"""
+        now = time.monotonic()
+        with self._lock:
+            wait = max(0.0, self._next_at - now)
+            window = self._windows.get("requests")
+            if window and window["reset_at"] > now and window["remaining"] <= 0:
+                wait = max(wait, window["reset_at"] - now)
+            return wait
+
+    def reserve(self) -> float:
+        """Reserve the next call's place in the pacing schedule; returns how long to wait first"""
+        now = time.monotonic()
+        with self._lock:
+            spacing = max(
+                self._spacing("requests", 1, now),
+                self._spacing("tokens", self._tokens_per_call or 0, now) if self._tokens_per_call else 0.0
+            )
+            start = max(now, self._next_at)
+            self._next_at = start + spacing
+            # Count the call against the reported quota until the next response updates it
+            for kind, cost in (("requests", 1), ("tokens", self._tokens_per_call or 0)):
+                window = self._windows.get(kind)
+                if window and window["reset_at"] > now:
+                    window["remaining"] = max(0, window["remaining"] - cost)
+            wait = start - now
+            if wait > 0:
+                self.paced_calls += 1
+                self.paced_seconds += wait
+            return wait
+
+    def quota_fraction(self) -> float:
+        """Share of the request quota left in the current window, 1.0 when unknown"""
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get("requests")
+            if not window or window["reset_at"] <= now or not window.get("limit"):
+                return 1.0
+            return window["remaining"] / window["limit"]
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                **{
+                    kind: {
+                        "limit": w.get("limit"),
+                        "remaining": w.get("remaining"),
+                        "resets_in_seconds": round(max(0.0, w["reset_at"] - now), 2)
+                    }
+                    for kind, w in self._windows.items()
+                },
+                "paced_calls": self.paced_calls,
+                "paced_seconds": round(self.paced_seconds, 2),
+                "tokens_per_call": round(self._tokens_per_call) if self._tokens_per_call else None
+            }
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on calls in flight, driven by per-model latency and 429s"""
+
+    def __init__(self, max_limit: int, min_limit: int = 1, latency_tolerance: float = 2.0,
+                 decrease_interval: float = 2.0):
+        self.max_limit = max_limit
+        self.min_limit = max(1, min(min_limit, max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.decrease_interval = decrease_interval
+        self.limit = float(max_limit)
+        self._lock = threading.Lock()
+        # Per model (and unit): EWMA latency and the baseline it is compared with
+        self._latencies: Dict[str, Dict[str, Optional[float]]] = {}
+        self._last_decrease = 0.0
+        self.rate_limited = 0
+        self.decreases = 0
+
+    def current(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    def _decrease(self, factor: float, now: float) -> bool:
+        """Shrink the limit, at most once per interval so one burst is not counted many times (lock held)"""
+        if now - self._last_decrease < self.decrease_interval:
+            return False
+        self.limit = max(float(self.min_limit), self.limit * factor)
+        self._last_decrease = now
+        self.decreases += 1
+        return True
+
+    def on_success(self, latency: float, output_tokens: Optional[int] = None, model: Optional[str] = None):
+        """A completed (non-streamed) call: its latency per output token, or per call when tokens are unknown"""
+        per_token = per_token_latency(latency, output_tokens)
+        key = f"{model or 'default'}/{'token' if per_token is not None else 'call'}"
+        sample = per_token if per_token is not None else latency
+        now = time.monotonic()
+        with self._lock:
+            state = self._latencies.setdefault(key, {"ewma": None, "baseline": None})
+            ewma = sample if state["ewma"] is None else 0.8 * state["ewma"] + 0.2 * sample
+            # The baseline follows the lowest latency seen, drifting up slowly so it can adapt
+            baseline = ewma if state["baseline"] is None else min(state["baseline"] * 1.01, ewma)
+            state["ewma"], state["baseline"] = ewma, baseline
+            if ewma > baseline * self.latency_tolerance:
+                if self._decrease(0.9, now):
+                    logger.info(f"🐢 LLM latency for {key} {ewma / baseline:.1f}x over baseline, "
+                                f"concurrency -> {self.current()}")
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+    def on_rate_limited(self):
+        now = time.monotonic()
+        with self._lock:
+            self.rate_limited += 1
+            if self._decrease(0.5, now):
+                logger.warning(f"🚧 LLM rate limited, concurrency -> {self.current()}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": self.current(),
+                "max_limit": self.max_limit,
+                "min_limit": self.min_limit,
+                "latency_ms": {
+                    key: {"ewma": round(state["ewma"] * 1000, 2), "baseline": round(state["baseline"] * 1000, 2)}
+                    for key, state in self._latencies.items()
+                },
+                "rate_limited": self.rate_limited,
+                "decreases": self.decreases
+            }
+
+
+def pacing_settings_from_env() -> Dict[str, Any]:
+    """Scheduler pacing options from LLM_PACING_* environment variables"""
+    return {
+        "pacing": os.getenv("LLM_PACING_ENABLED", "true").lower() == "true",
+        "min_concurrent": int(os.getenv("LLM_PACING_MIN_CONCURRENT", "1")),
+        "latency_tolerance": float(os.getenv("LLM_PACING_LATENCY_TOLERANCE", "2.0")),
+        "rate_limit_retries": int(os.getenv("LLM_RATE_LIMIT_RETRIES", "2"))
+    }
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+LLM Endpoint Pool
+Spreads LLM calls over several OpenAI-compatible endpoints (API keys and/or
+base URLs) so throughput is not capped by a single key's rate limits.
+
+Each call goes to the healthy endpoint with the fewest outstanding requests
+relative to its weight and the request quota it last reported in its
+x-ratelimit-* headers, and is paced to fit that endpoint's quota. Connection errors, timeouts, 429s and 5xx responses
+move the call to the next endpoint; an endpoint that fails repeatedly is
+ejected for a back-off period that doubles while it keeps failing.
+
+    LLM_ENDPOINTS=primary||sk-aaa,secondary||sk-bbb,local|http://localhost:8001/v1|local|0.5
+    (name|base_url|api_key|weight; empty base_url = OpenAI, empty api_key = OPENAI_API_KEY)
+"""
+
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+from deadlines import DeadlineExceeded
+from llm_pacing import QuotaTracker, RATE_LIMIT_ERRORS, error_headers, response_headers, retry_after
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+try:
+    import openai
+    # Failures that say nothing about the request itself, so another endpoint may succeed
+    RETRYABLE_ERRORS = (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError,
+                        openai.InternalServerError)
+except ImportError:
+    RETRYABLE_ERRORS = (ConnectionError, TimeoutError)
+
+
+class LLMEndpoint:
+    """One API key / base URL and its observed health"""
+
+    def __init__(self, name: str, base_url: Optional[str], api_key: str, weight: float = 1.0):
+        self.name = name
+        self.base_url = base_url or None
+        self.api_key = api_key
+        self.weight = max(weight, 0.01)
+        self.outstanding = 0
+        self.calls = 0
+        self.errors = 0
+        self.failovers = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.quota = QuotaTracker()
+        self.latency_ewma: Optional[float] = None
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def load(self) -> float:
+        """Selection score: outstanding calls per unit of weight, inflated as the quota runs out"""
+        return (self.outstanding + 1) / self.weight / max(self.quota.quota_fraction(), 0.05)
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url or "https://api.openai.com/v1",
+            "weight": self.weight,
+            "healthy": self.available(now),
+            "ejected_for_seconds": round(self.ejected_until - now, 1) if not self.available(now) else 0,
+            "outstanding": self.outstanding,
+            "calls": self.calls,
+            "errors": self.errors,
+            "failovers": self.failovers,
+            "ejections": self.ejections,
+            "quota": self.quota.stats(),
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None
+        }
+
+
+def parse_endpoints(spec: str, default_api_key: Optional[str]) -> List[LLMEndpoint]:
+    """Parse LLM_ENDPOINTS ('name|base_url|api_key|weight', comma separated)"""
+    endpoints = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        fields = [f.strip() for f in item.split("|")] + ["", "", ""]
+        name, base_url, api_key, weight = fields[:4]
+        try:
+            endpoints.append(LLMEndpoint(
+                name or f"endpoint-{len(endpoints) + 1}",
+                base_url,
+                api_key or default_api_key or "",
+                float(weight) if weight else 1.0
+            ))
+        except ValueError:
+            logger.error(f"❌ Ignoring invalid LLM endpoint '{name}' (expected name|base_url|api_key|weight)")
+    return endpoints
+
+
+class LLMPool:
+    """Least-loaded selection, failover and ejection across LLM endpoints"""
+
+    def __init__(self, endpoints: List[LLMEndpoint], eject_after: int = 3, eject_seconds: float = 30.0,
+                 max_eject_seconds: float = 300.0):
+        if not endpoints:
+            raise ValueError("LLMPool needs at least one endpoint")
+        self.endpoints = endpoints
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, default_api_key: Optional[str]) -> Optional["LLMPool"]:
+        """A pool from LLM_ENDPOINTS and LLM_POOL_* environment variables, or None when not configured"""
+        endpoints = parse_endpoints(os.getenv("LLM_ENDPOINTS", ""), default_api_key)
+        if not endpoints:
+            return None
+        pool = cls(
+            endpoints,
+            eject_after=int(os.getenv("LLM_POOL_EJECT_AFTER", "3")),
+            eject_seconds=float(os.getenv("LLM_POOL_EJECT_SECONDS", "30")),
+            max_eject_seconds=float(os.getenv("LLM_POOL_MAX_EJECT_SECONDS", "300"))
+        )
+        logger.info(f"🔀 LLM pool with {len(endpoints)} endpoints: {', '.join(e.name for e in endpoints)}")
+        return pool
+
+    def bind(self, llm) -> "PooledChatModel":
+        """A drop-in replacement for a ChatOpenAI client that sends its calls through the pool"""
+        return PooledChatModel(self, llm)
+
+    def _acquire(self, tried: set) -> Optional[LLMEndpoint]:
+        """Pick and reserve the least-loaded healthy endpoint not yet tried for this call"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.name not in tried and e.available(now)]
+            if not candidates:
+                # Everything is ejected: try the untried endpoint that comes back first rather than fail outright
+                candidates = sorted((e for e in self.endpoints if e.name not in tried),
+                                    key=lambda e: e.ejected_until)[:1]
+            if not candidates:
+                return None
+            # Endpoints that can take a call right away first, then the least loaded
+            endpoint = min(candidates, key=lambda e: (e.quota.delay() > 0, e.load()))
+            endpoint.outstanding += 1
+            return endpoint
+
+    def _release(self, endpoint: LLMEndpoint, latency: float, error: Optional[Exception], response=None):
+        now = time.monotonic()
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.calls += 1
+            if error is None:
+                endpoint.consecutive_failures = 0
+                endpoint.ejections = 0
+                endpoint.latency_ewma = latency if endpoint.latency_ewma is None else 0.8 * endpoint.latency_ewma + 0.2 * latency
+                self._record_quota(endpoint, response)
+                return
+            endpoint.errors += 1
+            endpoint.consecutive_failures += 1
+            if isinstance(error, RATE_LIMIT_ERRORS):
+                headers = error_headers(error)
+                endpoint.quota.update(headers)
+                endpoint.quota.exhaust(retry_after(headers) or self.eject_seconds)
+            # Calls already in flight when it was ejected do not extend the ejection
+            if endpoint.consecutive_failures >= self.eject_after and endpoint.available(now):
+                endpoint.ejections += 1
+                backoff = min(self.eject_seconds * 2 ** (endpoint.ejections - 1), self.max_eject_seconds)
+                endpoint.ejected_until = now + backoff
+                # One more failure after the back-off ejects it again, for longer
+                endpoint.consecutive_failures = self.eject_after - 1
+                logger.warning(f"⚠️ Ejected LLM endpoint {endpoint.name} for {backoff:.0f}s: {type(error).__name__}")
+
+    @staticmethod
+    def _record_quota(endpoint: LLMEndpoint, response):
+        """Remember the quota the endpoint reported (lock held)"""
+        if response is None:
+            return
+        usage = getattr(response, "usage_metadata", None) or {}
+        endpoint.quota.update(response_headers(response), usage.get("total_tokens"))
+
+    def call(self, func: Callable[[LLMEndpoint], Any], timeout: Optional[float] = None, hold: bool = False):
+        """Run func(endpoint) on the best endpoint, failing over to the others on retryable errors
+
+        With hold the endpoint stays reserved after func returns (a stream still reading from it), and
+        (response, release) is returned: call release(error=None) once the endpoint is no longer in use.
+        """
+        tried: set = set()
+        last_error: Optional[Exception] = None
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                raise last_error
+            tried.add(endpoint.name)
+            wait = endpoint.quota.reserve()
+            if wait > 0:
+                if timeout is not None and wait >= timeout:
+                    with self._lock:
+                        endpoint.outstanding -= 1
+                    raise last_error or DeadlineExceeded("No LLM endpoint has quota before the request deadline")
+                time.sleep(wait)
+            start = time.perf_counter()
+            with span("llm.endpoint", endpoint=endpoint.name, attempt=len(tried)) as attempt_span:
+                try:
+                    response = func(endpoint)
+                except RETRYABLE_ERRORS as e:
+                    self._release(endpoint, time.perf_counter() - start, e)
+                    attempt_span.set(error=type(e).__name__)
+                    last_error = e
+                    if len(tried) < len(self.endpoints):
+                        with self._lock:
+                            endpoint.failovers += 1
+                        logger.warning(f"🔀 LLM call failed on {endpoint.name} ({type(e).__name__}), failing over")
+                    continue
+                except Exception:
+                    # The request itself was rejected (bad request, auth...): the endpoint is not at fault
+                    self._release(endpoint, time.perf_counter() - start, None)
+                    raise
+            latency = time.perf_counter() - start
+            if hold:
+                def release(error: Optional[Exception] = None, endpoint=endpoint, latency=latency, response=response):
+                    if not isinstance(error, RETRYABLE_ERRORS):
+                        error = None
+                    self._release(endpoint, latency, error, None if error else response)
+                return response, release
+            self._release(endpoint, latency, None, response)
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "endpoints": {e.name: e.stats(now) for e in self.endpoints},
+                "healthy": sum(1 for e in self.endpoints if e.available(now)),
+                "eject_after": self.eject_after
+            }
+
+
+class PooledChatModel:
+    """Stands in for a ChatOpenAI client: the same settings, one client per pool endpoint"""
+
+    def __init__(self, pool: LLMPool, llm):
+        from langchain_openai import ChatOpenAI
+
+        self.pool = pool
+        self.model_name = llm.model_name
+        self.temperature = llm.temperature
+        self.max_tokens = llm.max_tokens
+        self.members = {
+            endpoint.name: ChatOpenAI(
+                model=llm.model_name,
+                temperature=llm.temperature,
+                max_tokens=llm.max_tokens,
+                openai_api_key=endpoint.api_key,
+                base_url=endpoint.base_url,
+                # Retry on another endpoint rather than back off on the one that failed
+                max_retries=0 if len(pool.endpoints) > 1 else llm.max_retries,
+                include_response_headers=True
+            )
+            for endpoint in pool.endpoints
+        }
+
+    def invoke(self, prompt, **kwargs):
+        return self.pool.call(lambda endpoint: self.members[endpoint.name].invoke(prompt, **kwargs),
+                              kwargs.get("timeout"))
+
+    def stream(self, prompt, **kwargs):
+        """Stream from the best endpoint; a call can only fail over until its first chunk arrives"""
+        def start(endpoint):
+            chunks = self.members[endpoint.name].stream(prompt, **kwargs)
+            first = next(chunks, None)
+            if first is not None:
+                endpoint.quota.update(response_headers(first))
+            return first, chunks
+
+        (first, chunks), release = self.pool.call(start, kwargs.get("timeout"), hold=True)
+        # The endpoint is busy until the stream is read to the end, fails or is closed by the consumer
+        error = None
+        try:
+            if first is not None:
+                yield first
+                yield from chunks
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            release(error)
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+LLM Call Scheduler
+Every outbound LLM call takes a slot from one shared pool, so interactive and
+bulk traffic stop competing for OpenAI capacity in arrival order.
+
+When the pool is full, waiting calls are released by priority class
+(tutor > grading > mock_exam > lesson) and, within a class, by weighted fair
+queuing across students: each student's calls get virtual finish times, so a
+20-question exam interleaves with other students' calls instead of running
+ahead of them. Bulk classes can never take the slots reserved for
+interactive traffic.
+
+With pacing on, the pool size adapts to the provider (see llm_pacing.py):
+calls are spaced to fit the quota reported in the rate-limit headers, the
+number of slots shrinks on 429s and rising latency and grows back while
+calls are fast, and a 429 is retried after its retry-after while the
+request deadline allows.
+"""
+
+import os
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+import logging
+
+from deadlines import Deadline, DeadlineExceeded
+from llm_pacing import (AdaptiveConcurrency, QuotaTracker, RATE_LIMIT_ERRORS, error_headers,
+                        pacing_settings_from_env, per_token_latency, response_headers, retry_after)
+
+logger = logging.getLogger(__name__)
+
+# Lower value is served first
+PRIORITIES = {"tutor": 0, "grading": 1, "mock_exam": 2, "lesson": 3}
+# Classes allowed to use the slots reserved for interactive traffic
+INTERACTIVE_PRIORITY = PRIORITIES["grading"]
+
+_priority: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("llm_priority", default=None)
+_tenant: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("llm_tenant", default=None)
+
+
+@contextmanager
+def scheduling_context(priority: Optional[str] = None, tenant: Optional[str] = None) -> Iterator[None]:
+    """Set the default priority class and tenant (student) for LLM calls made inside the block"""
+    tokens = []
+    if priority is not None:
+        tokens.append((_priority, _priority.set(priority)))
+    if tenant is not None:
+        tokens.append((_tenant, _tenant.set(tenant)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class _Waiter:
+    """A call waiting for a slot"""
+
+    __slots__ = ("priority", "event", "granted", "cancelled")
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+
+class LLMScheduler:
+    """Shared concurrency limit for LLM calls with priority classes and per-student fair queuing"""
+
+    def __init__(self, max_concurrent: int = 10, reserved_interactive: int = 1, enabled: bool = True,
+                 pacing: bool = True, min_concurrent: int = 1, latency_tolerance: float = 2.0,
+                 rate_limit_retries: int = 2):
+        self.max_concurrent = max(1, max_concurrent)
+        self.reserved_interactive = min(max(0, reserved_interactive), self.max_concurrent - 1)
+        self.enabled = enabled
+        self.rate_limit_retries = rate_limit_retries
+        # Quota of the default API key; pooled clients pace each of their endpoints themselves
+        self.quota = QuotaTracker() if pacing else None
+        self.concurrency = AdaptiveConcurrency(self.max_concurrent, min_concurrent, latency_tolerance) if pacing else None
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queues: Dict[int, List] = {p: [] for p in PRIORITIES.values()}
+        self._virtual_time: Dict[int, float] = {p: 0.0 for p in PRIORITIES.values()}
+        self._tenant_finish: Dict[tuple, float] = {}
+        self._sequence = itertools.count()
+        # (finished_at, seconds per output token) of recent non-streamed calls, the latency signal
+        # for overload detection; per token, so long lessons and grades are not mistaken for slowness
+        self._recent_calls: deque = deque(maxlen=200)
+        self._stats: Dict[str, Dict[str, float]] = {
+            name: {"calls": 0, "queued": 0, "timeouts": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+            for name in PRIORITIES
+        }
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        """Build a scheduler from LLM_SCHEDULER_* environment variables"""
+        return cls(
+            max_concurrent=int(os.getenv("LLM_MAX_CONCURRENT", os.getenv("MAX_CONCURRENT_REQUESTS", "10"))),
+            reserved_interactive=int(os.getenv("LLM_SCHEDULER_RESERVED_INTERACTIVE", "1")),
+            enabled=os.getenv("LLM_SCHEDULER_ENABLED", "true").lower() == "true",
+            **pacing_settings_from_env()
+        )
+
+    def _limit(self, priority: int) -> int:
+        """Slots a class may occupy in total"""
+        limit = self.concurrency.current() if self.concurrency else self.max_concurrent
+        if priority <= INTERACTIVE_PRIORITY:
+            return limit
+        return max(1, limit - self.reserved_interactive)
+
+    def _dispatch(self):
+        """Hand free slots to waiting calls (lock held)"""
+        for priority in sorted(self._queues):
+            queue = self._queues[priority]
+            while queue and self._active < self._limit(priority):
+                finish, _, waiter = heapq.heappop(queue)
+                if waiter.cancelled:
+                    continue
+                self._virtual_time[priority] = max(self._virtual_time[priority], finish)
+                waiter.granted = True
+                self._active += 1
+                waiter.event.set()
+            if queue:
+                # Lower classes wait until everything above them is served
+                return
+
+    def _enqueue(self, priority: int, tenant: str, cost: float) -> _Waiter:
+        """Queue a call with its fair-queuing finish tag (lock held)"""
+        key = (priority, tenant)
+        start = max(self._virtual_time[priority], self._tenant_finish.get(key, 0.0))
+        finish = start + cost
+        self._tenant_finish[key] = finish
+        if len(self._tenant_finish) > 10000:
+            # Tenants whose finish tag has passed have no backlog left to track
+            self._tenant_finish = {
+                k: v for k, v in self._tenant_finish.items() if v > self._virtual_time[k[0]]
+            }
+        waiter = _Waiter(priority)
+        heapq.heappush(self._queues[priority], (finish, next(self._sequence), waiter))
+        return waiter
+
+    @contextmanager
+    def slot(self, priority: Optional[str] = None, tenant: Optional[str] = None,
+             timeout: Optional[float] = None, cost: float = 1.0) -> Iterator[None]:
+        """
+        Hold one LLM call slot for the duration of the block
+
+        Args:
+            priority: Priority class; defaults to the scheduling context, then "grading"
+            tenant: Student the call is for; defaults to the scheduling context
+            timeout: Longest time to wait for a slot
+            cost: Relative size of the call for fair queuing
+
+        Raises:
+            DeadlineExceeded: If no slot was free within the timeout
+        """
+        if not self.enabled:
+            yield
+            return
+
+        name = priority or _priority.get() or "grading"
+        level = PRIORITIES.get(name, PRIORITIES["grading"])
+        tenant = tenant or _tenant.get() or "anonymous"
+        stats = self._stats[name]
+        start = time.perf_counter()
+
+        with self._lock:
+            queued = any(self._queues[p] for p in self._queues if p <= level)
+            if not queued and self._active < self._limit(level):
+                self._active += 1
+                waiter = None
+            else:
+                waiter = self._enqueue(level, tenant, cost)
+                stats["queued"] += 1
+                # Clears timed-out waiters ahead of this one if slots are free
+                self._dispatch()
+
+        if waiter is not None and not waiter.event.wait(timeout):
+            with self._lock:
+                if not waiter.granted:
+                    waiter.cancelled = True
+                    stats["timeouts"] += 1
+                    raise DeadlineExceeded(f"No LLM slot became free within {timeout:.2f}s")
+
+        waited_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            stats["calls"] += 1
+            stats["wait_ms_total"] += waited_ms
+            stats["wait_ms_max"] = max(stats["wait_ms_max"], waited_ms)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._dispatch()
+
+    def invoke(self, llm, prompt: str, priority: Optional[str] = None, tenant: Optional[str] = None, **call_kwargs):
+        """Invoke an LLM while holding a slot (blocks while queued, so call it off the event loop)"""
+        with self.slot(priority, tenant):
+            return self.call(llm, prompt, **call_kwargs)
+
+    def call(self, llm, prompt: str, deadline: Optional[Deadline] = None, **call_kwargs):
+        """
+        Invoke an LLM inside an already held slot: paced to the provider's quota, with 429s retried
+
+        Raises:
+            DeadlineExceeded: If pacing would only let the call go out after the deadline
+        """
+        deadline = deadline or Deadline()
+        quota = None if hasattr(llm, "pool") else self.quota
+        attempt = 0
+        while True:
+            self._pace(quota, deadline)
+            start = time.perf_counter()
+            try:
+                response = llm.invoke(prompt, **deadline.call_kwargs(), **call_kwargs)
+            except RATE_LIMIT_ERRORS as e:
+                attempt += 1
+                self._back_off(e, quota, attempt, deadline)
+                continue
+            latency = time.perf_counter() - start
+            usage = getattr(response, "usage_metadata", None) or {}
+            per_token = per_token_latency(latency, usage.get("output_tokens"))
+            if per_token is not None:
+                with self._lock:
+                    self._recent_calls.append((time.perf_counter(), per_token))
+            if self.concurrency:
+                self.concurrency.on_success(latency, usage.get("output_tokens"),
+                                            call_kwargs.get("model") or getattr(llm, "model_name", None))
+            if quota is not None:
+                quota.update(response_headers(response), usage.get("total_tokens"))
+            return response
+
+    def stream(self, llm, prompt: str, priority: Optional[str] = None, tenant: Optional[str] = None,
+               deadline: Optional[Deadline] = None, **call_kwargs) -> Iterator[Any]:
+        """
+        Stream an LLM reply while holding a slot, paced like call(); the slot is held until
+        the stream is exhausted or closed (a generator that blocks, so iterate it off the event loop)
+
+        A 429 can only be retried before the first chunk arrives. Streams do not adjust the
+        concurrency limit; only call() latencies do.
+        """
+        with self.slot(priority, tenant, timeout=deadline.remaining() if deadline else None):
+            deadline = deadline or Deadline()
+            quota = None if hasattr(llm, "pool") else self.quota
+            attempt = 0
+            while True:
+                self._pace(quota, deadline)
+                chunks = llm.stream(prompt, **deadline.call_kwargs(), **call_kwargs)
+                try:
+                    first = next(chunks, None)
+                except RATE_LIMIT_ERRORS as e:
+                    attempt += 1
+                    self._back_off(e, quota, attempt, deadline)
+                    continue
+                break
+            if first is None:
+                return
+            if quota is not None:
+                quota.update(response_headers(first))
+            yield first
+            # Stream durations follow the reader and the reply length, so they do not feed the latency signal
+            yield from chunks
+
+    def _pace(self, quota: Optional[QuotaTracker], deadline: Deadline):
+        """Wait for the call's place in the quota schedule"""
+        if quota is None:
+            return
+        remaining = deadline.remaining()
+        if remaining is not None and quota.delay() > remaining:
+            raise DeadlineExceeded("LLM quota does not free up before the request deadline")
+        wait = quota.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def _back_off(self, error: Exception, quota: Optional[QuotaTracker], attempt: int, deadline: Deadline):
+        """After a 429: shrink concurrency and sleep for the retry-after, or re-raise when out of retries or time"""
+        headers = error_headers(error)
+        pause = retry_after(headers) or 2.0 ** (attempt - 1)
+        if self.concurrency:
+            self.concurrency.on_rate_limited()
+        if quota is not None:
+            quota.update(headers)
+            quota.exhaust(pause)
+        remaining = deadline.remaining()
+        if attempt > self.rate_limit_retries or (remaining is not None and pause >= remaining):
+            raise error
+        logger.warning(f"🚧 LLM rate limited, retrying in {pause:.1f}s (attempt {attempt})")
+        time.sleep(pause)
+
+    def queue_depth(self) -> int:
+        """Calls currently waiting for a slot"""
+        with self._lock:
+            return sum(1 for queue in self._queues.values() for _, _, w in queue if not w.cancelled)
+
+    def recent_latency_per_token(self, window_seconds: float = 60.0, percentile: float = 0.9) -> Optional[float]:
+        """Percentile seconds per output token of the non-streamed calls that finished within the window"""
+        cutoff = time.perf_counter() - window_seconds
+        with self._lock:
+            samples = sorted(seconds for finished, seconds in self._recent_calls if finished >= cutoff)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percentile))]
+
+    def stats(self) -> Dict[str, Any]:
+        """Slot usage and per-class waits for health reporting"""
+        with self._lock:
+            waiting = {
+                name: sum(1 for _, _, w in self._queues[level] if not w.cancelled)
+                for name, level in PRIORITIES.items()
+            }
+            active = self._active
+        return {
+            "enabled": self.enabled,
+            "max_concurrent": self.max_concurrent,
+            "reserved_interactive": self.reserved_interactive,
+            "pacing": {
+                "concurrency": self.concurrency.stats(),
+                "quota": self.quota.stats()
+            } if self.concurrency else None,
+            "active": active,
+            "waiting": waiting,
+            "classes": {
+                name: {
+                    "calls": int(s["calls"]),
+                    "queued": int(s["queued"]),
+                    "timeouts": int(s["timeouts"]),
+                    "avg_wait_ms": round(s["wait_ms_total"] / s["calls"], 1) if s["calls"] else 0.0,
+                    "max_wait_ms": round(s["wait_ms_max"], 1)
+                }
+                for name, s in self._stats.items()
+            }
+        }
+
+
+# Process-wide scheduler shared by every LLM call site
+llm_scheduler = LLMScheduler.from_env()
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Local Scoring
+Scores mock exam items that have a single right answer without an LLM call:
+multiple-choice and true/false items (the option letter, or the option's
+text), and calculation items (break-even, profit, margins, ratios...) whose
+final figure matches the model answer's within a tolerance.
+
+Figures are compared by value: currency symbols and codes, thousands
+separators, k/m/bn, "million" and "lakh", percentages (25% matches 0.25), ratios
+(2.5:1), accounting negatives "(1,200)" and "loss of" are understood; a
+missing unit or % sign costs no marks but is pointed out.
+
+Only answers that are certainly right or certainly wrong are scored here. A
+wrong figure with working shown, an answer with no figure in digits ("five
+hundred"), or any item that also asks to explain or
+evaluate, is left to the LLM, which can award method marks. Which detectors
+run depends on the paper (LOCAL_SCORING_RULES): Paper 1 has multiple-choice
+and short calculation items, Paper 2 case-study calculations only.
+"""
+
+import os
+import re
+import threading
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, List, Optional, Set
+from pydantic import BaseModel
+import logging
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("objective", "numeric")
+DEFAULT_RULES = "P1=objective+numeric,P2=numeric,default=objective+numeric"
+
+_CURRENCY_SYMBOLS = {"$": "USD", "£": "GBP", "€": "EUR", "¥": "JPY", "₹": "INR", "₨": "PKR"}
+_CURRENCY_CODES = {"usd": "USD", "gbp": "GBP", "eur": "EUR", "inr": "INR", "pkr": "PKR", "rs": "PKR", "rs.": "PKR",
+                   "dollars": "USD", "pounds": "GBP", "euros": "EUR", "rupees": "PKR"}
+_SCALES = {"hundred": 1e2, "k": 1e3, "thousand": 1e3, "lakh": 1e5, "m": 1e6, "mn": 1e6, "million": 1e6,
+           "crore": 1e7, "bn": 1e9, "billion": 1e9}
+
+# A figure with its surroundings: sign or "(", currency before; scale, %, ratio or unit after
+_QUANTITY_RE = re.compile(
+    r"(?P<open>\()?\s*(?P<sign>[-−–])?\s*"
+    r"(?P<currency>[$£€¥₹₨]|(?:usd|gbp|eur|inr|pkr|rs\.?)(?=\s*\d))?\s*"
+    r"(?P<number>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?|\.\d+)"
+    r"(?P<close>\))?"
+    r"(?:\s*(?P<scale>k|mn|m|bn|hundred|thousand|lakh|million|crore|billion)\b)?"
+    r"(?:\s*(?P<percent>%|percent\b|per cent\b))?"
+    r"(?:\s*:\s*(?P<ratio>\d+(?:\.\d+)?))?"
+    r"(?:\s*(?P<unit>[a-z]+))?",
+    re.IGNORECASE
+)
+_LABEL_RE = re.compile(r"^\s*(?:(?:final\s+)?answer|ans|solution|correct\s+(?:answer|option))\s*(?:is)?\s*[:=\-]?\s*",
+                       re.IGNORECASE)
+# "B", "(b)", "B) Increase price", "Option C." - a letter on its own or followed by a delimiter
+_OPTION_ANSWER_RE = re.compile(r"^(?:option\s+)?(?:\(([a-e])\)|([a-e])(?=\s*[.):\-]|$))\s*[.):\-]?\s*(.*)$",
+                               re.IGNORECASE | re.DOTALL)
+_OPTION_LINE_RE = re.compile(r"(?:^|\s)\(?([A-E])[).:]\s+(.+?)(?=\s+\(?[A-E][).:]\s|\n|$)")
+_CALCULATION_RE = re.compile(r"\b(?:calculate|work out|compute|how (?:much|many)|what (?:is|was|will be) the "
+                             r"(?:value|amount|total|number))\b", re.IGNORECASE)
+_OPEN_RE = re.compile(r"\b(?:explain|analy[sz]e|evaluate|discuss|justify|recommend|comment|why|advise|"
+                      r"consider|assess|describe|suggest|identify and)\b", re.IGNORECASE)
+_TRUE_FALSE = {"true": "True", "t": "True", "false": "False", "f": "False"}
+_NON_UNITS = {"and", "or", "to", "so", "the", "a", "is", "of", "per", "which", "this", "in", "for", "at", "with",
+              "because", "as", "x", "times", "each"}
+
+
+class Quantity(BaseModel):
+    """A figure read from an answer"""
+    value: float
+    text: str
+    decimals: int = 0
+    currency: Optional[str] = None
+    percent: bool = False
+    ratio: bool = False
+    unit: Optional[str] = None
+
+
+class LocalScore(BaseModel):
+    """Marks and feedback for an item scored without the LLM"""
+    kind: str  # "objective" or "numeric"
+    correct: bool
+    marks_awarded: float
+    percentage_score: float
+    feedback: str
+    strengths: List[str]
+    improvements: List[str]
+
+
+def parse_rules(spec: str) -> Dict[str, Set[str]]:
+    """Parse 'P1=objective+numeric,P2=numeric' into the detectors run per paper"""
+    rules: Dict[str, Set[str]] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            paper, kinds = item.split("=", 1)
+        except ValueError:
+            logger.error(f"❌ Ignoring invalid local scoring rule '{item}' (expected paper=kind+kind)")
+            continue
+        selected = {kind.strip().lower() for kind in kinds.split("+") if kind.strip()}
+        unknown = selected - set(KINDS) - {"none"}
+        if unknown:
+            logger.error(f"❌ Unknown local scoring kinds {sorted(unknown)} in '{item}'")
+        rules[paper.strip().upper()] = selected & set(KINDS)
+    return rules
+
+
+def _final_segment(text: str) -> str:
+    """The part of an answer that states the result: after the last '=' or 'answer:' label"""
+    lines = [line for line in text.strip().splitlines() if line.strip()]
+    last = lines[-1] if lines else ""
+    return _LABEL_RE.sub("", last.rsplit("=", 1)[-1])
+
+
+def parse_quantities(text: str) -> List[Quantity]:
+    """Every figure in a piece of text, with its currency, %, ratio and unit"""
+    quantities = []
+    for match in _QUANTITY_RE.finditer(text):
+        # Skip digits inside words and identifiers ("Q3", "P1")
+        start = match.start("number")
+        if start > 0 and (text[start - 1].isalpha() or text[start - 1] == "_"):
+            continue
+        number = match.group("number")
+        value = float(number.replace(",", ""))
+        scale = (match.group("scale") or "").lower()
+        unit = (match.group("unit") or "").lower() or None
+        value *= _SCALES.get(scale, 1)
+        ratio = match.group("ratio")
+        if ratio:
+            if float(ratio) == 0:
+                continue
+            value /= float(ratio)
+        negative = bool(match.group("sign")) or bool(match.group("open") and match.group("close"))
+        before = text[max(0, match.start() - 12):match.start()].lower()
+        if "loss" in before or (unit == "loss"):
+            negative = True
+        currency = match.group("currency")
+        currency = _CURRENCY_SYMBOLS.get(currency) or _CURRENCY_CODES.get((currency or "").lower())
+        if unit in _CURRENCY_CODES:
+            currency, unit = currency or _CURRENCY_CODES[unit], None
+        if unit in _NON_UNITS or unit in _SCALES:
+            unit = None
+        quantities.append(Quantity(
+            value=-value if negative else value,
+            text=match.group(0).strip(),
+            decimals=len(number.split(".", 1)[1]) if "." in number else 0,
+            currency=currency,
+            percent=bool(match.group("percent")),
+            ratio=bool(ratio) or unit == "times",
+            unit=unit
+        ))
+    return quantities
+
+
+def final_quantity(text: str) -> Optional[Quantity]:
+    """The figure an answer ends on: the last one after its last '=' (or in its last line)"""
+    quantities = parse_quantities(_final_segment(text)) or parse_quantities(text)
+    return quantities[-1] if quantities else None
+
+
+def _decimals(value: float) -> int:
+    exponent = Decimal(repr(value)).normalize().as_tuple().exponent
+    return max(0, -exponent) if isinstance(exponent, int) else 0
+
+
+def _kind(quantity: Quantity) -> Optional[str]:
+    """What a figure measures, when the answer says: percent, currency, or its unit word"""
+    if quantity.percent:
+        return "percent"
+    if quantity.currency:
+        return "currency"
+    return quantity.unit.rstrip("s") if quantity.unit else None
+
+
+def parse_options(question_text: str) -> Dict[str, str]:
+    """Options of a multiple-choice question by letter ('A' -> normalized option text)"""
+    return {letter.upper(): _normalize(option) for letter, option in _OPTION_LINE_RE.findall(question_text)}
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^a-z0-9%.]+", " ", text.lower()).strip()
+
+
+def choice(answer: str, options: Dict[str, str]) -> Optional[str]:
+    """The option an answer picks ('B', 'True'), None if it is not a plain choice"""
+    text = _LABEL_RE.sub("", answer.strip()).strip().rstrip(".")
+    if not text or len(text) > 200:
+        return None
+    lowered = text.lower()
+    if lowered in _TRUE_FALSE:
+        return _TRUE_FALSE[lowered]
+    match = _OPTION_ANSWER_RE.match(text)
+    if match:
+        letter = (match.group(1) or match.group(2)).upper()
+        # The letter alone, or with that option's own text
+        if not match.group(3) or _normalize(match.group(3)) == options.get(letter):
+            return letter
+    normalized = _normalize(text)
+    for letter, option in options.items():
+        if normalized and normalized == option:
+            return letter
+    return None
+
+
+class LocalScorer:
+    """Scores objective and numeric mock exam items deterministically, or declines (None) so the LLM does"""
+
+    def __init__(self, enabled: bool = True, rules: Optional[Dict[str, Set[str]]] = None,
+                 rounding_tolerance: float = 0.01, absolute_tolerance: float = 0.005):
+        self.enabled = enabled
+        self.rules = rules if rules is not None else parse_rules(DEFAULT_RULES)
+        self.rounding_tolerance = rounding_tolerance
+        self.absolute_tolerance = absolute_tolerance
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "LocalScorer":
+        """Build a scorer from LOCAL_SCORING_* environment variables"""
+        return cls(
+            enabled=os.getenv("LOCAL_SCORING_ENABLED", "true").lower() == "true",
+            rules=parse_rules(os.getenv("LOCAL_SCORING_RULES", DEFAULT_RULES)),
+            rounding_tolerance=float(os.getenv("LOCAL_SCORING_ROUNDING_TOLERANCE", "0.01")),
+            absolute_tolerance=float(os.getenv("LOCAL_SCORING_ABSOLUTE_TOLERANCE", "0.005"))
+        )
+
+    def kinds_for(self, exam_type: Optional[str]) -> Set[str]:
+        """Detectors that run for a paper ('default' for unknown or missing exam types)"""
+        if not self.enabled:
+            return set()
+        key = (exam_type or "").strip().upper()
+        return self.rules.get(key, self.rules.get("DEFAULT", set()))
+
+    def score(self, question: Dict, exam_type: Optional[str] = None) -> Optional[LocalScore]:
+        """Score one attempted question locally, or return None to leave it to the LLM"""
+        kinds = self.kinds_for(exam_type)
+        model_answer = question.get("solution") or question.get("model_answer") or ""
+        student_answer = question.get("user_answer") or ""
+        if not kinds or not model_answer.strip():
+            return None
+        marks = question.get("marks", 0) or 0
+        question_text = question.get("question", "")
+        result = None
+        if "objective" in kinds:
+            result = self._score_objective(question_text, model_answer, student_answer, marks)
+        if result is None and "numeric" in kinds:
+            result = self._score_numeric(question_text, model_answer, student_answer, marks)
+        if result is not None:
+            self._count(f"{result.kind}_{'correct' if result.correct else 'incorrect'}")
+        return result
+
+    def _score_objective(self, question_text: str, model_answer: str, student_answer: str,
+                         marks: int) -> Optional[LocalScore]:
+        options = parse_options(question_text)
+        # Only when the model answer is nothing but a choice; "A, because..." model answers need judgement
+        expected = choice(model_answer, options)
+        if expected is None:
+            return None
+        if not student_answer.strip():
+            return self._result("objective", False, marks, "No answer was given.",
+                                [], ["Always choose an option - there is no penalty for a wrong answer"])
+        chosen = choice(student_answer, options)
+        if chosen is None:
+            # A written answer to a multiple-choice item: let the LLM read it
+            self._count("objective_deferred")
+            return None
+        if chosen == expected:
+            return self._result("objective", True, marks, f"Correct: the answer is {expected}.",
+                                ["Chose the correct option"], [])
+        return self._result("objective", False, marks, f"Incorrect: you chose {chosen}, the correct answer is {expected}.",
+                            [], [f"Review why {expected} is correct and {chosen} is not"])
+
+    def _score_numeric(self, question_text: str, model_answer: str, student_answer: str,
+                       marks: int) -> Optional[LocalScore]:
+        segment = _final_segment(model_answer)
+        expected_figures = parse_quantities(segment)
+        if not expected_figures:
+            return None
+        expected = expected_figures[-1]
+        # The model answer must end on its figure, and the item must be a pure calculation
+        leftover = _normalize(segment.replace(expected.text, " ")).split()
+        is_bare_figure = len(expected_figures) == 1 and len(leftover) <= 3
+        if not is_bare_figure or _OPEN_RE.search(question_text):
+            return None
+        if not _CALCULATION_RE.search(question_text) and len(_normalize(model_answer).split()) > 8:
+            return None
+        if not student_answer.strip():
+            return self._result("numeric", False, marks, "No answer was given.", [],
+                                ["Attempt every calculation - method marks are available for working"])
+        given = final_quantity(student_answer)
+        if given is None:
+            # No figure in digits ("five hundred", "not enough information"): the LLM reads it
+            self._count("numeric_deferred")
+            return None
+        if self._matches(expected, given):
+            if _kind(expected) and _kind(given) and _kind(given) != _kind(expected):
+                # The right figure in the wrong terms ("2,000 dollars" for units): a judgement call
+                self._count("numeric_deferred")
+                return None
+            improvements = self._presentation(expected, given)
+            return self._result("numeric", True, marks,
+                                f"Correct: {given.text} matches the expected answer of {expected.text}.",
+                                ["Correct final answer"], improvements or
+                                ["Keep showing your working so method marks are safe if a figure slips"])
+        if self._matches_up_to_scale(expected, given):
+            # "$12m" for 12 ($m), "$450,000" for 450 ($000), "a fall of $500" for -500: probably right,
+            # but the item's units or sign convention decide, so the LLM does
+            self._count("numeric_deferred")
+            return None
+        figures = parse_quantities(student_answer)
+        if len(figures) > 1 or len(student_answer.split()) > 12:
+            # Working shown: partial (method) marks need the LLM
+            self._count("numeric_deferred")
+            return None
+        return self._result("numeric", False, marks,
+                            f"Incorrect: your answer {given.text} does not match the expected answer of {expected.text}.",
+                            [], ["Show your working - method marks can be awarded even when the final figure is wrong"])
+
+    def _matches(self, expected: Quantity, given: Quantity) -> bool:
+        """Same value (25% also matches 0.25), or the exact answer rounded to the decimals given"""
+        candidates = [(given.value, given.decimals)]
+        if expected.percent and not given.percent:
+            candidates.append((given.value * 100, max(0, given.decimals - 2)))
+        if given.percent and not expected.percent:
+            candidates.append((given.value / 100, given.decimals + 2))
+        for value, decimals in candidates:
+            difference = abs(value - expected.value)
+            if difference <= self.absolute_tolerance:
+                return True
+            # 33.3 or 33 for 33.33..., but not 2001 for 2000 or 3 for 2.5
+            if decimals < _decimals(expected.value) and difference <= self.rounding_tolerance * abs(expected.value):
+                quantum = Decimal(1).scaleb(-decimals)
+                if Decimal(repr(expected.value)).quantize(quantum, ROUND_HALF_UP) == Decimal(repr(value)).quantize(quantum):
+                    return True
+        return False
+
+    def _matches_up_to_scale(self, expected: Quantity, given: Quantity) -> bool:
+        """Same magnitude up to sign or a factor of a thousand, million or billion"""
+        for factor in (1, 1e3, 1e6, 1e9):
+            for value in (abs(given.value) * factor, abs(given.value) / factor):
+                if self._matches(expected.model_copy(update={"value": abs(expected.value)}),
+                                 given.model_copy(update={"value": value})):
+                    return True
+        return False
+
+    @staticmethod
+    def _presentation(expected: Quantity, given: Quantity) -> List[str]:
+        """Units, % and currency the student left off (no marks lost, but worth fixing)"""
+        notes = []
+        if expected.percent and not given.percent:
+            notes.append("Give percentages with a % sign")
+        if expected.currency and not given.currency:
+            notes.append("Include the currency sign with money values")
+        if expected.unit and not given.unit:
+            notes.append(f"State the units ({expected.unit})")
+        return notes
+
+    @staticmethod
+    def _result(kind: str, correct: bool, marks: int, feedback: str, strengths: List[str],
+                improvements: List[str]) -> LocalScore:
+        return LocalScore(
+            kind=kind,
+            correct=correct,
+            marks_awarded=float(marks) if correct else 0.0,
+            percentage_score=100.0 if correct else 0.0,
+            feedback=feedback,
+            strengths=strengths or ["Answer submitted"],
+            improvements=improvements or ["Keep practicing"]
+        )
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self._counts[outcome] = self._counts.get(outcome, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Rules and the items scored locally, by kind and outcome (deferred = left to the LLM)"""
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            "enabled": self.enabled,
+            "rules": {paper: sorted(kinds) for paper, kinds in self.rules.items()},
+            "rounding_tolerance": self.rounding_tolerance,
+            "scored": sum(count for outcome, count in counts.items() if not outcome.endswith("_deferred")),
+            "outcomes": counts
+        }
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Memory Diagnostics
+Tracks the process's resident memory over time and the size of each
+in-process store (tutor conversations, caches, idempotency entries, spans...),
+so slow growth in a long-lived process can be traced to what is growing.
+
+A periodic sample records RSS and raises an alarm (a warning log line with
+the store sizes, and a flag in /health) when RSS grew by more than
+MEMORY_GROWTH_ALARM_MB within MEMORY_GROWTH_WINDOW_SECONDS, or crossed
+MEMORY_LIMIT_ALARM_RATIO of the container's memory limit, before the
+container is OOM-killed.
+
+Deeper looks are on demand only: instance counts per type (a walk over every
+gc-tracked object) and tracemalloc snapshots, each diffed against the
+previous one to show which lines allocated the growth. tracemalloc slows
+allocation while it runs, so it is off until a snapshot is requested.
+"""
+
+import gc
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Types whose instance counts are always reported (by class name), when present
+DEFAULT_WATCH_TYPES = "ChatOpenAI,PooledChatModel,Client,AsyncClient,ExamReport,QuestionGrade,GradingResult,TutorResponse"
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size of this process (Linux /proc; peak RSS elsewhere)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def memory_limit_bytes() -> Optional[int]:
+    """The container's memory limit from cgroup v2 or v1, None when unlimited or unknown"""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+        return None
+    return None
+
+
+def object_counts(limit: int = 20, watch: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Instance counts of the most common gc-tracked types, and of the watched ones"""
+    counts: Counter = Counter()
+    for obj in gc.get_objects():
+        cls = type(obj)
+        counts[f"{cls.__module__}.{cls.__qualname__}"] += 1
+    watched = {}
+    for name in watch or []:
+        total = sum(count for type_name, count in counts.items() if type_name.rsplit(".", 1)[-1] == name)
+        if total:
+            watched[name] = total
+    return {
+        "tracked_objects": sum(counts.values()),
+        "most_common": dict(counts.most_common(limit)),
+        "watched": watched
+    }
+
+
+class MemoryMonitor:
+    """RSS history, store sizes, growth alarms and tracemalloc snapshot diffs"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        sample_seconds: float = 60.0,
+        history_size: int = 1440,
+        growth_alarm_mb: float = 256.0,
+        growth_window_seconds: float = 1800.0,
+        limit_alarm_ratio: float = 0.85,
+        tracemalloc_frames: int = 10,
+        watch_types: Optional[List[str]] = None
+    ):
+        self.enabled = enabled
+        self.sample_seconds = sample_seconds
+        self.growth_alarm_mb = growth_alarm_mb
+        self.growth_window_seconds = growth_window_seconds
+        self.limit_alarm_ratio = limit_alarm_ratio
+        self.tracemalloc_frames = tracemalloc_frames
+        self.watch_types = watch_types if watch_types is not None else DEFAULT_WATCH_TYPES.split(",")
+        self.limit_bytes = memory_limit_bytes()
+        self._history: deque = deque(maxlen=history_size)
+        self._stores: Dict[str, Callable[[], Any]] = {}
+        self._lock = threading.Lock()
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._snapshot_time: Optional[float] = None
+        self._started_tracemalloc = False
+        self.alarm: Optional[Dict[str, Any]] = None
+        self.alarms = 0
+
+    @classmethod
+    def from_env(cls) -> "MemoryMonitor":
+        """Build a monitor from MEMORY_* environment variables"""
+        watch = os.getenv("MEMORY_WATCH_TYPES", DEFAULT_WATCH_TYPES)
+        return cls(
+            enabled=os.getenv("MEMORY_MONITOR_ENABLED", "true").lower() == "true",
+            sample_seconds=float(os.getenv("MEMORY_SAMPLE_SECONDS", "60")),
+            history_size=int(os.getenv("MEMORY_HISTORY_SIZE", "1440")),
+            growth_alarm_mb=float(os.getenv("MEMORY_GROWTH_ALARM_MB", "256")),
+            growth_window_seconds=float(os.getenv("MEMORY_GROWTH_WINDOW_SECONDS", "1800")),
+            limit_alarm_ratio=float(os.getenv("MEMORY_LIMIT_ALARM_RATIO", "0.85")),
+            tracemalloc_frames=int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "10")),
+            watch_types=[name.strip() for name in watch.split(",") if name.strip()]
+        )
+
+    def register(self, name: str, sizer: Callable[[], Any]):
+        """Report a store's size (a count, or a dict of counts) under name"""
+        self._stores[name] = sizer
+
+    def store_sizes(self) -> Dict[str, Any]:
+        sizes = {}
+        for name, sizer in list(self._stores.items()):
+            try:
+                sizes[name] = sizer()
+            except Exception as e:
+                sizes[name] = {"error": f"{type(e).__name__}: {e}"}
+        return sizes
+
+    def sample(self) -> Optional[int]:
+        """Record the current RSS and check the growth and limit alarms"""
+        rss = rss_bytes()
+        if rss is None:
+            return None
+        now = time.time()
+        with self._lock:
+            self._history.append((now, rss))
+            window = [value for at, value in self._history if at >= now - self.growth_window_seconds]
+        growth = rss - min(window)
+        reasons = []
+        if self.growth_alarm_mb and growth >= self.growth_alarm_mb * MB:
+            reasons.append(f"grew {growth / MB:.0f} MB in {self.growth_window_seconds / 60:.0f} min")
+        if self.limit_bytes and rss >= self.limit_bytes * self.limit_alarm_ratio:
+            reasons.append(f"at {rss / self.limit_bytes:.0%} of the {self.limit_bytes / MB:.0f} MB limit")
+        if not reasons:
+            if self.alarm is not None:
+                logger.info(f"✅ Memory back within limits: {rss / MB:.0f} MB RSS")
+            self.alarm = None
+            return rss
+        first = self.alarm is None
+        self.alarm = {"since": self.alarm["since"] if self.alarm else now, "rss_mb": round(rss / MB, 1),
+                      "growth_mb": round(growth / MB, 1), "reasons": reasons}
+        if first:
+            self.alarms += 1
+            stores = self.store_sizes()
+            logger.warning(f"🧠 Memory alarm: {rss / MB:.0f} MB RSS, {'; '.join(reasons)}",
+                           extra={"rss_mb": round(rss / MB, 1), "growth_mb": round(growth / MB, 1), "stores": stores})
+        return rss
+
+    def history(self, points: int = 120) -> List[Dict[str, float]]:
+        """RSS samples, thinned out to at most `points` evenly spaced ones"""
+        with self._lock:
+            samples = list(self._history)
+        step = max(1, -(-len(samples) // points))
+        thinned = samples[::step]
+        if samples and thinned[-1] is not samples[-1]:
+            thinned.append(samples[-1])
+        return [{"time": round(at, 1), "rss_mb": round(value / MB, 1)} for at, value in thinned]
+
+    def summary(self) -> Dict[str, Any]:
+        """Current RSS and alarm state, for /health"""
+        rss = rss_bytes()
+        return {
+            "rss_mb": round(rss / MB, 1) if rss else None,
+            "limit_mb": round(self.limit_bytes / MB, 1) if self.limit_bytes else None,
+            "alarm": self.alarm
+        }
+
+    def report(self, objects: bool = False, points: int = 120) -> Dict[str, Any]:
+        """Everything /debug/memory shows; objects=True adds a (slow) walk over all objects"""
+        report = {
+            **self.summary(),
+            "alarms": self.alarms,
+            "growth_alarm_mb": self.growth_alarm_mb,
+            "growth_window_seconds": self.growth_window_seconds,
+            "gc": {"counts": gc.get_count(), "collections": [s["collections"] for s in gc.get_stats()]},
+            "stores": self.store_sizes(),
+            "history": self.history(points),
+            "tracemalloc": {
+                "tracing": tracemalloc.is_tracing(),
+                "traced_mb": round(tracemalloc.get_traced_memory()[0] / MB, 1) if tracemalloc.is_tracing() else None,
+                "snapshot_age_seconds": round(time.time() - self._snapshot_time, 1) if self._snapshot_time else None
+            }
+        }
+        if objects:
+            report["objects"] = object_counts(watch=self.watch_types)
+        return report
+
+    def snapshot_diff(self, limit: int = 25, group_by: str = "lineno") -> Dict[str, Any]:
+        """
+        Take a tracemalloc snapshot and diff it against the previous one
+
+        The first call starts tracemalloc and only takes the baseline; each later call
+        returns the allocation sites whose size changed most since the previous snapshot.
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.tracemalloc_frames)
+                self._started_tracemalloc = True
+                logger.info(f"🧠 tracemalloc started ({self.tracemalloc_frames} frames)")
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+            previous, previous_time = self._snapshot, self._snapshot_time
+            self._snapshot, self._snapshot_time = snapshot, time.time()
+        traced = sum(stat.size for stat in snapshot.statistics("filename"))
+        if previous is None:
+            return {"baseline": True, "traced_mb": round(traced / MB, 1), "top": []}
+        stats = snapshot.compare_to(previous, group_by)
+        return {
+            "baseline": False,
+            "seconds_since_previous": round(self._snapshot_time - previous_time, 1),
+            "traced_mb": round(traced / MB, 1),
+            "size_diff_mb": round(sum(stat.size_diff for stat in stats) / MB, 3),
+            "top": [
+                {
+                    "where": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                    "size_kb": round(stat.size / 1024, 1),
+                    "size_diff_kb": round(stat.size_diff / 1024, 1),
+                    "count": stat.count,
+                    "count_diff": stat.count_diff
+                }
+                for stat in stats[:limit]
+            ]
+        }
+
+    def stop_tracemalloc(self) -> bool:
+        """Stop tracemalloc (if the monitor started it) and drop the baseline snapshot"""
+        with self._lock:
+            self._snapshot = self._snapshot_time = None
+            if not (self._started_tracemalloc and tracemalloc.is_tracing()):
+                return False
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        logger.info("🧠 tracemalloc stopped")
+        return True
+
+
+# Process-wide monitor; stores are registered by the backend
+memory_monitor = MemoryMonitor.from_env()
@@ -5,18 +5,26 @@ This agent grades complete mock exams by evaluating all attempted questions.
 """
 
 import os
-import json
-from typing import List, Dict
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 import logging
 
+from deadlines import Deadline, DeadlineExceeded
+from llm_pacing import RATE_LIMIT_ERRORS
+from model_router import ModelRouter
+from local_scoring import LocalScorer
+from output_budgets import length_instruction
+from llm_output_parser import parse_structured_output
+from tracing import span
+from structured_logging import configure_logging
+
 # Load environment variables
 load_dotenv('config.env')
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (JSON lines written off the calling thread)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -29,11 +37,22 @@ class QuestionGrade(BaseModel):
     student_answer: str
     model_answer: str
     marks_allocated: int
-    marks_awarded: float = Field(description="Marks awarded to the student")
-    percentage_score: float = Field(description="Percentage score for this question")
+    marks_awarded: Optional[float] = Field(description="Marks awarded to the student (None while pending)")
+    percentage_score: Optional[float] = Field(description="Percentage score for this question (None while pending)")
     feedback: str = Field(description="Detailed feedback on the answer")
     strengths: List[str] = Field(description="List of strengths in the answer")
     improvements: List[str] = Field(description="Areas that need improvement")
+    status: str = Field(default="graded", description="'graded', or 'pending' if the deadline was reached first")
+    graded_by: str = Field(default="llm", description="'llm', or 'local' if scored without an LLM call")
+
+
+class QuestionGradingOutput(BaseModel):
+    """Structured output expected from the LLM for one question"""
+    marks_awarded: Optional[float] = None
+    percentage_score: Optional[float] = None
+    feedback: str = "Good effort on this question."
+    strengths: List[str] = ["Answer submitted"]
+    improvements: List[str] = ["Keep practicing"]
 
 
 class ExamReport(BaseModel):
@@ -49,55 +68,115 @@ class ExamReport(BaseModel):
     recommendations: List[str] = Field(description="Recommendations for improvement")
     strengths_summary: List[str] = Field(description="Overall strengths")
     weaknesses_summary: List[str] = Field(description="Overall weaknesses")
+    pending_questions: int = Field(default=0, description="Questions left ungraded when the deadline was reached")
+    is_partial: bool = Field(default=False, description="True if the report was returned before all questions were graded")
 
 
 class MockExamGradingAgent:
     """Agent for grading complete mock exams"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, router: Optional[ModelRouter] = None):
         """Initialize the grading agent"""
+        self.router = router or ModelRouter.from_env()
+        # Objective and numeric items with a single right answer are scored without the LLM
+        self.local_scorer = LocalScorer.from_env()
         self.llm = ChatOpenAI(
             model=os.getenv('GRADING_MODEL', 'gpt-4-turbo-preview'),
             temperature=0.3,
-            max_tokens=4000,
-            openai_api_key=api_key
+            # Ceiling only: each call is limited to its question's output budget
+            max_tokens=int(os.getenv('GRADING_MAX_TOKENS', '4000')),
+            openai_api_key=api_key,
+            # Rate-limit headers, read by the call scheduler to pace calls
+            include_response_headers=True
         )
         logger.info("✅ Mock Exam Grading Agent initialized")
     
-    def grade_exam(self, attempted_questions: List[Dict]) -> ExamReport:
+    def grade_exam(self, attempted_questions: List[Dict], deadline: Optional[Deadline] = None,
+                   exam_type: Optional[str] = None, raise_errors: bool = False) -> ExamReport:
         """
         Grade a complete mock exam
         
         Args:
             attempted_questions: List of attempted questions with question, student_answer, and model_answer
+            deadline: Optional request deadline; questions not graded in time are returned as pending
+            exam_type: Paper ("P1", "P2"), which selects the items that can be scored locally
+            raise_errors: Raise on a grading error instead of returning a fallback report, and leave
+                questions that could not be graded pending instead of giving them zero marks
             
         Returns:
             ExamReport with detailed grading results
         """
+        deadline = deadline or Deadline()
         try:
             logger.info(f"📝 Grading exam with {len(attempted_questions)} attempted questions")
             
-            # Calculate total marks
-            total_marks = sum(q.get('marks', 0) for q in attempted_questions)
-            
-            # Grade each question
+            # Grade each question, skipping the LLM once nobody is waiting for the result
             question_grades = []
-            for q in attempted_questions:
-                grade = self._grade_single_question(q)
-                question_grades.append(grade)
+            with span("grade_exam", questions=len(attempted_questions)):
+                for q in attempted_questions:
+                    if deadline.expired():
+                        grade = None
+                    else:
+                        grade = self.grade_question(q, deadline, raise_errors, exam_type)
+                    question_grades.append(grade)
+            
+            return self.build_report(attempted_questions, question_grades)
             
-            # Calculate overall scores
-            marks_obtained = sum(g.marks_awarded for g in question_grades)
-            percentage_score = (marks_obtained / total_marks * 100) if total_marks > 0 else 0
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.error(f"❌ Error grading exam: {e}")
+            return self._create_fallback_report(attempted_questions)
+    
+    def grade_question(self, question: Dict, deadline: Optional[Deadline] = None,
+                       pending_on_error: bool = False, exam_type: Optional[str] = None) -> QuestionGrade:
+        """Grade one attempted question (also used on its own by incremental exam sessions and bulk grading)"""
+        with span("grade_question", question_id=question.get('question_id', 0),
+                  part=question.get('part', ''), marks=question.get('marks', 0)) as question_span:
+            grade = self._grade_single_question(question, deadline, pending_on_error, exam_type)
+            question_span.set(status=grade.status, marks_awarded=grade.marks_awarded, graded_by=grade.graded_by)
+            return grade
+    
+    def build_report(self, attempted_questions: List[Dict], question_grades: List[Optional[QuestionGrade]]) -> ExamReport:
+        """
+        Assemble an ExamReport from per-question grades
+        
+        Args:
+            attempted_questions: The attempted questions, in report order
+            question_grades: Grade for each question; None marks it as pending
+            
+        Returns:
+            ExamReport scored over the graded questions
+        """
+        try:
+            # Calculate total marks
+            total_marks = sum(q.get('marks', 0) for q in attempted_questions)
             
-            # Generate overall feedback
-            overall_feedback = self._generate_overall_feedback(question_grades, percentage_score)
+            question_grades = [
+                grade if grade is not None else self._create_pending_grade(q)
+                for q, grade in zip(attempted_questions, question_grades)
+            ]
+            graded = [g for g in question_grades if g.status == "graded"]
+            pending_count = len(question_grades) - len(graded)
+            if pending_count:
+                logger.warning(f"⏱️ Deadline reached - returning partial report with {pending_count} pending questions")
             
-            # Generate recommendations
-            recommendations = self._generate_recommendations(question_grades, percentage_score)
+            # Calculate overall scores over the questions that were actually graded
+            graded_marks = sum(g.marks_allocated for g in graded)
+            marks_obtained = sum(g.marks_awarded for g in graded)
+            percentage_score = (marks_obtained / graded_marks * 100) if graded_marks > 0 else 0
             
-            # Generate strengths and weaknesses summary
-            strengths, weaknesses = self._generate_summaries(question_grades)
+            with span("generate_summaries", graded=len(graded), pending=pending_count):
+                # Generate overall feedback
+                overall_feedback = self._generate_overall_feedback(graded, percentage_score)
+                if pending_count:
+                    overall_feedback += f" Note: {pending_count} question(s) could not be graded in time and are marked as pending."
+                
+                # Generate recommendations
+                recommendations = self._generate_recommendations(graded, percentage_score)
+                
+                # Generate strengths and weaknesses summary
+                strengths, weaknesses = self._generate_summaries(graded)
             
             # Determine overall grade
             overall_grade = self._calculate_grade(percentage_score)
@@ -113,18 +192,22 @@ class MockExamGradingAgent:
                 overall_feedback=overall_feedback,
                 recommendations=recommendations,
                 strengths_summary=strengths,
-                weaknesses_summary=weaknesses
+                weaknesses_summary=weaknesses,
+                pending_questions=pending_count,
+                is_partial=pending_count > 0
             )
             
             logger.info(f"✅ Exam graded successfully. Score: {percentage_score}% ({overall_grade})")
             return report
             
         except Exception as e:
-            logger.error(f"❌ Error grading exam: {e}")
+            logger.error(f"❌ Error building exam report: {e}")
             return self._create_fallback_report(attempted_questions)
     
-    def _grade_single_question(self, question: Dict) -> QuestionGrade:
-        """Grade a single question"""
+    def _grade_single_question(self, question: Dict, deadline: Optional[Deadline] = None,
+                               pending_on_error: bool = False, exam_type: Optional[str] = None) -> QuestionGrade:
+        """Grade a single question (pending_on_error: leave it pending instead of returning a zero-mark error grade)"""
+        deadline = deadline or Deadline()
         try:
             question_id = question.get('question_id', 0)
             question_text = question.get('question', '')
@@ -151,6 +234,28 @@ class MockExamGradingAgent:
                     improvements=["Keep practicing"] if student_answer.strip() else ["Try to provide an answer"]
                 )
             
+            # Multiple-choice answers and final figures that are certainly right or wrong need no LLM
+            local = self.local_scorer.score(question, exam_type)
+            if local is not None:
+                return QuestionGrade(
+                    question_id=question_id,
+                    question_number=question_number,
+                    part=part,
+                    question_text=question_text,
+                    student_answer=student_answer,
+                    model_answer=model_answer,
+                    marks_allocated=marks,
+                    marks_awarded=local.marks_awarded,
+                    percentage_score=local.percentage_score,
+                    feedback=local.feedback,
+                    strengths=local.strengths,
+                    improvements=local.improvements,
+                    graded_by="local"
+                )
+            
+            # Small, short items go to the faster model; the output budget scales with the marks
+            decision = self.router.route("mock_exam", marks_allocated=marks, answer_length=len(student_answer))
+            
             # Grade using LLM
             grading_prompt = f"""
 You are an expert examiner grading a Business Studies mock exam question. Please evaluate the student's answer comprehensively.
@@ -180,6 +285,8 @@ Be fair, constructive, and encouraging. Consider:
 - Relevance of the content
 - Depth of analysis
 
+{length_instruction(decision.max_tokens)}
+
 Return your response in this JSON format:
 {{
     "marks_awarded": <number between 0 and {marks}>,
@@ -190,20 +297,18 @@ Return your response in this JSON format:
 }}
 """
             
-            response = self.llm.invoke(grading_prompt)
+            # The call is bounded by the time left
+            response = self.router.invoke(self.llm, grading_prompt, decision, deadline=deadline)
+            
+            # Parse the response locally (tolerates fences, prose, trailing commas and truncation)
+            result = parse_structured_output(response.content, QuestionGradingOutput, required=("marks_awarded",))
+            if result is None:
+                raise ValueError("Could not parse JSON response")
             
-            # Parse the response
-            try:
-                result = json.loads(response.content)
-            except json.JSONDecodeError:
-                # Try to extract JSON from the response
-                content = response.content
-                json_start = content.find('{')
-                json_end = content.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    result = json.loads(content[json_start:json_end])
-                else:
-                    raise ValueError("Could not parse JSON response")
+            marks_awarded = min(max(result.marks_awarded, 0.0), float(marks))
+            percentage_score = result.percentage_score
+            if percentage_score is None:
+                percentage_score = (marks_awarded / marks * 100) if marks else 50.0
             
             return QuestionGrade(
                 question_id=question_id,
@@ -213,15 +318,32 @@ Return your response in this JSON format:
                 student_answer=student_answer,
                 model_answer=model_answer,
                 marks_allocated=marks,
-                marks_awarded=float(result.get('marks_awarded', marks * 0.5)),
-                percentage_score=float(result.get('percentage_score', 50.0)),
-                feedback=result.get('feedback', 'Good effort on this question.'),
-                strengths=result.get('strengths', ['Answer submitted']),
-                improvements=result.get('improvements', ['Keep practicing'])
+                marks_awarded=marks_awarded,
+                percentage_score=percentage_score,
+                feedback=result.feedback,
+                strengths=result.strengths,
+                improvements=result.improvements
             )
             
         except Exception as e:
-            logger.error(f"Error grading question {question_id}: {e}")
+            if deadline.expired():
+                logger.warning(f"⏱️ Deadline reached while grading question {question.get('question_id', 0)}")
+                return self._create_pending_grade(question)
+            if isinstance(e, (DeadlineExceeded, *RATE_LIMIT_ERRORS)):
+                # Capacity ran out, not the answer: report it as not graded yet rather than zero marks
+                logger.warning(f"🚧 Question {question.get('question_id', 0)} left pending: {type(e).__name__}")
+                return self._create_pending_grade(
+                    question,
+                    "This question has not been graded yet - the grading service is at capacity, please resubmit shortly."
+                )
+            if pending_on_error:
+                # Only this question is left ungraded; the report is partial and is not stored for replay
+                logger.warning(f"⚠️ Question {question.get('question_id', 0)} left pending: {type(e).__name__}: {e}")
+                return self._create_pending_grade(
+                    question,
+                    "This question could not be graded this time - please resubmit to have it graded."
+                )
+            logger.error(f"Error grading question {question.get('question_id', 0)}: {e}")
             return QuestionGrade(
                 question_id=question.get('question_id', 0),
                 question_number=question.get('question_number', 0),
@@ -237,6 +359,25 @@ Return your response in this JSON format:
                 improvements=["Grading error occurred"]
             )
     
+    def _create_pending_grade(self, question: Dict, feedback: Optional[str] = None) -> QuestionGrade:
+        """Create a placeholder grade for a question that was not graded before the deadline"""
+        question_id = question.get('question_id', 0)
+        return QuestionGrade(
+            question_id=question_id,
+            question_number=question.get('question_number', question_id),
+            part=question.get('part', ''),
+            question_text=question.get('question', ''),
+            student_answer=question.get('user_answer', ''),
+            model_answer=question.get('solution') or question.get('model_answer', ''),
+            marks_allocated=question.get('marks', 0),
+            marks_awarded=None,
+            percentage_score=None,
+            feedback=feedback or "This question has not been graded yet - grading ran out of time before reaching it.",
+            strengths=[],
+            improvements=[],
+            status="pending"
+        )
+    
     def _generate_overall_feedback(self, question_grades: List[QuestionGrade], percentage: float) -> str:
         """Generate overall feedback for the exam"""
         avg_percentage = sum(g.percentage_score for g in question_grades) / len(question_grades) if question_grades else 0
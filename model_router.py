@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Model Router
+Chooses the model and generation limits for each grading call based on the
+endpoint, the marks at stake and the length of the student's answer, and keeps
+a record of the decisions and the latency they produced. Output length is
+capped by the endpoint's output budget (see output_budgets.py).
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+from pydantic import BaseModel
+import logging
+
+from deadlines import Deadline
+from llm_scheduler import llm_scheduler
+from output_budgets import OutputBudgets, output_budgets
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class RouteDecision(BaseModel):
+    """Model choice for a single LLM call"""
+    endpoint: str
+    tier: str  # "small" or "large"
+    model: Optional[str] = None  # None keeps the agent's configured model
+    max_tokens: Optional[int] = None  # None keeps the agent's configured limit
+    reason: str = ""
+
+    def invoke_kwargs(self) -> Dict[str, Any]:
+        """Per-call overrides to pass to ChatOpenAI.invoke"""
+        kwargs = {}
+        if self.model:
+            kwargs["model"] = self.model
+        if self.max_tokens:
+            kwargs["max_tokens"] = self.max_tokens
+        return kwargs
+
+
+def llm_usage(response) -> Dict[str, Any]:
+    """Token counts and finish reason reported with an LLM response"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    metadata = getattr(response, "response_metadata", None) or {}
+    return {
+        "input_tokens": usage.get("input_tokens"),
+        "output_tokens": usage.get("output_tokens"),
+        "finish_reason": metadata.get("finish_reason")
+    }
+
+
+class ModelRouter:
+    """Routes simple grading items to a faster, smaller model"""
+
+    # Endpoints that carry marks use the marks threshold, the rest only answer length
+    MARKED_ENDPOINTS = {"mock_exam"}
+    # Scheduler priority class for each endpoint's calls
+    ENDPOINT_PRIORITIES = {"grade_answer": "grading", "mock_exam": "mock_exam"}
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        small_model: str = "gpt-4o-mini",
+        small_max_tokens: int = 1000,
+        small_max_marks: int = 4,
+        small_max_answer_chars: int = 1500,
+        history_size: int = 500,
+        budgets: Optional[OutputBudgets] = None
+    ):
+        self.enabled = enabled
+        self.small_model = small_model
+        self.small_max_tokens = small_max_tokens
+        self.small_max_marks = small_max_marks
+        self.small_max_answer_chars = small_max_answer_chars
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._history_size = history_size
+        self.budgets = budgets or output_budgets
+        # Set while the service is overloaded: marked items all go to the small model
+        self.degraded = False
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """Build a router from ROUTER_* environment variables"""
+        return cls(
+            enabled=os.getenv("ROUTER_ENABLED", "true").lower() == "true",
+            small_model=os.getenv("ROUTER_SMALL_MODEL", "gpt-4o-mini"),
+            small_max_tokens=int(os.getenv("ROUTER_SMALL_MAX_TOKENS", "1000")),
+            small_max_marks=int(os.getenv("ROUTER_SMALL_MAX_MARKS", "4")),
+            small_max_answer_chars=int(os.getenv("ROUTER_SMALL_MAX_ANSWER_CHARS", "1500"))
+        )
+
+    def route(self, endpoint: str, marks_allocated: Optional[int] = None, answer_length: int = 0) -> RouteDecision:
+        """Pick the model tier and output budget for one grading call"""
+        decision = self._route_tier(endpoint, marks_allocated, answer_length)
+        budget = self.budgets.max_tokens(endpoint, marks=marks_allocated)
+        if budget and (decision.max_tokens is None or budget < decision.max_tokens):
+            decision.max_tokens = budget
+        return decision
+
+    def _route_tier(self, endpoint: str, marks_allocated: Optional[int], answer_length: int) -> RouteDecision:
+        if self.degraded and endpoint in self.MARKED_ENDPOINTS:
+            return RouteDecision(
+                endpoint=endpoint,
+                tier="small",
+                model=self.small_model,
+                max_tokens=self.small_max_tokens,
+                reason="overload"
+            )
+
+        if not self.enabled:
+            return RouteDecision(endpoint=endpoint, tier="large", reason="routing disabled")
+
+        if answer_length > self.small_max_answer_chars:
+            return RouteDecision(
+                endpoint=endpoint,
+                tier="large",
+                reason=f"answer length {answer_length} > {self.small_max_answer_chars} chars"
+            )
+
+        if endpoint in self.MARKED_ENDPOINTS:
+            if marks_allocated is None or marks_allocated > self.small_max_marks:
+                return RouteDecision(
+                    endpoint=endpoint,
+                    tier="large",
+                    reason=f"{marks_allocated} marks > {self.small_max_marks}"
+                )
+            reason = f"{marks_allocated} marks, {answer_length} chars"
+        else:
+            reason = f"{answer_length} chars"
+
+        return RouteDecision(
+            endpoint=endpoint,
+            tier="small",
+            model=self.small_model,
+            max_tokens=self.small_max_tokens,
+            reason=reason
+        )
+
+    def invoke(self, llm, prompt: str, decision: RouteDecision, deadline: Optional[Deadline] = None, **call_kwargs):
+        """Invoke the LLM with the routed model through the call scheduler and record the call latency"""
+        deadline = deadline or Deadline()
+        priority = self.ENDPOINT_PRIORITIES.get(decision.endpoint)
+        model = decision.model or getattr(llm, "model_name", None)
+        with span("llm.call", endpoint=decision.endpoint, tier=decision.tier, model=model,
+                  prompt_chars=len(prompt)) as call_span:
+            with llm_scheduler.slot(priority, timeout=deadline.remaining()):
+                # Latency is measured from when the call actually goes out, not from queueing
+                start = time.perf_counter()
+                success = False
+                kwargs = {k: v for k, v in decision.invoke_kwargs().items() if k != "max_tokens"}
+                try:
+                    response = self.budgets.run(
+                        decision.endpoint, decision.max_tokens,
+                        lambda **limit: llm_scheduler.call(llm, prompt, deadline, **kwargs, **limit, **call_kwargs),
+                        deadline=deadline
+                    )
+                    success = True
+                    call_span.set(**llm_usage(response))
+                    return response
+                finally:
+                    self.record(decision, time.perf_counter() - start, success)
+
+    def record(self, decision: RouteDecision, latency_seconds: float, success: bool = True):
+        """Record the outcome of a routed call"""
+        key = f"{decision.endpoint}:{decision.tier}"
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                entry = self._stats[key] = {
+                    "calls": 0,
+                    "errors": 0,
+                    "latencies": deque(maxlen=self._history_size)
+                }
+            entry["calls"] += 1
+            if not success:
+                entry["errors"] += 1
+            entry["latencies"].append(latency_seconds)
+        logger.debug(f"🔀 {key} ({decision.reason}) took {latency_seconds:.2f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        """Routing decisions and latency per endpoint and tier"""
+        with self._lock:
+            snapshot = {key: (entry["calls"], entry["errors"], sorted(entry["latencies"]))
+                        for key, entry in self._stats.items()}
+
+        routes = {}
+        for key, (calls, errors, latencies) in snapshot.items():
+            routes[key] = {
+                "calls": calls,
+                "errors": errors,
+                "avg_latency_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+                "p95_latency_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1) if latencies else 0.0
+            }
+        return {
+            "enabled": self.enabled,
+            "degraded": self.degraded,
+            "small_model": self.small_model,
+            "small_max_marks": self.small_max_marks,
+            "small_max_answer_chars": self.small_max_answer_chars,
+            "routes": routes
+        }
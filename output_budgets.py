@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Output Budgets
+Sizes the reply each LLM call may generate to what the item needs, instead
+of letting every call run to the client-wide 4000 tokens: generation time
+grows with output length, and a 2-mark question needs a few sentences of
+feedback, not an essay.
+
+A budget is enforced twice: the prompt asks for a reply comfortably under it
+(so answers end naturally) and max_tokens cuts off anything longer. A reply
+that still hits the limit (finish_reason "length") is retried once with a
+larger limit where the output must be complete JSON, or trimmed to its last
+full sentence for free-text tutor replies.
+
+    grade_answer  fixed budget
+    mock_exam     base + tokens per mark, capped
+    tutor_chat    by learning level
+    tutor_lesson  by difficulty level
+"""
+
+import os
+import re
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rough words per token for English text, and the share of the budget the prompt asks for
+WORDS_PER_TOKEN = 0.75
+PROMPT_SHARE = 0.6
+
+DEFAULT_TUTOR_TOKENS = "beginner=500,intermediate=700,advanced=1000"
+DEFAULT_LESSON_TOKENS = "beginner=1500,intermediate=2200,advanced=3000"
+
+_SENTENCE_END_RE = re.compile(r"[.!?)\]](?=\s|$)|\n")
+
+
+def parse_level_tokens(spec: str) -> Dict[str, int]:
+    """Parse 'beginner=500,intermediate=700' into token budgets per level"""
+    budgets = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            level, tokens = item.split("=", 1)
+            budgets[level.strip().lower()] = int(tokens)
+        except ValueError:
+            logger.error(f"❌ Ignoring invalid output budget '{item}' (expected level=tokens)")
+    return budgets
+
+
+def is_truncated(response) -> bool:
+    """Whether generation stopped at max_tokens rather than finishing"""
+    metadata = getattr(response, "response_metadata", None) or {}
+    return metadata.get("finish_reason") == "length"
+
+
+def length_instruction(max_tokens: Optional[int]) -> str:
+    """Prompt line asking for a reply that fits comfortably in the budget"""
+    if not max_tokens:
+        return ""
+    return f"LENGTH: keep your whole response under {int(max_tokens * WORDS_PER_TOKEN * PROMPT_SHARE)} words."
+
+
+def trim_to_sentence(text: str) -> str:
+    """Cut a truncated reply back to its last complete sentence (or line)"""
+    ends = [m.end() for m in _SENTENCE_END_RE.finditer(text)]
+    # Keep the cut text if trimming would throw away most of it
+    if not ends or ends[-1] < len(text) * 0.5:
+        return text.rstrip() + "…"
+    return text[:ends[-1]].rstrip()
+
+
+class OutputBudgets:
+    """Output-length policy per endpoint, and the tokens, latency and truncations it produced"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        grade_answer_tokens: int = 900,
+        mock_exam_base_tokens: int = 250,
+        mock_exam_tokens_per_mark: int = 50,
+        mock_exam_max_tokens: int = 1200,
+        tutor_tokens: Optional[Dict[str, int]] = None,
+        lesson_tokens: Optional[Dict[str, int]] = None,
+        retry_factor: float = 2.0,
+        retry_max_tokens: int = 4000,
+        history_size: int = 500
+    ):
+        self.enabled = enabled
+        self.grade_answer_tokens = grade_answer_tokens
+        self.mock_exam_base_tokens = mock_exam_base_tokens
+        self.mock_exam_tokens_per_mark = mock_exam_tokens_per_mark
+        self.mock_exam_max_tokens = mock_exam_max_tokens
+        self.tutor_tokens = tutor_tokens if tutor_tokens is not None else parse_level_tokens(DEFAULT_TUTOR_TOKENS)
+        self.lesson_tokens = lesson_tokens if lesson_tokens is not None else parse_level_tokens(DEFAULT_LESSON_TOKENS)
+        self.retry_factor = retry_factor
+        self.retry_max_tokens = retry_max_tokens
+        self._history_size = history_size
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_env(cls) -> "OutputBudgets":
+        """Build the policy from OUTPUT_BUDGET* environment variables"""
+        return cls(
+            enabled=os.getenv("OUTPUT_BUDGETS_ENABLED", "true").lower() == "true",
+            grade_answer_tokens=int(os.getenv("OUTPUT_BUDGET_GRADE_ANSWER_TOKENS", "900")),
+            mock_exam_base_tokens=int(os.getenv("OUTPUT_BUDGET_MOCK_EXAM_BASE_TOKENS", "250")),
+            mock_exam_tokens_per_mark=int(os.getenv("OUTPUT_BUDGET_MOCK_EXAM_TOKENS_PER_MARK", "50")),
+            mock_exam_max_tokens=int(os.getenv("OUTPUT_BUDGET_MOCK_EXAM_MAX_TOKENS", "1200")),
+            tutor_tokens=parse_level_tokens(os.getenv("OUTPUT_BUDGET_TUTOR_TOKENS", DEFAULT_TUTOR_TOKENS)),
+            lesson_tokens=parse_level_tokens(os.getenv("OUTPUT_BUDGET_LESSON_TOKENS", DEFAULT_LESSON_TOKENS)),
+            retry_factor=float(os.getenv("OUTPUT_BUDGET_RETRY_FACTOR", "2")),
+            retry_max_tokens=int(os.getenv("OUTPUT_BUDGET_RETRY_MAX_TOKENS", os.getenv("GRADING_MAX_TOKENS", "4000")))
+        )
+
+    def max_tokens(self, endpoint: str, marks: Optional[int] = None, level: Optional[str] = None) -> Optional[int]:
+        """Token budget for one call, None when budgets are off or the endpoint has no policy"""
+        if not self.enabled:
+            return None
+        if endpoint == "grade_answer":
+            return self.grade_answer_tokens
+        if endpoint == "mock_exam":
+            if marks is None:
+                return self.mock_exam_max_tokens
+            return min(self.mock_exam_base_tokens + self.mock_exam_tokens_per_mark * max(marks, 0),
+                       self.mock_exam_max_tokens)
+        levels = {"tutor_chat": self.tutor_tokens, "tutor_lesson": self.lesson_tokens}.get(endpoint)
+        if levels:
+            return levels.get((level or "").lower()) or levels.get("intermediate") or max(levels.values())
+        return None
+
+    def run(self, endpoint: str, max_tokens: Optional[int], call: Callable[..., Any], retry: bool = True,
+            deadline=None):
+        """
+        Make an LLM call within a budget: call(**limit) gets max_tokens (when there is a budget)
+
+        Args:
+            endpoint: Endpoint the call is for (stats key)
+            max_tokens: Output budget, None to keep the client's limit
+            call: Makes the call; receives max_tokens as a keyword argument when set
+            retry: Re-run a truncated call once with a larger budget (for output that must be complete)
+            deadline: Request deadline; no retry once it has expired
+
+        Returns:
+            The response; a truncated one if the retry was not possible or failed
+        """
+        start = time.perf_counter()
+        response = call(**({"max_tokens": max_tokens} if max_tokens else {}))
+        truncated = is_truncated(response)
+        retried = False
+        if truncated and retry and max_tokens and self.retry_factor > 1:
+            retry_tokens = min(int(max_tokens * self.retry_factor), self.retry_max_tokens)
+            if retry_tokens > max_tokens and not (deadline is not None and deadline.expired()):
+                logger.info(f"✂️ {endpoint} output hit its {max_tokens} token budget, retrying with {retry_tokens}")
+                try:
+                    response = call(max_tokens=retry_tokens)
+                    retried = True
+                    truncated = is_truncated(response)
+                except Exception as e:
+                    # The cut-off reply is still usable by the local parser
+                    logger.warning(f"⚠️ Retry of truncated {endpoint} output failed, keeping it: {e}")
+        self.record(endpoint, response, time.perf_counter() - start, max_tokens, truncated, retried)
+        return response
+
+    def record(self, endpoint: str, response, latency_seconds: float, max_tokens: Optional[int],
+               truncated: bool = False, retried: bool = False):
+        """Record the output size and latency of one call"""
+        usage = getattr(response, "usage_metadata", None) or {}
+        with self._lock:
+            entry = self._stats.get(endpoint)
+            if entry is None:
+                entry = self._stats[endpoint] = {
+                    "calls": 0,
+                    "truncated": 0,
+                    "retried": 0,
+                    "output_tokens": deque(maxlen=self._history_size),
+                    "budgets": deque(maxlen=self._history_size),
+                    "latencies": deque(maxlen=self._history_size)
+                }
+            entry["calls"] += 1
+            entry["truncated"] += int(truncated)
+            entry["retried"] += int(retried)
+            if usage.get("output_tokens") is not None:
+                entry["output_tokens"].append(usage["output_tokens"])
+            if max_tokens:
+                entry["budgets"].append(max_tokens)
+            entry["latencies"].append(latency_seconds)
+        if truncated:
+            logger.warning(f"✂️ {endpoint} output truncated at {max_tokens or 'the client'} token limit")
+
+    def stats(self) -> Dict[str, Any]:
+        """Budgets and the output tokens, latency and truncations per endpoint"""
+        with self._lock:
+            snapshot = {
+                endpoint: (e["calls"], e["truncated"], e["retried"], sorted(e["output_tokens"]),
+                           list(e["budgets"]), sorted(e["latencies"]))
+                for endpoint, e in self._stats.items()
+            }
+
+        def p95(values):
+            return values[min(len(values) - 1, int(len(values) * 0.95))] if values else None
+
+        endpoints = {}
+        for endpoint, (calls, truncated, retried, tokens, budgets, latencies) in snapshot.items():
+            endpoints[endpoint] = {
+                "calls": calls,
+                "truncated": truncated,
+                "retried": retried,
+                "avg_output_tokens": round(sum(tokens) / len(tokens), 1) if tokens else None,
+                "p95_output_tokens": p95(tokens),
+                "avg_budget": round(sum(budgets) / len(budgets), 1) if budgets else None,
+                "avg_latency_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+                "p95_latency_ms": round(p95(latencies) * 1000, 1) if latencies else None
+            }
+        return {
+            "enabled": self.enabled,
+            "policy": {
+                "grade_answer": self.grade_answer_tokens,
+                "mock_exam": {"base": self.mock_exam_base_tokens, "per_mark": self.mock_exam_tokens_per_mark,
+                              "max": self.mock_exam_max_tokens},
+                "tutor_chat": dict(self.tutor_tokens),
+                "tutor_lesson": dict(self.lesson_tokens),
+                "retry_factor": self.retry_factor
+            },
+            "endpoints": endpoints
+        }
+
+
+# Process-wide policy shared by every LLM call site
+output_budgets = OutputBudgets.from_env()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Overload Control
+Watches the LLM queue depth and recent LLM call latency and switches the
+service into cheaper modes while OpenAI is slow or the queue is deep, instead
+of letting requests pile up until they time out.
+
+Latency is read per output token from non-streamed calls, so long lessons
+and streamed tutor replies, which take long when healthy, do not count as
+the provider slowing down.
+
+Levels step up as soon as a signal crosses its threshold and step down one at
+a time, only after every signal has stayed below a fraction of its threshold
+for the recovery period, so the service does not flap at the boundary.
+
+    normal    full service
+    elevated  tutor: cached answers (exact matches only, as when healthy)
+              and shorter replies
+              lessons: cache only
+              mock exams: every question on the small model
+    critical  as elevated; with OVERLOAD_DEFER_MOCK_EXAMS, mock exams are
+              deferred to a background exam session the client polls
+"""
+
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ("normal", "elevated", "critical")
+
+
+class OverloadController:
+    """Degradation level derived from queue depth and LLM latency, with hysteresis"""
+
+    def __init__(
+        self,
+        scheduler,
+        enabled: bool = True,
+        queue_elevated: int = 20,
+        queue_critical: int = 60,
+        latency_elevated_ms_per_token: float = 150.0,
+        latency_critical_ms_per_token: float = 400.0,
+        latency_window: float = 60.0,
+        recovery_seconds: float = 30.0,
+        recovery_ratio: float = 0.7
+    ):
+        self.scheduler = scheduler
+        self.enabled = enabled
+        self.queue_thresholds = (queue_elevated, queue_critical)
+        self.latency_thresholds = (latency_elevated_ms_per_token, latency_critical_ms_per_token)
+        self.latency_window = latency_window
+        self.recovery_seconds = recovery_seconds
+        self.recovery_ratio = recovery_ratio
+        self._lock = threading.Lock()
+        self._level = 0
+        self._calm_since: Optional[float] = None
+        self._changed_at = time.monotonic()
+        self._reasons: List[str] = []
+        self._signals: Dict[str, Any] = {}
+        self._listeners: List[Callable[[str], None]] = []
+        self.transitions = 0
+        self.seconds_degraded = 0.0
+        self.degraded_responses: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls, scheduler) -> "OverloadController":
+        """Build a controller from OVERLOAD_* environment variables"""
+        return cls(
+            scheduler,
+            enabled=os.getenv("OVERLOAD_ENABLED", "true").lower() == "true",
+            queue_elevated=int(os.getenv("OVERLOAD_QUEUE_ELEVATED", "20")),
+            queue_critical=int(os.getenv("OVERLOAD_QUEUE_CRITICAL", "60")),
+            latency_elevated_ms_per_token=float(os.getenv("OVERLOAD_LATENCY_ELEVATED_MS_PER_TOKEN", "150")),
+            latency_critical_ms_per_token=float(os.getenv("OVERLOAD_LATENCY_CRITICAL_MS_PER_TOKEN", "400")),
+            recovery_seconds=float(os.getenv("OVERLOAD_RECOVERY_SECONDS", "30"))
+        )
+
+    @property
+    def level(self) -> str:
+        return LEVELS[self._level]
+
+    @property
+    def degraded(self) -> bool:
+        return self._level > 0
+
+    @property
+    def critical(self) -> bool:
+        return self._level >= 2
+
+    def add_listener(self, listener: Callable[[str], None]):
+        """Call listener(level) whenever the level changes"""
+        self._listeners.append(listener)
+
+    def _target(self, queue_depth: int, latency: Optional[float], scale: float = 1.0):
+        """Highest level whose threshold a signal reaches (thresholds scaled by `scale`)"""
+        target, reasons = 0, []
+        for level in (2, 1):
+            if queue_depth >= self.queue_thresholds[level - 1] * scale:
+                reasons.append(f"llm_queue_depth {queue_depth} >= {self.queue_thresholds[level - 1] * scale:g}")
+            if latency is not None and latency >= self.latency_thresholds[level - 1] * scale:
+                reasons.append(f"llm_p90_ms_per_token {latency:.0f} >= {self.latency_thresholds[level - 1] * scale:g}")
+            if reasons:
+                target = level
+                break
+        return target, reasons
+
+    def evaluate(self) -> str:
+        """Read the signals and move between levels; returns the current level"""
+        if not self.enabled:
+            return self.level
+        queue_depth = self.scheduler.queue_depth()
+        per_token = self.scheduler.recent_latency_per_token(self.latency_window)
+        latency = per_token * 1000 if per_token is not None else None
+        now = time.monotonic()
+
+        with self._lock:
+            self._signals = {"llm_queue_depth": queue_depth,
+                             "llm_p90_ms_per_token": round(latency, 1) if latency is not None else None}
+            previous = self._level
+            target, reasons = self._target(queue_depth, latency)
+            if target >= self._level:
+                self._calm_since = None
+                self._level = target
+                if reasons:
+                    self._reasons = reasons
+            else:
+                # Only count time as calm once the signals are well below the current level's thresholds
+                still_pressured, _ = self._target(queue_depth, latency, self.recovery_ratio)
+                if still_pressured >= self._level:
+                    self._calm_since = None
+                elif self._calm_since is None:
+                    self._calm_since = now
+                elif now - self._calm_since >= self.recovery_seconds:
+                    self._level -= 1
+                    self._calm_since = now if self._level > target else None
+                    if self._level == 0:
+                        self._reasons = []
+
+            changed = self._level != previous
+            if changed:
+                if previous > 0:
+                    self.seconds_degraded += now - self._changed_at
+                self._changed_at = now
+                self.transitions += 1
+
+        if changed:
+            level = self.level
+            if self._level > previous:
+                logger.warning(f"🚦 Overload level {LEVELS[previous]} -> {level}: {', '.join(self._reasons)}")
+            else:
+                logger.info(f"🚦 Overload level {LEVELS[previous]} -> {level}")
+            for listener in self._listeners:
+                try:
+                    listener(level)
+                except Exception as e:
+                    logger.error(f"❌ Overload listener failed: {e}")
+        return self.level
+
+    def record_degraded(self, mode: str):
+        """Count a response served in a degraded mode (e.g. 'tutor:cache')"""
+        with self._lock:
+            self.degraded_responses[mode] = self.degraded_responses.get(mode, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Current level, the signals behind it and degraded response counts"""
+        with self._lock:
+            seconds_degraded = self.seconds_degraded
+            if self._level > 0:
+                seconds_degraded += time.monotonic() - self._changed_at
+            return {
+                "enabled": self.enabled,
+                "level": self.level,
+                "reasons": list(self._reasons),
+                "signals": dict(self._signals),
+                "thresholds": {
+                    "llm_queue_depth": dict(zip(LEVELS[1:], self.queue_thresholds)),
+                    "llm_p90_ms_per_token": dict(zip(LEVELS[1:], self.latency_thresholds))
+                },
+                "level_since_seconds": round(time.monotonic() - self._changed_at, 1),
+                "transitions": self.transitions,
+                "seconds_degraded": round(seconds_degraded, 1),
+                "degraded_responses": dict(self.degraded_responses)
+            }
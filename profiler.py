@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Sampling Profiler
+Attaches to the running process on demand and samples every thread's stack at
+a fixed interval, producing collapsed stacks ("frame;frame;frame count") that
+flamegraph.pl, speedscope and most flame graph viewers load directly.
+
+Nothing runs until a profile is requested, so it is safe to leave in
+production builds; while it runs the cost is one stack walk per thread per
+sample.
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Leaf frames of threads that are parked rather than doing work
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another is running"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+
+
+class SamplingProfiler:
+    """Samples thread stacks from a background thread for a bounded duration"""
+
+    def __init__(self, max_seconds: float = 60, default_interval_ms: float = 5):
+        self.max_seconds = max_seconds
+        self.default_interval_ms = default_interval_ms
+        self._lock = threading.Lock()
+        self._running = False
+        self.last_profile: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_env(cls) -> "SamplingProfiler":
+        """Build a profiler from PROFILER_* environment variables"""
+        return cls(
+            max_seconds=float(os.getenv("PROFILER_MAX_SECONDS", "60")),
+            default_interval_ms=float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def profile(self, seconds: float, interval_ms: Optional[float] = None,
+                include_idle: bool = False) -> Dict[str, Any]:
+        """
+        Sample all threads for the given duration (blocks the calling thread)
+
+        Args:
+            seconds: How long to sample, capped at max_seconds
+            interval_ms: Time between samples
+            include_idle: Keep samples of threads parked in waits and selects
+
+        Returns:
+            Dict with the collapsed stacks and sampling statistics
+        """
+        with self._lock:
+            if self._running:
+                raise ProfilerBusy("A profile is already running")
+            self._running = True
+
+        seconds = max(0.1, min(seconds, self.max_seconds))
+        interval = max(1.0, interval_ms or self.default_interval_ms) / 1000
+        stacks: Counter = Counter()
+        own_id = threading.get_ident()
+        samples = 0
+        logger.info(f"🔬 Profiling for {seconds}s at {interval * 1000:.1f}ms intervals")
+
+        try:
+            start = time.perf_counter()
+            end = start + seconds
+            while time.perf_counter() < end:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    code = frame.f_code
+                    if not include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    labels.append(names.get(thread_id, f"thread-{thread_id}"))
+                    stacks[";".join(reversed(labels))] += 1
+                samples += 1
+                time.sleep(interval)
+            elapsed = time.perf_counter() - start
+        finally:
+            self._running = False
+
+        result = {
+            "seconds": round(elapsed, 3),
+            "interval_ms": interval * 1000,
+            "samples": samples,
+            "stack_samples": sum(stacks.values()),
+            "unique_stacks": len(stacks),
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+        }
+        self.last_profile = {k: v for k, v in result.items() if k != "collapsed"}
+        self.last_profile["finished_at"] = time.time()
+        logger.info(f"🔬 Profile finished: {samples} samples, {len(stacks)} unique stacks")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Profiler state for health reporting"""
+        return {"running": self._running, "max_seconds": self.max_seconds, "last_profile": self.last_profile}
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Rate Limiting
+Token-bucket limits per student and per client IP for each endpoint class, so
+one student or script cannot use up the shared OpenAI rate limit.
+
+Bucket state lives in memory by default, or in a SQLite table (the results
+store database by default) so several worker processes share the same limits.
+"""
+
+import os
+import math
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STUDENT_LIMITS = "tutor=20/60,grading=30/60,mock_exam=5/300"
+DEFAULT_IP_LIMITS = "tutor=120/60,grading=200/60,mock_exam=30/300"
+# Student ids the web app sends for signed-out users: limited by IP only, not as one shared student
+ANONYMOUS_STUDENT_IDS = frozenset({"", "anonymous", "guest", "null", "undefined"})
+
+
+class RateLimit(BaseModel):
+    """Bucket size and refill period: capacity requests per period_seconds"""
+    capacity: int
+    period_seconds: float
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity / self.period_seconds
+
+
+class RateLimitDecision(BaseModel):
+    """Outcome of taking a token from one bucket"""
+    allowed: bool
+    scope: str
+    limit: int
+    remaining: int
+    retry_after: float  # seconds until a token is available (0 when allowed)
+    reset_after: float  # seconds until the bucket is full again
+
+    def headers(self) -> Dict[str, str]:
+        """RateLimit-* and Retry-After response headers"""
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_after)),
+            "X-RateLimit-Scope": self.scope
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def parse_limits(spec: str) -> Dict[str, RateLimit]:
+    """Parse 'tutor=20/60,grading=30/60' into limits per endpoint class"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            name, value = item.split("=", 1)
+            capacity, period = value.split("/", 1)
+            limits[name.strip()] = RateLimit(capacity=int(capacity), period_seconds=float(period))
+        except ValueError:
+            logger.error(f"❌ Ignoring invalid rate limit '{item}' (expected name=requests/seconds)")
+    return limits
+
+
+def _refill(tokens: float, updated_at: float, now: float, limit: RateLimit) -> float:
+    """Tokens in a bucket once refilled up to now"""
+    return min(limit.capacity, tokens + max(0.0, now - updated_at) * limit.refill_per_second)
+
+
+def _take_all(levels: List[float]) -> Tuple[bool, List[float]]:
+    """Take one token from every bucket, or from none unless all of them have one"""
+    allowed = all(tokens >= 1 for tokens in levels)
+    return allowed, [tokens - 1 for tokens in levels] if allowed else levels
+
+
+class MemoryBucketStore:
+    """Bucket state in process memory"""
+
+    blocking = False
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, buckets: List[Tuple[str, RateLimit]], now: float,
+             idle_seconds: float) -> Tuple[bool, List[float]]:
+        """
+        Take a token from every bucket, or none; returns (allowed, tokens left per bucket)
+
+        idle_seconds is the longest refill period of any limit: a bucket idle that long is full
+        and can be dropped.
+        """
+        with self._lock:
+            levels = [_refill(*self._buckets.get(key, (limit.capacity, now)), now, limit) for key, limit in buckets]
+            allowed, levels = _take_all(levels)
+            for (key, _), tokens in zip(buckets, levels):
+                self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now - idle_seconds)
+            return allowed, levels
+
+    def _prune(self, cutoff: float):
+        """Drop buckets not touched since the cutoff (lock held)"""
+        for key in [k for k, (_, updated_at) in self._buckets.items() if updated_at < cutoff]:
+            del self._buckets[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "buckets": len(self._buckets)}
+
+
+class SqliteBucketStore:
+    """Bucket state in a SQLite table shared by every worker process on the host"""
+
+    # take() may wait up to the 5 s lock timeout: call it off the event loop
+    blocking = True
+
+    def __init__(self, path: str, prune_interval: float = 60.0):
+        self.path = path
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def take(self, buckets: List[Tuple[str, RateLimit]], now: float,
+             idle_seconds: float) -> Tuple[bool, List[float]]:
+        """Take a token from every bucket, or none; returns (allowed, tokens left per bucket)"""
+        with self._lock:
+            # IMMEDIATE takes the write lock up front so read-modify-write is atomic across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                levels = []
+                for key, limit in buckets:
+                    row = self._conn.execute(
+                        "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)
+                    ).fetchone()
+                    levels.append(_refill(*(row if row else (limit.capacity, now)), now, limit))
+                allowed, levels = _take_all(levels)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    [(key, tokens, now) for (key, _), tokens in zip(buckets, levels)]
+                )
+                if now >= self._next_prune:
+                    # Buckets idle for the longest refill period are full: same as no row
+                    self._conn.execute("DELETE FROM rate_limit_buckets WHERE updated_at < ?", (now - idle_seconds,))
+                    self._next_prune = now + self.prune_interval
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return allowed, levels
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM rate_limit_buckets").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "buckets": count}
+
+
+class RateLimiter:
+    """Applies per-student and per-IP token buckets for each endpoint class"""
+
+    def __init__(self, enabled: bool = True, student_limits: Optional[Dict[str, RateLimit]] = None,
+                 ip_limits: Optional[Dict[str, RateLimit]] = None, store=None):
+        self.enabled = enabled
+        self.student_limits = student_limits if student_limits is not None else parse_limits(DEFAULT_STUDENT_LIMITS)
+        self.ip_limits = ip_limits if ip_limits is not None else parse_limits(DEFAULT_IP_LIMITS)
+        self.store = store or MemoryBucketStore()
+        # A bucket untouched for the longest refill period is full again, whichever limit it belongs to
+        self.idle_seconds = max(
+            (limit.period_seconds for limit in (*self.student_limits.values(), *self.ip_limits.values())),
+            default=0.0
+        )
+        self.rejections: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        """Build a limiter from RATE_LIMIT_* environment variables"""
+        if os.getenv("RATE_LIMIT_BACKEND", "memory").lower() == "sqlite":
+            path = os.getenv("RATE_LIMIT_STORE_PATH") or os.getenv("RESULTS_STORE_PATH", "data/grading_results.db")
+            store = SqliteBucketStore(path)
+        else:
+            store = MemoryBucketStore()
+        return cls(
+            enabled=os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true",
+            student_limits=parse_limits(os.getenv("RATE_LIMIT_STUDENT", DEFAULT_STUDENT_LIMITS)),
+            ip_limits=parse_limits(os.getenv("RATE_LIMIT_IP", DEFAULT_IP_LIMITS)),
+            store=store
+        )
+
+    @property
+    def blocking(self) -> bool:
+        """Whether check() can block (a shared SQLite store), so async callers run it in a thread"""
+        return self.enabled and self.store.blocking
+
+    @staticmethod
+    def _decision(scope: str, limit: RateLimit, tokens: float, allowed: bool) -> RateLimitDecision:
+        return RateLimitDecision(
+            allowed=allowed,
+            scope=scope,
+            limit=limit.capacity,
+            remaining=int(tokens),
+            retry_after=0.0 if allowed else max(0.0, 1 - tokens) / limit.refill_per_second,
+            reset_after=(limit.capacity - tokens) / limit.refill_per_second
+        )
+
+    def check(self, endpoint_class: str, student_id: Optional[str], client_ip: Optional[str]) -> Optional[RateLimitDecision]:
+        """
+        Take a token from the student's and the IP's bucket for the endpoint class
+
+        Tokens are only taken when every bucket has one, so requests denied by the IP
+        limit (a shared NAT) do not use up the student's quota, and vice versa. Placeholder
+        ids sent for signed-out users ("anonymous", "guest") only get the IP limit.
+
+        Returns:
+            The most restrictive decision, or None when no limit applies
+        """
+        if not self.enabled:
+            return None
+        buckets = []
+        if student_id and student_id.strip().lower() not in ANONYMOUS_STUDENT_IDS \
+                and endpoint_class in self.student_limits:
+            buckets.append(("student", f"student:{endpoint_class}:{student_id}", self.student_limits[endpoint_class]))
+        if client_ip and endpoint_class in self.ip_limits:
+            buckets.append(("ip", f"ip:{endpoint_class}:{client_ip}", self.ip_limits[endpoint_class]))
+        if not buckets:
+            return None
+
+        allowed, levels = self.store.take([(key, limit) for _, key, limit in buckets], time.time(),
+                                          self.idle_seconds)
+        decisions = [
+            self._decision(scope, limit, tokens, allowed or tokens >= 1)
+            for (scope, _, limit), tokens in zip(buckets, levels)
+        ]
+        denied = [d for d in decisions if not d.allowed]
+        if denied:
+            decision = max(denied, key=lambda d: d.retry_after)
+            rejection_key = f"{endpoint_class}:{decision.scope}"
+            self.rejections[rejection_key] = self.rejections.get(rejection_key, 0) + 1
+            logger.warning(f"🚦 Rate limited {endpoint_class} request ({decision.scope}, retry in {decision.retry_after:.1f}s)")
+            return decision
+        return min(decisions, key=lambda d: d.remaining)
+
+    def stats(self) -> Dict[str, Any]:
+        """Configured limits and rejection counts for health reporting"""
+        return {
+            "enabled": self.enabled,
+            "student_limits": {k: f"{v.capacity}/{v.period_seconds:g}s" for k, v in self.student_limits.items()},
+            "ip_limits": {k: f"{v.capacity}/{v.period_seconds:g}s" for k, v in self.ip_limits.items()},
+            "rejections": dict(self.rejections),
+            "store": self.store.stats()
+        }
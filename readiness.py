@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Service Readiness
+Tracks whether this instance is ready for traffic, separately from whether it
+is alive: readiness flips only after the agents are constructed and every LLM
+connection pool has been warmed successfully, and drops again while shutting
+down. Failed warm-ups are retried; a failed required startup step keeps the
+instance out of rotation, with the reason reported.
+"""
+
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+WARMUP_MODES = ("pool", "call", "off")
+
+
+def iso_timestamp(ts: Optional[float] = None) -> str:
+    """UTC ISO-8601 timestamp, now by default"""
+    if ts is None:
+        ts = time.time()
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class ServiceReadiness:
+    """Startup, warm-up and shutdown state of the service"""
+
+    def __init__(self, warmup: str = "pool", warmup_timeout: float = 10, retry_seconds: float = 10):
+        if warmup not in WARMUP_MODES:
+            logger.warning(f"⚠️ Unknown READINESS_WARMUP '{warmup}', using 'pool'")
+            warmup = "pool"
+        self.warmup = warmup
+        self.warmup_timeout = warmup_timeout
+        self.retry_seconds = retry_seconds
+        self.started_at = time.time()
+        self._started = time.monotonic()
+        self.ready_at: Optional[float] = None
+        self.shutting_down = False
+        self.components: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_env(cls) -> "ServiceReadiness":
+        """Build readiness state from READINESS_* environment variables"""
+        return cls(
+            warmup=os.getenv("READINESS_WARMUP", "pool").lower(),
+            warmup_timeout=float(os.getenv("READINESS_WARMUP_TIMEOUT", "10")),
+            retry_seconds=float(os.getenv("READINESS_RETRY_SECONDS", "10"))
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None and not self.shutting_down
+
+    def uptime_seconds(self) -> float:
+        return round(time.monotonic() - self._started, 3)
+
+    def record(self, name: str, ok: bool, detail: Optional[str] = None, duration_ms: Optional[float] = None,
+               required: bool = True):
+        """Record the outcome of one startup or warm-up step (a failed required step keeps the instance not ready)"""
+        self.components[name] = {
+            "status": "ok" if ok else "failed",
+            "detail": detail,
+            "duration_ms": duration_ms,
+            "required": required
+        }
+
+    def warm_up_llm(self, name: str, llm) -> bool:
+        """
+        Open the LLM client's connection pool before the first request needs it
+
+        'pool' makes a token-free models.list request over the client's HTTP pool;
+        'call' sends a one-token completion, which also warms the model route.
+
+        Returns:
+            Whether the connection (every endpoint, for a pooled client) is warm
+        """
+        if self.warmup == "off" or llm is None:
+            return True
+        members = getattr(llm, "members", None)
+        if members:
+            # A pooled client: warm every endpoint behind it
+            results = [self.warm_up_llm(f"{name}:{member_name}", member) for member_name, member in members.items()]
+            return all(results)
+        start = time.perf_counter()
+        try:
+            if self.warmup == "call":
+                llm.invoke("ping", max_tokens=1, timeout=self.warmup_timeout)
+            else:
+                llm.root_client.with_options(timeout=self.warmup_timeout).models.list()
+            self.record(f"warmup:{name}", True, self.warmup, round((time.perf_counter() - start) * 1000, 1))
+            logger.info(f"🔥 Warmed {name} LLM connection ({self.warmup})")
+            return True
+        except Exception as e:
+            self.record(f"warmup:{name}", False, f"{type(e).__name__}: {e}",
+                        round((time.perf_counter() - start) * 1000, 1))
+            logger.warning(f"⚠️ Warm-up of {name} LLM connection failed: {e}")
+            return False
+
+    def mark_ready(self) -> bool:
+        """Flip to ready, unless a required startup or warm-up step has failed"""
+        blocking = self.not_ready_reasons()
+        if blocking:
+            logger.error(f"❌ Service not ready: {'; '.join(blocking)}")
+            return False
+        self.ready_at = time.time()
+        logger.info(f"✅ Service ready after {self.uptime_seconds():.1f}s")
+        return True
+
+    def failed_components(self) -> Dict[str, Dict[str, Any]]:
+        return {name: c for name, c in self.components.items() if c["status"] != "ok"}
+
+    def not_ready_reasons(self) -> List[str]:
+        """Failed required steps, as 'name: detail'"""
+        return [f"{name}: {c['detail']}" for name, c in self.failed_components().items() if c["required"]]
+
+    def liveness(self) -> Dict[str, Any]:
+        """Process-level status: alive as long as it can answer"""
+        return {
+            "status": "alive",
+            "started_at": iso_timestamp(self.started_at),
+            "uptime_seconds": self.uptime_seconds(),
+            "timestamp": iso_timestamp()
+        }
+
+    def state(self) -> str:
+        if self.shutting_down:
+            return "shutting_down"
+        if self.ready:
+            return "ready"
+        return "not_ready" if self.not_ready_reasons() else "starting"
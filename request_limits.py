@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Request Size Limits
+Caps request body size per endpoint before the body is buffered or parsed,
+and reads large JSON submissions straight into typed models.
+
+Bodies with a declared Content-Length over the limit are rejected with 413
+without reading them (the server already stops a body at its declared length);
+chunked bodies are read chunk by chunk up to the limit and rejected as soon as
+they pass it, so at most limit bytes are ever held.
+"""
+
+import os
+import re
+import json
+from typing import Any, Dict, List, Optional, Tuple, Type, TypeVar
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BODY_LIMIT = "256KB"
+DEFAULT_ENDPOINT_BODY_LIMITS = "/grade-mock-exam=4MB,/exam-sessions=4MB"
+
+_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(B|KB|MB|GB)?\s*$", re.IGNORECASE)
+_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def parse_size(value: str) -> int:
+    """Parse '512KB', '4MB' or a plain byte count"""
+    match = _SIZE.match(value)
+    if not match:
+        raise ValueError(f"Invalid size '{value}'")
+    return int(float(match.group(1)) * _UNITS[(match.group(2) or "B").upper()])
+
+
+def parse_body_limits(spec: str) -> Dict[str, int]:
+    """Parse '/grade-mock-exam=4MB,/exam-sessions=4MB' into limits by path prefix"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            prefix, size = item.split("=", 1)
+            limits[prefix.strip()] = parse_size(size)
+        except ValueError:
+            logger.error(f"❌ Ignoring invalid body limit '{item}' (expected /path=size)")
+    return limits
+
+
+class BodySizeLimitMiddleware:
+    """ASGI middleware enforcing a body size limit per path prefix (longest prefix wins)"""
+
+    def __init__(self, app, default_limit: int, endpoint_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.default_limit = default_limit
+        # Longest prefixes first so the most specific limit applies
+        self.endpoint_limits: List[Tuple[str, int]] = sorted(
+            (endpoint_limits or {}).items(), key=lambda item: len(item[0]), reverse=True
+        )
+        self.rejected = 0
+
+    @classmethod
+    def settings_from_env(cls) -> Dict[str, Any]:
+        """Middleware options from REQUEST_* environment variables"""
+        return {
+            "default_limit": parse_size(os.getenv("REQUEST_MAX_BODY_BYTES", DEFAULT_BODY_LIMIT)),
+            "endpoint_limits": parse_body_limits(os.getenv("REQUEST_BODY_LIMITS", DEFAULT_ENDPOINT_BODY_LIMITS))
+        }
+
+    def limit_for(self, path: str) -> int:
+        for prefix, limit in self.endpoint_limits:
+            if path.startswith(prefix):
+                return limit
+        return self.default_limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limit_for(scope["path"])
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None:
+            if declared.isdigit() and int(declared) > limit:
+                await self._reject(send, limit)
+                return
+            await self.app(scope, receive, send)
+            return
+
+        # Chunked: read up to the limit before the app sees any of it, then replay
+        messages = []
+        received = 0
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            received += len(message.get("body", b""))
+            if received > limit:
+                await self._reject(send, limit)
+                return
+            if not message.get("more_body", False):
+                break
+
+        async def replay_receive():
+            return messages.pop(0) if messages else await receive()
+
+        await self.app(scope, replay_receive, send)
+
+    async def _reject(self, send, limit: int):
+        self.rejected += 1
+        body = json.dumps({"detail": f"Request body exceeds the {limit:,} byte limit for this endpoint"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+async def parse_json_body(request: Request, model_cls: Type[ModelT]) -> ModelT:
+    """
+    Validate a JSON body directly into a typed model
+
+    pydantic-core parses the raw bytes straight into the model, without first
+    building the full dict tree FastAPI's default body handling creates.
+    """
+    body = await request.body()
+    try:
+        return model_cls.model_validate_json(body)
+    except ValidationError as e:
+        # Without the inputs, so an oversized field is not echoed back
+        raise HTTPException(
+            status_code=422,
+            detail=e.errors(include_url=False, include_context=False, include_input=False)
+        )
+
+
+def openapi_body(model_cls: Type[BaseModel]) -> Dict[str, Any]:
+    """openapi_extra documenting a body that the endpoint parses itself"""
+    schema = model_cls.model_json_schema()
+    definitions = schema.pop("$defs", {})
+
+    def inline(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return inline(definitions[node["$ref"].rsplit("/", 1)[-1]])
+            return {k: inline(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [inline(v) for v in node]
+        return node
+
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": inline(schema)}}}}
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Response Encoding
+Fast JSON serialization and Accept-Encoding negotiated compression for large
+API responses such as mock exam reports.
+"""
+
+import os
+import gzip
+import json
+from typing import Any, Dict, Optional
+from fastapi import Request
+from fastapi.responses import Response
+
+# Optional faster JSON encoder
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Optional brotli compression
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to compact UTF-8 JSON"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported content coding from an Accept-Encoding header"""
+    offered = {}
+    for item in accept_encoding.lower().split(","):
+        parts = item.strip().split(";")
+        coding = parts[0].strip()
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            offered[coding] = quality
+
+    candidates = (["br"] if BROTLI_AVAILABLE else []) + ["gzip"]
+    accepted = [c for c in candidates if offered.get(c, offered.get("*", 0.0)) > 0]
+    if not accepted:
+        return None
+    # Prefer the client's highest q-value, then brotli over gzip
+    return max(accepted, key=lambda c: (offered.get(c, offered.get("*", 0.0)), c == "br"))
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a body with the negotiated content coding"""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def json_response(request: Request, content: Dict[str, Any], status_code: int = 200) -> Response:
+    """Serialize content and compress it if the client accepts a supported coding"""
+    body = dumps(content)
+    headers = {"Vary": "Accept-Encoding"}
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    if encoding and len(body) >= COMPRESSION_MIN_BYTES:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
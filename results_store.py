@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Grading Results Store
+Persists every GradingResult and ExamReport to a local SQLite database so past
+results can be served again without any LLM traffic.
+
+Writes are queued and committed in batches by a background thread
+(write-behind), so saving a result never adds database latency to a request.
+"""
+
+import os
+import json
+import time
+import queue
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS grading_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    student_id TEXT,
+    question_id TEXT,
+    input_hash TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_student ON grading_results (student_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_results_student_kind ON grading_results (student_id, kind, created_at DESC);
+CREATE TABLE IF NOT EXISTS result_questions (
+    result_id INTEGER NOT NULL,
+    student_id TEXT,
+    question_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_result_questions_lookup ON result_questions (student_id, question_id);
+"""
+
+
+def input_hash(inputs: Any) -> str:
+    """Stable hash of the grading inputs, independent of key order"""
+    canonical = json.dumps(inputs, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class GradingResultsStore:
+    """SQLite-backed store of grading results with write-behind persistence"""
+
+    def __init__(self, path: str, batch_size: int = 100):
+        self.path = path
+        self.batch_size = batch_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        # Results queued and written so far, so a read waits only for writes queued before it
+        self._progress = threading.Condition()
+        self._enqueued = 0
+        self._written = 0
+        self._writer = threading.Thread(target=self._write_loop, name="results-store-writer", daemon=True)
+        self._writer.start()
+        logger.info(f"✅ Grading results store ready at {path}")
+
+    @classmethod
+    def from_env(cls) -> "GradingResultsStore":
+        """Build a store from RESULTS_STORE_* environment variables"""
+        return cls(os.getenv("RESULTS_STORE_PATH", "data/grading_results.db"))
+
+    # ===== WRITES =====
+
+    # Hashing and serialization happen on the writer thread, not the request path
+
+    def save_answer_result(self, student_id: Optional[str], question_id: Optional[str], inputs: Any,
+                           result: BaseModel):
+        """Queue a single-answer GradingResult for persistence"""
+        self._enqueue({
+            "kind": "answer",
+            "student_id": student_id,
+            "question_id": question_id,
+            "inputs": inputs,
+            "created_at": time.time(),
+            "payload": result
+        })
+
+    def save_exam_report(self, student_id: Optional[str], exam_type: str, inputs: Any, report: BaseModel):
+        """Queue an ExamReport for persistence"""
+        self._enqueue({
+            "kind": f"exam_{exam_type}".lower(),
+            "student_id": student_id,
+            "question_id": None,
+            "inputs": inputs,
+            "created_at": time.time(),
+            "payload": report
+        })
+
+    def _enqueue(self, item: Dict[str, Any]):
+        with self._progress:
+            self._enqueued += 1
+        self._queue.put(item)
+
+    def _write_loop(self):
+        """Drain the queue in batches until a None sentinel arrives"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            # Batch whatever else is already waiting, without holding writes back
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                logger.error(f"❌ Failed to persist {len(batch)} grading results: {e}")
+            finally:
+                with self._progress:
+                    self._written += len(batch)
+                    self._progress.notify_all()
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        """Insert a batch of results in one transaction"""
+        with self._lock:
+            with self._conn:
+                for item in batch:
+                    payload = item["payload"]
+                    if item["question_id"]:
+                        question_ids = [item["question_id"]]
+                    else:
+                        question_ids = [str(g.question_id) for g in getattr(payload, "question_grades", [])]
+                    cursor = self._conn.execute(
+                        "INSERT INTO grading_results (kind, student_id, question_id, input_hash, created_at, payload) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (item["kind"], item["student_id"], item["question_id"], input_hash(item["inputs"]),
+                         item["created_at"], payload.model_dump_json())
+                    )
+                    self._conn.executemany(
+                        "INSERT INTO result_questions (result_id, student_id, question_id) VALUES (?, ?, ?)",
+                        [(cursor.lastrowid, item["student_id"], qid) for qid in question_ids]
+                    )
+
+    def flush(self):
+        """Block until every result queued before the call has been written (later writes are not waited for)"""
+        with self._progress:
+            target = self._enqueued
+            self._progress.wait_for(lambda: self._written >= target or not self._writer.is_alive())
+
+    def close(self, timeout: Optional[float] = 30.0):
+        """Flush pending writes and stop the writer thread (closes the database only once the writer is done)"""
+        self._queue.put(None)
+        self._writer.join(timeout=timeout)
+        if self._writer.is_alive():
+            # Closing now would fail the writes still queued: leave the connection to the writer
+            logger.warning(f"⚠️ Results store writer still busy after {timeout:g}s "
+                           f"({self.pending_writes()} results queued), not closing the database")
+            return
+        with self._lock:
+            self._conn.close()
+
+    # ===== READS =====
+
+    def _rows(self, sql: str, params: tuple) -> List[Dict[str, Any]]:
+        """Run a query after pending writes land, so callers read their own writes"""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {
+                "id": row[0],
+                "kind": row[1],
+                "student_id": row[2],
+                "question_id": row[3],
+                "input_hash": row[4],
+                "created_at": row[5],
+                "result": json.loads(row[6])
+            }
+            for row in rows
+        ]
+
+    def results_for_student(self, student_id: str, kind: Optional[str] = None, limit: int = 20,
+                            offset: int = 0) -> List[Dict[str, Any]]:
+        """Most recent results for a student, optionally filtered by kind"""
+        columns = "id, kind, student_id, question_id, input_hash, created_at, payload"
+        if kind:
+            return self._rows(
+                f"SELECT {columns} FROM grading_results WHERE student_id = ? AND kind = ? "
+                "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (student_id, kind, limit, offset)
+            )
+        return self._rows(
+            f"SELECT {columns} FROM grading_results WHERE student_id = ? ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            (student_id, limit, offset)
+        )
+
+    def results_for_question(self, student_id: str, question_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Results for a student that include the given question"""
+        return self._rows(
+            "SELECT r.id, r.kind, r.student_id, r.question_id, r.input_hash, r.created_at, r.payload "
+            "FROM result_questions q JOIN grading_results r ON r.id = q.result_id "
+            "WHERE q.student_id = ? AND q.question_id = ? ORDER BY r.created_at DESC LIMIT ?",
+            (student_id, question_id, limit)
+        )
+
+    def get_result(self, result_id: int) -> Optional[Dict[str, Any]]:
+        """A single stored result by id"""
+        rows = self._rows(
+            "SELECT id, kind, student_id, question_id, input_hash, created_at, payload FROM grading_results WHERE id = ?",
+            (result_id,)
+        )
+        return rows[0] if rows else None
+
+    def pending_writes(self) -> int:
+        """Results queued but not yet committed"""
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        """Row count and write queue depth (runs a query: call it off the event loop)"""
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM grading_results").fetchone()[0]
+        return {"path": self.path, "results": count, "pending_writes": self.pending_writes()}
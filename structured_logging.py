@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Structured Logging
+One JSON object per log line, written by a background thread: callers only
+put the record on a bounded queue, so a slow stdout (a full pipe, a stalled
+log shipper) never blocks the event loop or a grading thread. When the queue
+is full, records are dropped and counted rather than waited for.
+
+Every line carries the id of the request it was logged in (X-Request-ID, or
+one generated per request) and its trace id, so the lines of one request can
+be pulled out of a busy log. High-volume INFO and DEBUG events can be sampled
+per logger (LOG_SAMPLE_RATES); warnings and errors are always kept.
+
+    {"ts": "...", "level": "INFO", "logger": "mock_exam_grading_agent",
+     "message": "...", "request_id": "...", "trace_id": "...", ...extra fields}
+"""
+
+import os
+import re
+import sys
+import copy
+import json
+import uuid
+import queue
+import random
+import atexit
+import threading
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+import logging
+
+from tracing import current_trace_id
+
+request_id_var: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("request_id", default=None)
+
+# Client-supplied request ids are echoed into logs, so only short, plain ones are accepted
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+# Attributes every LogRecord has; anything else was passed in `extra` and goes into the JSON line
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "request_id", "trace_id", "taskName"
+}
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+
+def new_request_id(supplied: Optional[str] = None) -> str:
+    """The client's request id when it is usable, otherwise a fresh one"""
+    if supplied and _REQUEST_ID_RE.match(supplied):
+        return supplied
+    return uuid.uuid4().hex
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse 'uvicorn.access=0.1,tutor_cache=0.5' into the share of INFO/DEBUG records kept per logger"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            print(f"❌ Ignoring invalid log sample rate '{item}' (expected logger=rate)", file=sys.stderr)
+    return rates
+
+
+class ContextFilter(logging.Filter):
+    """Stamp records with the request and trace id of the code that logged them"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.trace_id = current_trace_id()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a share of INFO/DEBUG records per logger (and its children); warnings and errors always pass"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # Longest name first, so 'uvicorn.access' wins over 'uvicorn'
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        for name, rate in self.rates:
+            if record.name == name or record.name.startswith(name + "."):
+                if rate >= 1.0 or random.random() < rate:
+                    return True
+                self.sampled_out += 1
+                return False
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with the extra fields it was logged with"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        for key in ("request_id", "trace_id"):
+            if getattr(record, key, None):
+                entry[key] = getattr(record, key)
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops (and counts) records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the message and traceback now (their arguments may change later), but leave the
+        # formatting to the listener thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+class LogPipeline:
+    """Root logging through a bounded queue to a background writer"""
+
+    def __init__(self, level: str = "INFO", fmt: str = "json", queue_size: int = 10000,
+                 sample_rates: Optional[Dict[str, float]] = None, stream=None):
+        self.level = level.upper()
+        self.format = fmt
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.sampler = SamplingFilter(sample_rates or {})
+        self.handler = DroppingQueueHandler(self.queue)
+        self.handler.addFilter(ContextFilter())
+        self.handler.addFilter(self.sampler)
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JSONFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+        self.listener = QueueListener(self.queue, output, respect_handler_level=False)
+        self._started = False
+
+    @classmethod
+    def from_env(cls) -> "LogPipeline":
+        """Build the pipeline from LOG_* environment variables"""
+        return cls(
+            level=os.getenv("LOG_LEVEL", "INFO"),
+            fmt=os.getenv("LOG_FORMAT", "json").lower(),
+            queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+            sample_rates=parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+        )
+
+    def start(self):
+        """Route the root logger through the queue (replacing any handlers) and start the writer"""
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        self.listener.start()
+        self._started = True
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Write out what is still queued and stop the writer"""
+        if self._started:
+            self._started = False
+            self.listener.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "format": self.format,
+            "level": self.level,
+            "queued": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "dropped": self.handler.dropped,
+            "sampled_out": self.sampler.sampled_out,
+            "sample_rates": dict(self.sampler.rates)
+        }
+
+
+_pipeline: Optional[LogPipeline] = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging() -> LogPipeline:
+    """Set up the process-wide logging pipeline from the environment (once; later calls return it)"""
+    global _pipeline
+    with _configure_lock:
+        if _pipeline is None:
+            _pipeline = LogPipeline.from_env()
+            _pipeline.start()
+        return _pipeline
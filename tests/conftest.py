@@ -0,0 +1,33 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+
+class FakeLLM:
+    """Stands in for ChatOpenAI: replies with reply(prompt) (a string, or an exception to raise)"""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.model_name = "fake"
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        from langchain_core.messages import AIMessage
+
+        self.calls += 1
+        content = self.reply(prompt)
+        if isinstance(content, Exception):
+            raise content
+        return AIMessage(content=content, usage_metadata={"input_tokens": 10, "output_tokens": 100, "total_tokens": 110},
+                         response_metadata={"finish_reason": "stop"})
+
+
+@pytest.fixture
+def fake_llm():
+    return FakeLLM
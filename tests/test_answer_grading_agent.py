@@ -0,0 +1,48 @@
+import pytest
+
+from answer_grading_agent import AnswerGradingAgent, GradingResult
+from llm_output_parser import parse_structured_output
+from mock_exam_grading_agent import QuestionGradingOutput
+
+RESULT = ('{"overall_score": 40, "percentage": 80, "grade": "A", "strengths": ["a"], "areas_for_improvement": ["b"], '
+          '"specific_feedback": "Good", "suggestions": ["c"]}')
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setenv("ROUTER_ENABLED", "false")
+    return AnswerGradingAgent("test")
+
+
+def test_salvages_json_in_prose_and_fences(agent, fake_llm):
+    agent.llm = fake_llm(lambda prompt: f"Here is the grade:\n```json\n{RESULT[:-1]},\n}}\n```")
+    result = agent.grade_answer("Define profit.", "Revenue minus costs.", "Money left over.", raise_errors=True)
+    assert result.overall_score == 40 and result.grade == "A"
+    assert agent.llm.calls == 1
+
+
+def test_unparseable_output_is_an_error_not_a_made_up_grade(agent, fake_llm):
+    agent.llm = fake_llm(lambda prompt: "I am unable to grade this answer.")
+    with pytest.raises(ValueError):
+        agent.grade_answer("Define profit.", "Revenue minus costs.", "Money left over.", raise_errors=True)
+    # Only the grading call and the one restructuring attempt
+    assert agent.llm.calls == 2
+
+
+def test_unparseable_output_without_raise_errors_returns_the_error_result(agent, fake_llm):
+    agent.llm = fake_llm(lambda prompt: "I am unable to grade this answer.")
+    result = agent.grade_answer("Define profit.", "Revenue minus costs.", "Money left over.")
+    assert result.overall_score == 0 and result.grade == "F"
+
+
+@pytest.mark.parametrize("text", ['{"marks_awarded": 3/4, "percentage_score": "75%", "feedback": "Clear but bri',
+                                  "Marks awarded: 3\nFeedback: Clear"])
+def test_parser_reads_truncated_json_and_labelled_prose(text):
+    result = parse_structured_output(text, QuestionGradingOutput, allow_prose=True, required=("marks_awarded",))
+    assert result.marks_awarded == 3
+
+
+def test_parser_requires_the_score():
+    assert parse_structured_output('{"feedback": "Good"}', QuestionGradingOutput, required=("marks_awarded",)) is None
+    # A complete grading result missing fields fails validation rather than being filled in
+    assert parse_structured_output('{"overall_score": 35}', GradingResult, required=("overall_score",)) is None
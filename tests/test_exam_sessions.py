@@ -0,0 +1,93 @@
+import pytest
+
+from deadlines import DeadlineExceeded
+from exam_sessions import ExamSessionError, ExamSessionManager, question_key
+from mock_exam_grading_agent import MockExamGradingAgent
+
+GRADE = '{"marks_awarded": 3, "percentage_score": 75, "feedback": "Good", "strengths": ["a"], "improvements": ["b"]}'
+
+
+def question(question_id, answer="Demand falls as price rises because..."):
+    return {"question_id": question_id, "question": f"Explain question {question_id}.", "solution": "Law of demand",
+            "user_answer": answer, "marks": 4}
+
+
+@pytest.fixture
+def llm(fake_llm):
+    return fake_llm(lambda prompt: GRADE)
+
+
+@pytest.fixture
+def manager(monkeypatch, llm):
+    monkeypatch.setenv("ROUTER_ENABLED", "false")
+    agent = MockExamGradingAgent("test")
+    agent.llm = llm
+    manager = ExamSessionManager(agent, max_workers=2, max_sessions=2)
+    yield manager
+    manager.shutdown()
+
+
+def test_submit_assembles_the_report_and_replays_it(manager):
+    session = manager.open_session("student-1", "P2")
+    for question_id in (1, 2):
+        manager.submit_answer(session.session_id, question(question_id))
+    report = manager.submit(session.session_id)
+    assert not report.is_partial and report.marks_obtained == 6
+    assert manager.submit(session.session_id) is report
+    with pytest.raises(ExamSessionError) as error:
+        manager.submit_answer(session.session_id, question(3))
+    assert error.value.status_code == 409
+
+
+def test_unchanged_answers_are_not_regraded(manager, llm):
+    session = manager.open_session("student-1", "P2")
+    manager.submit_answer(session.session_id, question(1))
+    assert manager.submit_answer(session.session_id, question(1))["status"] == "unchanged"
+    manager.submit(session.session_id, [question(1), question(2)])
+    assert llm.calls == 2
+
+
+def test_partial_report_is_rebuilt_once_pending_questions_are_graded(manager, llm):
+    llm.reply = lambda prompt: DeadlineExceeded("at capacity") if "question 2" in prompt else GRADE
+    session = manager.open_session("student-1", "P2")
+    for question_id in (1, 2):
+        manager.submit_answer(session.session_id, question(question_id))
+    partial = manager.submit(session.session_id)
+    assert partial.is_partial and partial.pending_questions == 1
+    assert manager.status(session.session_id)["submitted"] is False
+
+    llm.reply = lambda prompt: GRADE
+    report = manager.submit(session.session_id)
+    assert not report.is_partial and report.marks_obtained == 6
+    assert manager.status(session.session_id)["submitted"] is True
+
+
+def test_submitted_sessions_do_not_count_toward_the_cap(manager):
+    for _ in range(3):
+        session = manager.open_session("student-1", "P1")
+        manager.submit_answer(session.session_id, question(1))
+        manager.submit(session.session_id)
+    manager.open_session("student-2", "P1")
+    manager.open_session("student-3", "P1")
+    with pytest.raises(ExamSessionError) as error:
+        manager.open_session("student-4", "P1")
+    assert error.value.status_code == 503
+
+
+def test_submitted_sessions_expire_after_the_submitted_ttl(manager):
+    manager.submitted_ttl_seconds = 0
+    session = manager.open_session("student-1", "P1")
+    manager.submit_answer(session.session_id, question(1))
+    manager.submit(session.session_id)
+    manager.open_session("student-2", "P1")
+    with pytest.raises(ExamSessionError) as error:
+        manager.get_session(session.session_id)
+    assert error.value.status_code == 404
+
+
+def test_withdrawn_answers_leave_the_report(manager):
+    session = manager.open_session("student-1", "P2")
+    for question_id in (1, 2):
+        manager.submit_answer(session.session_id, question(question_id))
+    assert manager.remove_answer(session.session_id, question_key(question(2)))
+    assert manager.submit(session.session_id).total_questions == 1
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from idempotency import IdempotencyConflict, IdempotencyStore, resolve_key
+
+
+def counting(result="report", error=None, delay=0.0):
+    calls = []
+
+    async def func():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+
+    return func, calls
+
+
+def test_resend_replays_the_stored_result():
+    async def scenario():
+        store = IdempotencyStore()
+        func, calls = counting()
+        first = await store.run("grade", "key-1", "body", func)
+        second = await store.run("grade", "key-1", "body", func)
+        return first, second, calls
+
+    first, second, calls = asyncio.run(scenario())
+    assert first == ("report", False) and second == ("report", True) and len(calls) == 1
+
+
+def test_concurrent_resend_waits_on_the_run_in_progress():
+    async def scenario():
+        store = IdempotencyStore()
+        func, calls = counting(delay=0.05)
+        results = await asyncio.gather(store.run("grade", "key-1", "body", func),
+                                       store.run("grade", "key-1", "body", func))
+        return results, calls
+
+    results, calls = asyncio.run(scenario())
+    assert sorted(replayed for _, replayed in results) == [False, True] and len(calls) == 1
+
+
+def test_key_reused_with_a_different_body_conflicts():
+    async def scenario():
+        store = IdempotencyStore()
+        func, _ = counting()
+        await store.run("grade", "key-1", "body", func)
+        await store.run("grade", "key-1", "other body", func)
+
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(scenario())
+
+
+def test_failed_runs_are_not_replayed():
+    async def scenario():
+        store = IdempotencyStore()
+        failing, _ = counting(error=RuntimeError("provider down"))
+        with pytest.raises(RuntimeError):
+            await store.run("grade", "key-1", "body", failing)
+        func, calls = counting()
+        return await store.run("grade", "key-1", "body", func), calls
+
+    result, calls = asyncio.run(scenario())
+    assert result == ("report", False) and len(calls) == 1
+
+
+def test_results_keep_declines_are_run_again():
+    async def scenario():
+        store = IdempotencyStore()
+        func, calls = counting(result="partial")
+        for _ in range(2):
+            assert await store.run("grade", "key-1", "body", func, keep=lambda r: r != "partial") == ("partial", False)
+        return calls, len(store)
+
+    calls, entries = asyncio.run(scenario())
+    assert len(calls) == 2 and entries == 0
+
+
+def test_keys_expire_and_are_scoped():
+    async def scenario():
+        store = IdempotencyStore(ttl_seconds=0)
+        func, calls = counting()
+        await store.run("grade", "key-1", "body", func)
+        await store.run("grade", "key-1", "body", func)
+        await store.run("exam", "key-1", "other body", func)
+        return calls
+
+    assert len(asyncio.run(scenario())) == 3
+
+
+def test_resolve_key():
+    assert resolve_key(" header ", "body") == "header"
+    assert resolve_key(None, "body") == "body"
+    assert resolve_key("", None) is None
+    assert len(resolve_key("k" * 300, None)) == 255
@@ -0,0 +1,85 @@
+import pytest
+
+from llm_pacing import AdaptiveConcurrency, QuotaTracker, parse_duration, per_token_latency, retry_after
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("llm_pacing.time.monotonic", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize("value, seconds", [("1s", 1), ("6m0s", 360), ("20ms", 0.02), ("1h2m3.5s", 3723.5),
+                                            ("2.5", 2.5), ("soon", None), (None, None)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+def test_retry_after_prefers_milliseconds():
+    assert retry_after({"retry-after-ms": "1500", "retry-after": "9"}) == 1.5
+    assert retry_after({"x-ratelimit-reset-requests": "2s"}) == 2
+    assert retry_after({}) is None
+
+
+def test_per_token_latency_floors_short_replies():
+    assert per_token_latency(2.0, 200) == 0.01
+    assert per_token_latency(1.0, 5) == 1.0 / 50
+    assert per_token_latency(1.0, None) is None
+
+
+def test_quota_is_spread_over_the_window(clock):
+    quota = QuotaTracker(reserve_fraction=0)
+    quota.update({"x-ratelimit-limit-requests": "100", "x-ratelimit-remaining-requests": "10",
+                  "x-ratelimit-reset-requests": "10s"})
+    assert quota.quota_fraction() == 0.1
+    waits = [quota.reserve() for _ in range(3)]
+    assert waits[0] == 0 and waits[1] == pytest.approx(1.0) and waits[2] > waits[1]
+
+
+def test_exhausted_quota_waits_for_the_reset(clock):
+    quota = QuotaTracker()
+    quota.exhaust(20)
+    assert quota.delay() == 20
+    clock[0] += 20
+    assert quota.delay() == 0
+
+
+def test_steady_latency_grows_the_limit_additively(clock):
+    concurrency = AdaptiveConcurrency(max_limit=10)
+    concurrency.limit = 4.0
+    for _ in range(8):
+        concurrency.on_success(2.0, output_tokens=200, model="gpt-4")
+    assert 5 <= concurrency.current() <= 6
+
+
+def test_rate_limits_halve_the_limit_once_per_interval(clock):
+    concurrency = AdaptiveConcurrency(max_limit=16, decrease_interval=2)
+    concurrency.on_rate_limited()
+    concurrency.on_rate_limited()
+    assert concurrency.current() == 8 and concurrency.rate_limited == 2
+    clock[0] += 2
+    concurrency.on_rate_limited()
+    assert concurrency.current() == 4
+
+
+def test_mixed_models_and_reply_lengths_are_not_a_slowdown(clock):
+    concurrency = AdaptiveConcurrency(max_limit=8)
+    for i in range(50):
+        clock[0] += 1
+        # 20 ms/token on the small model, 50 ms/token on the large one, short and long replies
+        concurrency.on_success(0.02 * 100, output_tokens=100, model="small")
+        concurrency.on_success(0.05 * (800 if i % 2 else 60), output_tokens=800 if i % 2 else 60, model="large")
+    assert concurrency.decreases == 0 and concurrency.current() == 8
+
+
+def test_latency_climbing_over_the_baseline_shrinks_the_limit(clock):
+    concurrency = AdaptiveConcurrency(max_limit=8)
+    for _ in range(10):
+        clock[0] += 1
+        concurrency.on_success(2.0, output_tokens=100, model="gpt-4")
+    for _ in range(30):
+        clock[0] += 3
+        concurrency.on_success(10.0, output_tokens=100, model="gpt-4")
+    assert concurrency.decreases > 0 and concurrency.current() < 8
+    assert concurrency.stats()["latency_ms"]["gpt-4/token"]["baseline"] == pytest.approx(20, rel=0.5)
@@ -0,0 +1,148 @@
+import time
+
+import httpx
+import openai
+import pytest
+
+from llm_pool import LLMEndpoint, LLMPool, PooledChatModel, parse_endpoints
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def connection_error():
+    return openai.APIConnectionError(request=REQUEST)
+
+
+def rate_limit_error(retry_after="20"):
+    response = httpx.Response(429, request=REQUEST, headers={"retry-after": retry_after})
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def pool(count=2, **kwargs):
+    return LLMPool([LLMEndpoint(f"e{i}", None, f"key-{i}") for i in range(count)], **kwargs)
+
+
+def failing_on(*names, error=connection_error):
+    calls = []
+
+    def call(endpoint):
+        calls.append(endpoint.name)
+        if endpoint.name in names:
+            raise error()
+        return endpoint.name
+
+    return call, calls
+
+
+def test_parse_endpoints():
+    endpoints = parse_endpoints("primary||sk-a,local|http://localhost:8001/v1||0.5,bad|||x", "sk-default")
+    assert [(e.name, e.base_url, e.api_key, e.weight) for e in endpoints] == [
+        ("primary", None, "sk-a", 1.0), ("local", "http://localhost:8001/v1", "sk-default", 0.5)
+    ]
+
+
+def test_calls_fail_over_to_the_next_endpoint():
+    llm_pool = pool()
+    call, calls = failing_on("e0")
+    assert llm_pool.call(call) == "e1"
+    assert calls == ["e0", "e1"]
+    e0, e1 = llm_pool.endpoints
+    assert (e0.errors, e0.failovers, e1.calls) == (1, 1, 1)
+    assert e0.outstanding == e1.outstanding == 0
+
+
+def test_the_last_error_is_raised_when_every_endpoint_fails():
+    llm_pool = pool()
+    call, calls = failing_on("e0", "e1")
+    with pytest.raises(openai.APIConnectionError):
+        llm_pool.call(call)
+    assert sorted(calls) == ["e0", "e1"]
+
+
+def test_request_errors_do_not_fail_over_or_count_against_the_endpoint():
+    llm_pool = pool()
+    call, calls = failing_on("e0", "e1", error=lambda: ValueError("bad request"))
+    with pytest.raises(ValueError):
+        llm_pool.call(call)
+    assert len(calls) == 1 and all(e.errors == 0 for e in llm_pool.endpoints)
+
+
+def test_repeated_failures_eject_an_endpoint_with_growing_back_off():
+    llm_pool = pool(eject_after=2, eject_seconds=10)
+    e0 = llm_pool.endpoints[0]
+    for _ in range(2):
+        llm_pool._acquire(set())  # e0 first: both are idle
+        llm_pool._release(e0, 0.1, connection_error())
+    assert not e0.available(time.monotonic()) and e0.ejections == 1
+    first = e0.ejected_until
+    # Calls go to the healthy endpoint while it is out
+    assert llm_pool.call(lambda endpoint: endpoint.name) == "e1"
+    # One more failure after the back-off ejects it again, for twice as long
+    e0.ejected_until = 0
+    llm_pool._release(e0, 0.1, connection_error())
+    assert e0.ejections == 2 and e0.ejected_until - first > 10
+
+
+def test_rate_limited_endpoint_waits_out_retry_after():
+    llm_pool = pool()
+    call, calls = failing_on("e0", error=rate_limit_error)
+    assert llm_pool.call(call) == "e1"
+    assert llm_pool.endpoints[0].quota.delay() > 15
+
+
+def test_everything_ejected_still_tries_the_endpoint_back_first():
+    llm_pool = pool(eject_after=1, eject_seconds=10)
+    for endpoint in llm_pool.endpoints:
+        llm_pool._release(endpoint, 0.1, connection_error())
+        endpoint.outstanding = 0
+    assert llm_pool.stats()["healthy"] == 0
+    assert llm_pool.call(lambda endpoint: endpoint.name) in ("e0", "e1")
+
+
+class FakeStreamingModel:
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+
+    def stream(self, prompt, **kwargs):
+        for i in range(3):
+            if i == self.fail_at:
+                raise connection_error()
+            yield f"chunk-{i}"
+
+
+def pooled(llm_pool, **members):
+    model = PooledChatModel.__new__(PooledChatModel)
+    model.pool = llm_pool
+    model.members = members
+    return model
+
+
+def test_streams_hold_their_endpoint_until_closed():
+    llm_pool = pool(count=1)
+    endpoint = llm_pool.endpoints[0]
+    model = pooled(llm_pool, e0=FakeStreamingModel())
+
+    stream = model.stream("hi")
+    assert next(stream) == "chunk-0" and endpoint.outstanding == 1
+    assert list(stream) == ["chunk-1", "chunk-2"] and endpoint.outstanding == 0
+
+    stream = model.stream("hi")
+    next(stream)
+    stream.close()
+    assert endpoint.outstanding == 0 and endpoint.errors == 0
+
+
+def test_stream_failing_midway_releases_and_counts_the_error():
+    llm_pool = pool(count=1)
+    model = pooled(llm_pool, e0=FakeStreamingModel(fail_at=1))
+    with pytest.raises(openai.APIConnectionError):
+        list(model.stream("hi"))
+    endpoint = llm_pool.endpoints[0]
+    assert endpoint.outstanding == 0 and endpoint.errors == 1
+
+
+def test_stream_fails_over_before_its_first_chunk():
+    llm_pool = pool()
+    model = pooled(llm_pool, e0=FakeStreamingModel(fail_at=0), e1=FakeStreamingModel())
+    assert list(model.stream("hi")) == ["chunk-0", "chunk-1", "chunk-2"]
+    assert [e.outstanding for e in llm_pool.endpoints] == [0, 0]
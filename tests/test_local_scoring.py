@@ -0,0 +1,103 @@
+import pytest
+
+from local_scoring import LocalScorer, choice, final_quantity, parse_options, parse_quantities, parse_rules
+
+MCQ = "Which of the following is a fixed cost? A) Raw materials B) Rent C) Packaging D) Sales commission"
+BREAK_EVEN = "Calculate the break-even output. Fixed costs $40,000, price $50, variable cost $30."
+MARGIN = "Calculate the gross profit margin. Revenue $120,000, cost of sales $80,000."
+
+
+@pytest.fixture
+def scorer():
+    return LocalScorer()
+
+
+def item(question, solution, answer, marks=4):
+    return {"question_id": 1, "question": question, "solution": solution, "user_answer": answer, "marks": marks}
+
+
+@pytest.mark.parametrize("text, value", [
+    ("$40,000", 40000), ("(1,200)", -1200), ("a loss of £300", -300), ("2.5m", 2.5e6), ("1.5:1", 1.5),
+    ("33.3%", 33.3), ("Rs. 5 lakh", 5e5), ("-12", -12)
+])
+def test_parse_quantities(text, value):
+    assert parse_quantities(text)[-1].value == pytest.approx(value)
+
+
+def test_final_quantity_reads_the_result_not_the_working():
+    working = "FC / contribution = 40000 / (50 - 30)\n= 2000 units"
+    assert final_quantity(working).value == 2000 and final_quantity(working).unit == "units"
+
+
+def test_parse_rules():
+    assert parse_rules("P1=objective+numeric,P2=numeric,bad") == {"P1": {"objective", "numeric"}, "P2": {"numeric"}}
+
+
+@pytest.mark.parametrize("answer, expected", [("B", "B"), ("b)", "B"), ("(b)", "B"), ("Rent", "B"),
+                                              ("B) Rent", "B"), ("Answer: B", "B"), ("B because rent is fixed", None)])
+def test_choice(answer, expected):
+    assert choice(answer, parse_options(MCQ)) == expected
+
+
+@pytest.mark.parametrize("answer, correct", [("B", True), ("Rent", True), ("C", False), ("", False)])
+def test_multiple_choice(scorer, answer, correct):
+    result = scorer.score(item(MCQ, "B", answer, marks=1))
+    assert result.correct is correct and result.marks_awarded == (1 if correct else 0)
+
+
+def test_written_multiple_choice_answer_is_deferred(scorer):
+    assert scorer.score(item(MCQ, "B", "Rent, because it does not change with output")) is None
+
+
+@pytest.mark.parametrize("answer", ["2000", "2,000 units", "FC / contribution = 40000 / (50 - 30) = 2000 units"])
+def test_correct_figures(scorer, answer):
+    result = scorer.score(item(BREAK_EVEN, "2,000 units", answer), "P1")
+    assert result.correct and result.marks_awarded == 4
+
+
+@pytest.mark.parametrize("answer", ["33.3%", "33.33", "0.3333", "33%"])
+def test_rounded_and_fractional_percentages(scorer, answer):
+    assert scorer.score(item(MARGIN, "33.33%", answer), "P1").correct
+
+
+def test_wrong_bare_figure_scores_zero(scorer):
+    result = scorer.score(item(BREAK_EVEN, "2,000 units", "1,800"), "P1")
+    assert not result.correct and result.marks_awarded == 0
+
+
+@pytest.mark.parametrize("question, solution, answer", [
+    (BREAK_EVEN, "2,000 units", "five hundred"),          # no figure in digits
+    (BREAK_EVEN, "2,000 units", "not enough information"),
+    (MARGIN, "33.33%", "Gross profit = 120000 - 80000 = 40000, 40000 / 120000 = 40%"),  # working: method marks
+    (BREAK_EVEN, "2,000 units", "2,000 dollars"),         # right figure, wrong terms
+    (BREAK_EVEN, "2,000 units", "2 units"),               # a factor of a thousand out
+    (BREAK_EVEN, "2,000 units", "-2000"),                 # wrong sign
+])
+def test_uncertain_answers_are_deferred_to_the_llm(scorer, question, solution, answer):
+    assert scorer.score(item(question, solution, answer), "P1") is None
+
+
+def test_number_words_with_digits_are_understood(scorer):
+    assert scorer.score(item(BREAK_EVEN, "500 units", "5 hundred units"), "P1").correct
+    # "five hundred" vs "500 units" must not be scored 0 marks
+    assert scorer.score(item(BREAK_EVEN, "500 units", "five hundred"), "P1") is None
+
+
+def test_open_items_and_model_answers_with_prose_are_left_to_the_llm(scorer):
+    assert scorer.score(item("Calculate and explain the break-even output.", "2,000 units", "2000"), "P1") is None
+    assert scorer.score(item(BREAK_EVEN, "2,000 units as contribution covers fixed costs at this output level",
+                             "2000"), "P1") is None
+
+
+def test_rules_select_detectors_per_paper(scorer):
+    assert scorer.score(item(MCQ, "B", "B", marks=1), "P2") is None
+    assert scorer.score(item(BREAK_EVEN, "2,000 units", "2000"), "P2").correct
+    assert LocalScorer(enabled=False).score(item(MCQ, "B", "B", marks=1), "P1") is None
+
+
+def test_stats_count_outcomes(scorer):
+    scorer.score(item(MCQ, "B", "B", marks=1), "P1")
+    scorer.score(item(BREAK_EVEN, "500 units", "five hundred"), "P1")
+    stats = scorer.stats()
+    assert stats["scored"] == 1
+    assert stats["outcomes"] == {"objective_correct": 1, "numeric_deferred": 1}
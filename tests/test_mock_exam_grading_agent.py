@@ -0,0 +1,31 @@
+import pytest
+
+from mock_exam_grading_agent import MockExamGradingAgent
+
+GRADE = '{"marks_awarded": 3, "percentage_score": 75, "feedback": "Good", "strengths": ["a"], "improvements": ["b"]}'
+QUESTIONS = [
+    {"question_id": i, "question": f"Explain factor {i} affecting demand.", "solution": "Price, income, tastes",
+     "user_answer": "Price changes demand because...", "marks": 4}
+    for i in (1, 2, 3)
+]
+
+
+@pytest.fixture
+def agent(monkeypatch, fake_llm):
+    monkeypatch.setenv("ROUTER_ENABLED", "false")
+    agent = MockExamGradingAgent("test")
+    agent.llm = fake_llm(lambda prompt: "I cannot grade this one." if "factor 2" in prompt else GRADE)
+    return agent
+
+
+def test_unparseable_question_is_left_pending(agent):
+    report = agent.grade_exam(QUESTIONS, exam_type="P2", raise_errors=True)
+    assert [grade.status for grade in report.question_grades] == ["graded", "pending", "graded"]
+    assert report.question_grades[1].marks_awarded is None
+    assert report.is_partial and report.pending_questions == 1
+    assert report.marks_obtained == 6
+
+
+def test_unparseable_question_gets_zero_marks_without_pending_on_error(agent):
+    grade = agent.grade_question(QUESTIONS[1], exam_type="P2")
+    assert grade.status == "graded" and grade.marks_awarded == 0
@@ -0,0 +1,93 @@
+import pytest
+
+from overload import OverloadController
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.depth = 0
+        self.per_token = None
+
+    def queue_depth(self):
+        return self.depth
+
+    def recent_latency_per_token(self, window):
+        return self.per_token
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("overload.time.monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def scheduler():
+    return FakeScheduler()
+
+
+@pytest.fixture
+def controller(scheduler, clock):
+    return OverloadController(scheduler, queue_elevated=20, queue_critical=60, recovery_seconds=30)
+
+
+def test_steps_up_immediately(controller, scheduler):
+    assert controller.evaluate() == "normal"
+    scheduler.depth = 25
+    assert controller.evaluate() == "elevated" and controller.degraded and not controller.critical
+    scheduler.depth = 70
+    assert controller.evaluate() == "critical" and controller.critical
+
+
+def test_latency_per_token_thresholds(controller, scheduler):
+    scheduler.per_token = 0.060  # 60 ms per token: healthy
+    assert controller.evaluate() == "normal"
+    scheduler.per_token = 0.200
+    assert controller.evaluate() == "elevated"
+    assert controller.stats()["reasons"] == ["llm_p90_ms_per_token 200 >= 150"]
+    scheduler.per_token = 0.500
+    assert controller.evaluate() == "critical"
+
+
+def test_steps_down_one_level_at_a_time_after_the_recovery_period(controller, scheduler, clock):
+    scheduler.depth = 70
+    controller.evaluate()
+    scheduler.depth = 0
+    assert controller.evaluate() == "critical"
+    clock[0] += 29
+    assert controller.evaluate() == "critical"
+    clock[0] += 1
+    assert controller.evaluate() == "elevated"
+    clock[0] += 30
+    assert controller.evaluate() == "normal"
+    assert controller.transitions == 3
+
+
+def test_signals_near_the_threshold_do_not_count_as_calm(controller, scheduler, clock):
+    scheduler.depth = 25
+    controller.evaluate()
+    # Below the elevated threshold but above 70% of it: no flapping back to normal
+    scheduler.depth = 15
+    for _ in range(5):
+        clock[0] += 30
+        assert controller.evaluate() == "elevated"
+    scheduler.depth = 10
+    controller.evaluate()
+    clock[0] += 30
+    assert controller.evaluate() == "normal"
+
+
+def test_listeners_hear_level_changes(controller, scheduler):
+    levels = []
+    controller.add_listener(levels.append)
+    scheduler.depth = 25
+    controller.evaluate()
+    controller.evaluate()
+    assert levels == ["elevated"]
+
+
+def test_disabled_controller_stays_normal(scheduler, clock):
+    controller = OverloadController(scheduler, enabled=False)
+    scheduler.depth = 1000
+    assert controller.evaluate() == "normal"
@@ -0,0 +1,91 @@
+import pytest
+
+from rate_limiting import MemoryBucketStore, RateLimiter, SqliteBucketStore, parse_limits
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBucketStore()
+    return SqliteBucketStore(str(tmp_path / "buckets.db"))
+
+
+def limiter(store, student="grading=3/60", ip="grading=10/60"):
+    return RateLimiter(student_limits=parse_limits(student), ip_limits=parse_limits(ip), store=store)
+
+
+def allowed(rate_limiter, count, student_id="student-1", ip="10.0.0.1", endpoint_class="grading"):
+    return [rate_limiter.check(endpoint_class, student_id, ip).allowed for _ in range(count)]
+
+
+def test_parse_limits_skips_invalid_items():
+    limits = parse_limits("tutor=20/60, bad, grading=x/60,mock_exam=5/300")
+    assert set(limits) == {"tutor", "mock_exam"}
+    assert limits["mock_exam"].capacity == 5 and limits["mock_exam"].period_seconds == 300
+
+
+def test_student_bucket_limits_requests(store):
+    rate_limiter = limiter(store)
+    assert allowed(rate_limiter, 4) == [True, True, True, False]
+    denied = rate_limiter.check("grading", "student-1", "10.0.0.1")
+    assert denied.scope == "student" and 0 < denied.retry_after <= 20
+    assert int(denied.headers()["Retry-After"]) >= 1
+    # Another student on the same IP has their own bucket
+    assert allowed(rate_limiter, 1, student_id="student-2") == [True]
+
+
+def test_ip_denials_do_not_drain_the_student_bucket(store):
+    rate_limiter = limiter(store, student="grading=3/60", ip="grading=2/60")
+    assert allowed(rate_limiter, 6) == [True, True, False, False, False, False]
+    # The student still has the token the denied requests did not take
+    assert allowed(rate_limiter, 2, ip="10.0.0.2") == [True, False]
+    assert rate_limiter.rejections == {"grading:ip": 4, "grading:student": 1}
+
+
+@pytest.mark.parametrize("placeholder", ["anonymous", "guest", "", "Anonymous ", None])
+def test_signed_out_users_only_get_the_ip_limit(store, placeholder):
+    rate_limiter = limiter(store)
+    # Signed-out users behind different IPs do not share one "anonymous" student bucket
+    for i in range(5):
+        assert allowed(rate_limiter, 3, student_id=placeholder, ip=f"10.0.1.{i}") == [True] * 3
+    assert rate_limiter.check("grading", placeholder, "10.0.1.0").scope == "ip"
+
+
+def test_buckets_refill_over_time(store, monkeypatch):
+    rate_limiter = limiter(store)
+    clock = [1000.0]
+    monkeypatch.setattr("rate_limiting.time.time", lambda: clock[0])
+    assert allowed(rate_limiter, 4) == [True, True, True, False]
+    clock[0] += 20
+    assert allowed(rate_limiter, 2) == [True, False]
+
+
+def test_unlimited_endpoint_classes_and_disabled_limiter(store):
+    assert limiter(store).check("tutor", "student-1", "10.0.0.1") is None
+    assert RateLimiter(enabled=False, store=store).check("grading", "student-1", "10.0.0.1") is None
+
+
+def test_memory_prune_keeps_buckets_of_longer_limits():
+    store = MemoryBucketStore(max_keys=2)
+    rate_limiter = limiter(store, student="tutor=20/60,mock_exam=1/300", ip="")
+    assert rate_limiter.idle_seconds == 300
+    now = 1000.0
+    rate_limiter.store.take([("student:mock_exam:student-1", rate_limiter.student_limits["mock_exam"])], now, 300)
+    # A minute later tutor traffic pushes the store over max_keys: the mock exam bucket is still refilling
+    for i in range(3):
+        rate_limiter.store.take([(f"student:tutor:s{i}", rate_limiter.student_limits["tutor"])], now + 120, 300)
+    assert "student:mock_exam:student-1" in store._buckets
+    store.take([("student:tutor:late", rate_limiter.student_limits["tutor"])], now + 400, 300)
+    assert "student:mock_exam:student-1" not in store._buckets
+
+
+def test_sqlite_store_deletes_idle_buckets(tmp_path):
+    store = SqliteBucketStore(str(tmp_path / "buckets.db"), prune_interval=60)
+    limit = parse_limits("grading=3/60")["grading"]
+    store.take([("old", limit)], 1000.0, 300)
+    store.take([("recent", limit)], 1200.0, 300)
+    assert store.stats()["buckets"] == 2
+    store.take([("new", limit)], 1400.0, 300)
+    assert store.stats()["buckets"] == 2
+    keys = {row[0] for row in store._conn.execute("SELECT key FROM rate_limit_buckets")}
+    assert keys == {"recent", "new"}
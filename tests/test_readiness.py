@@ -0,0 +1,47 @@
+from readiness import ServiceReadiness
+
+
+def test_ready_once_warm_up_succeeds(fake_llm):
+    readiness = ServiceReadiness(warmup="call")
+    assert readiness.warm_up_llm("tutor", fake_llm(lambda prompt: "pong"))
+    assert readiness.mark_ready() and readiness.ready and readiness.state() == "ready"
+
+
+def test_failed_warm_up_keeps_the_instance_not_ready(fake_llm):
+    readiness = ServiceReadiness(warmup="call")
+    assert not readiness.warm_up_llm("tutor", fake_llm(lambda prompt: ConnectionError("refused")))
+    assert not readiness.mark_ready()
+    assert not readiness.ready and readiness.state() == "not_ready"
+    assert readiness.not_ready_reasons() == ["warmup:tutor: ConnectionError: refused"]
+    # A retry that succeeds clears the failure
+    assert readiness.warm_up_llm("tutor", fake_llm(lambda prompt: "pong"))
+    assert readiness.mark_ready()
+
+
+def test_failed_agent_initialization_keeps_the_instance_not_ready():
+    readiness = ServiceReadiness(warmup="off")
+    readiness.record("grading_agents", False, "invalid configuration")
+    assert not readiness.mark_ready() and readiness.state() == "not_ready"
+
+
+def test_optional_component_failures_do_not_block_readiness():
+    readiness = ServiceReadiness(warmup="off")
+    readiness.record("results_store", False, "disk full", required=False)
+    assert readiness.mark_ready()
+    assert "results_store" in readiness.failed_components()
+
+
+def test_pooled_clients_warm_every_endpoint(fake_llm):
+    class Pooled:
+        members = {"primary": fake_llm(lambda prompt: "pong"), "secondary": fake_llm(lambda prompt: TimeoutError())}
+
+    readiness = ServiceReadiness(warmup="call")
+    assert not readiness.warm_up_llm("grading", Pooled())
+    assert set(readiness.failed_components()) == {"warmup:grading:secondary"}
+
+
+def test_shutting_down_is_not_ready():
+    readiness = ServiceReadiness(warmup="off")
+    readiness.mark_ready()
+    readiness.shutting_down = True
+    assert not readiness.ready and readiness.state() == "shutting_down"
@@ -0,0 +1,51 @@
+import pytest
+
+from answer_grading_agent import GradingResult
+from results_store import GradingResultsStore, input_hash
+
+RESULT = GradingResult(overall_score=40, percentage=80, grade="A", strengths=["a"], areas_for_improvement=["b"],
+                       specific_feedback="Good", suggestions=["c"])
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "results.db")
+
+
+def save(store, count, student_id="student-1"):
+    for i in range(count):
+        store.save_answer_result(student_id, f"q{i}", {"question": f"Question {i}"}, RESULT)
+
+
+def test_input_hash_ignores_key_order():
+    assert input_hash({"a": 1, "b": [1, 2]}) == input_hash({"b": [1, 2], "a": 1})
+
+
+def test_reads_see_earlier_writes(path):
+    store = GradingResultsStore(path)
+    save(store, 3)
+    results = store.results_for_student("student-1")
+    assert len(results) == 3 and results[0]["result"]["grade"] == "A"
+    assert [r["question_id"] for r in store.results_for_question("student-1", "q1")] == ["q1"]
+    assert store.get_result(results[0]["id"])["student_id"] == "student-1"
+    assert store.results_for_student("student-2") == []
+    store.close()
+
+
+def test_close_writes_the_whole_backlog(path):
+    store = GradingResultsStore(path, batch_size=10)
+    save(store, 500)
+    store.close()
+    assert GradingResultsStore(path).stats()["results"] == 500
+
+
+def test_close_leaves_the_database_open_while_the_writer_is_busy(path):
+    store = GradingResultsStore(path)
+    with store._lock:
+        # The writer is stuck behind the lock, as behind a slow disk
+        save(store, 50)
+        store.close(timeout=0.1)
+        assert store._writer.is_alive()
+    store._writer.join(timeout=10)
+    assert not store._writer.is_alive()
+    assert GradingResultsStore(path).stats()["results"] == 50
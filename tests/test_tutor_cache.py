@@ -0,0 +1,69 @@
+import pytest
+
+from tutor_cache import TutorAnswerCache, antonym_pair, normalize_message, same_question, similarity, trigrams
+
+OPPOSITES = [
+    ("Explain two advantages of primary market research",
+     "Explain two disadvantages of primary market research"),
+    ("Why might a business choose internal rather than external recruitment?",
+     "Why might a business choose external rather than internal recruitment?"),
+    ("What are the advantages of being a sole trader?",
+     "What are the disadvantages of being a sole trader?"),
+    ("Explain the difference between a private and a public limited company",
+     "Explain the difference between a public and a private limited company"),
+    ("Give one advantage of franchising", "Give one disadvantage of franchising"),
+]
+
+
+def cache(threshold):
+    return TutorAnswerCache(similarity_threshold=threshold)
+
+
+@pytest.mark.parametrize("cached, asked", OPPOSITES)
+def test_opposite_questions_never_share_an_answer(cached, asked):
+    tutor_cache = cache(0.5)
+    tutor_cache.put("Marketing", "gcse", cached, "answer")
+    assert tutor_cache.get("Marketing", "gcse", asked) is None
+
+
+@pytest.mark.parametrize("cached, asked", OPPOSITES)
+def test_opposite_questions_look_alike_on_trigrams(cached, asked):
+    # Trigram similarity alone cannot tell these apart
+    score = similarity(trigrams(normalize_message(cached)), trigrams(normalize_message(asked)))
+    assert score > 0.75
+    assert not same_question(normalize_message(cached), normalize_message(asked))
+
+
+def test_default_is_exact_match_only():
+    tutor_cache = TutorAnswerCache()
+    assert tutor_cache.similarity_threshold == 1.0
+    tutor_cache.put("Marketing", "gcse", "What is market segmentation?", "answer")
+    assert tutor_cache.get("Marketing", "gcse", "what is   market segmentation") == "answer"
+    assert tutor_cache.get("Marketing", "gcse", "What's market segmentation?") is None
+    assert tutor_cache.stats()["exact_hits"] == 1
+
+
+def test_fuzzy_hit_needs_the_same_content_words():
+    tutor_cache = cache(0.6)
+    tutor_cache.put("Marketing", "gcse", "What is market segmentation?", "answer")
+    assert tutor_cache.get("Marketing", "gcse", "What's market segmentation?") == "answer"
+    assert tutor_cache.get("Marketing", "gcse", "What is market research?") is None
+    assert tutor_cache.stats()["similar_hits"] == 1
+
+
+def test_lookups_are_scoped_by_topic_and_level():
+    tutor_cache = TutorAnswerCache()
+    tutor_cache.put("Marketing", "gcse", "What is a market?", "answer")
+    assert tutor_cache.get("Finance", "gcse", "What is a market?") is None
+    assert tutor_cache.get("Marketing", "a-level", "What is a market?") is None
+
+
+@pytest.mark.parametrize("a, b", [("advantages", "disadvantages"), ("internal", "external"),
+                                  ("likely", "unlikely"), ("increase", "decrease"), ("import", "export")])
+def test_antonym_pairs(a, b):
+    assert antonym_pair(a, b) and antonym_pair(b, a)
+
+
+@pytest.mark.parametrize("a, b", [("market", "markets"), ("price", "prize"), ("profit", "profit")])
+def test_not_antonym_pairs(a, b):
+    assert not antonym_pair(a, b)
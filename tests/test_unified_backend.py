@@ -0,0 +1,87 @@
+import importlib
+import os
+
+import pytest
+from starlette.testclient import TestClient
+
+# Questions without a model answer are graded without an LLM call
+QUESTIONS = [{"question_id": i, "question": f"Question {i}", "user_answer": "An answer", "marks": 4} for i in (1, 2)]
+
+
+@pytest.fixture(scope="module")
+def backend(tmp_path_factory):
+    os.environ.update({
+        "READINESS_WARMUP": "off",
+        "RESULTS_STORE_PATH": str(tmp_path_factory.mktemp("results") / "results.db"),
+        "LOG_LEVEL": "CRITICAL"
+    })
+    return importlib.import_module("unified_backend")
+
+
+@pytest.fixture
+def client(backend):
+    with TestClient(backend.app) as client:
+        yield client
+
+
+@pytest.fixture
+def critical(backend, monkeypatch):
+    monkeypatch.setattr(backend.overload, "_level", 2)
+
+
+def test_mock_exams_are_not_deferred_by_default(backend, client, critical):
+    assert backend.OVERLOAD_DEFER_MOCK_EXAMS is False
+    response = client.post("/grade-mock-exam", json={"attempted_questions": QUESTIONS})
+    assert response.status_code == 200
+    assert len(response.json()["question_grades"]) == 2
+
+
+def test_deferred_mock_exam_returns_202_with_session_urls(backend, client, critical, monkeypatch):
+    monkeypatch.setattr(backend, "OVERLOAD_DEFER_MOCK_EXAMS", True)
+    response = client.post("/grade-mock-exam", json={"attempted_questions": QUESTIONS, "exam_type": "P1"})
+    assert response.status_code == 202
+    body = response.json()
+    assert body["deferred"] is True
+    assert response.headers["X-Degraded-Mode"] == "deferred"
+    assert body["status_url"] == f"/exam-sessions/{body['session_id']}"
+
+    report = client.post(body["submit_url"], json={}).json()
+    assert report["total_questions"] == 2
+    assert not report["is_partial"]
+
+
+def test_degraded_tutor_cache_serves_exact_hits_only(backend, client, critical, monkeypatch):
+    tutor = backend.ai_tutor
+    tutor.answer_cache.put("Marketing", "intermediate", "Give one advantage of franchising", "cached")
+    monkeypatch.setattr(tutor, "get_response", lambda request, max_tokens=None: tutor._build_response(request, "generated"))
+
+    def ask(user_id, message):
+        response = client.post("/tutor/chat", json={"message": message, "topic": "Marketing", "user_id": user_id})
+        return response.json()["response"], response.headers["X-Degraded-Mode"]
+
+    assert ask("student-1", "Give one advantage of franchising") == ("cached", "cache")
+    assert ask("student-2", "Give one disadvantage of franchising") == ("generated", "short")
+
+
+def test_opening_exam_sessions_is_rate_limited(backend, client, monkeypatch):
+    from rate_limiting import RateLimiter, parse_limits
+
+    monkeypatch.setattr(backend, "rate_limiter", RateLimiter(student_limits=parse_limits("mock_exam=2/300"),
+                                                             ip_limits={}))
+    statuses = [client.post("/exam-sessions", json={"student_id": "student-1"}).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+
+def test_readiness_probe(backend, client, monkeypatch):
+    # Each client runs startup and shutdown again: start from a warmed instance
+    monkeypatch.setattr(backend.readiness, "shutting_down", False)
+    monkeypatch.setattr(backend.readiness, "ready_at", 1.0)
+    ready = client.get("/health/ready")
+    assert ready.status_code == 200 and ready.json()["not_ready_reasons"] == []
+    monkeypatch.setitem(backend.readiness.components, "warmup:tutor",
+                        {"status": "failed", "detail": "timeout", "duration_ms": None, "required": True})
+    monkeypatch.setattr(backend.readiness, "ready_at", None)
+    not_ready = client.get("/health/ready")
+    assert not_ready.status_code == 503
+    assert not_ready.json()["status"] == "not_ready"
+    assert not_ready.json()["not_ready_reasons"] == ["warmup:tutor: timeout"]
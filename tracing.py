@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Request Tracing
+Lightweight structured spans for finding where the time in a request goes.
+
+Spans nest through contextvars (which FastAPI's threadpool propagates), and
+finished spans go to local exporters only: an in-memory ring buffer served by
+the /debug/traces endpoints, and optionally a JSONL file.
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation within a trace"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_time", "_start", "duration_ms",
+                 "attributes", "status", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.attributes = attributes
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        """Add attributes to the span"""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "status": self.status,
+            "error": self.error
+        }
+
+
+class _NoopSpan:
+    """Stand-in used when tracing is disabled"""
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class RingBufferExporter:
+    """Keeps the most recent finished spans in memory"""
+
+    def __init__(self, max_spans: int = 5000):
+        self._spans: deque = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+
+class JsonlFileExporter:
+    """Appends finished spans to a JSONL file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class Tracer:
+    """Creates spans and hands finished ones to the exporters"""
+
+    def __init__(self, enabled: bool = True, buffer_size: int = 5000, export_path: Optional[str] = None):
+        self.enabled = enabled
+        self.buffer = RingBufferExporter(buffer_size)
+        self.exporters: List[Any] = [self.buffer]
+        if enabled and export_path:
+            try:
+                self.exporters.append(JsonlFileExporter(export_path))
+            except OSError as e:
+                logger.error(f"❌ Could not open trace export file {export_path}: {e}")
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        """Build a tracer from TRACING_* environment variables"""
+        return cls(
+            enabled=os.getenv("TRACING_ENABLED", "true").lower() == "true",
+            buffer_size=int(os.getenv("TRACING_BUFFER_SIZE", "5000")),
+            export_path=os.getenv("TRACING_EXPORT_PATH") or None
+        )
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Any]:
+        """Time a block as a child of the current span"""
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+
+        current = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.status = "error"
+            current.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            current.duration_ms = round((time.perf_counter() - current._start) * 1000, 3)
+            _current_span.reset(token)
+            for exporter in self.exporters:
+                try:
+                    exporter.export(current)
+                except Exception as e:
+                    logger.error(f"❌ Span export failed: {e}")
+
+    def traces(self, limit: int = 20, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Most recent traces as waterfalls, newest first"""
+        grouped: "OrderedDict[str, List[Span]]" = OrderedDict()
+        for span in reversed(self.buffer.spans()):
+            grouped.setdefault(span.trace_id, []).append(span)
+
+        traces = []
+        for trace_id, spans in grouped.items():
+            root = next((s for s in spans if s.parent_id is None), None)
+            if root is None or (name and root.name != name and root.attributes.get("path") != name):
+                continue
+            traces.append(self._waterfall(trace_id, spans))
+            if len(traces) >= limit:
+                break
+        return traces
+
+    def trace(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """One trace as a waterfall"""
+        spans = [s for s in self.buffer.spans() if s.trace_id == trace_id]
+        return self._waterfall(trace_id, spans) if spans else None
+
+    def _waterfall(self, trace_id: str, spans: List[Span]) -> Dict[str, Any]:
+        """Order spans by start time with depth and offset from the trace start"""
+        spans = sorted(spans, key=lambda s: s._start)
+        by_id = {s.span_id: s for s in spans}
+        origin = spans[0]._start
+        root = next((s for s in spans if s.parent_id is None), spans[0])
+
+        def depth(span: Span) -> int:
+            level = 0
+            while span.parent_id in by_id:
+                span = by_id[span.parent_id]
+                level += 1
+            return level
+
+        return {
+            "trace_id": trace_id,
+            "name": root.name,
+            "attributes": root.attributes,
+            "duration_ms": root.duration_ms,
+            "spans": [
+                {**s.to_dict(), "depth": depth(s), "offset_ms": round((s._start - origin) * 1000, 3)}
+                for s in spans
+            ]
+        }
+
+
+def current_trace_id() -> Optional[str]:
+    """Trace id of the span the caller is in, if any"""
+    current = _current_span.get()
+    return current.trace_id if current else None
+
+
+# Process-wide tracer used by the agents and the backend
+tracer = Tracer.from_env()
+span = tracer.span
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Traffic Capture
+Opt-in recording of production-shaped traffic for replay benchmarks: request
+bodies of the grading and tutor endpoints, anonymized, with their status and
+timing, written to rotating JSONL files by a background thread.
+
+Anonymization keeps the shape that matters for performance (answer lengths,
+word counts, exam sizes, conversation depth) and drops the content: ids are
+replaced by salted hashes and free text by filler words of the same lengths.
+"""
+
+import os
+import re
+import json
+import time
+import queue
+import random
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPTURE_PATHS = "/tutor/chat,/tutor/lesson,/grade-answer,/grade-mock-exam"
+
+# Values under these keys identify a person or request and are hashed
+ID_FIELDS = {"user_id", "student_id", "idempotency_key", "session_id", "conversation_id"}
+# Values under these keys are categorical and kept as they are
+KEEP_FIELDS = {"exam_type", "part", "topic", "difficulty_level", "learning_level", "role", "compact"}
+# Request headers that change how a request is served
+RECORDED_HEADERS = ("accept-encoding", "x-request-deadline")
+
+_FILLER = ["a", "to", "the", "cost", "price", "market", "revenue", "business", "marketing",
+           "production", "competitors", "shareholders", "productivity", "globalisation",
+           "diversification", "competitiveness"]
+_FILLER_BY_LENGTH = {len(word): word for word in _FILLER}
+_WORD = re.compile(r"\S+")
+
+
+def _filler_word(match: "re.Match") -> str:
+    length = len(match.group(0))
+    return _FILLER_BY_LENGTH.get(length) or ("x" * length)
+
+
+def anonymize(value: Any, salt: str, key: Optional[str] = None) -> Any:
+    """Strip identities and content from a request body, keeping its structure and sizes"""
+    if isinstance(value, dict):
+        return {k: anonymize(v, salt, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [anonymize(v, salt, key) for v in value]
+    if not isinstance(value, str) or key in KEEP_FIELDS:
+        return value
+    if key in ID_FIELDS:
+        return "anon-" + hashlib.sha256((salt + value).encode("utf-8")).hexdigest()[:16]
+    return _WORD.sub(_filler_word, value)
+
+
+class TrafficRecorder:
+    """Writes anonymized request records to size-rotated JSONL files"""
+
+    def __init__(self, directory: str = "data/traffic", paths: Optional[List[str]] = None,
+                 max_bytes: int = 50 * 1024 * 1024, max_files: int = 10, sample_rate: float = 1.0,
+                 salt: Optional[str] = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.paths = set(paths if paths is not None else DEFAULT_CAPTURE_PATHS.split(","))
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.sample_rate = sample_rate
+        # A per-process salt unless configured, so hashes cannot be joined across captures by default
+        self.salt = salt or os.urandom(16).hex()
+        self.recorded = 0
+        self.dropped = 0
+        self._file = None
+        self._file_bytes = 0
+        self._rotations = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=10000)
+        self._writer = threading.Thread(target=self._write_loop, name="traffic-capture-writer", daemon=True)
+        self._writer.start()
+        logger.info(f"🎥 Traffic capture enabled: {self.directory} ({', '.join(sorted(self.paths))})")
+
+    @classmethod
+    def from_env(cls) -> Optional["TrafficRecorder"]:
+        """A recorder from TRAFFIC_CAPTURE_* environment variables, or None when capture is off"""
+        if os.getenv("TRAFFIC_CAPTURE_ENABLED", "false").lower() != "true":
+            return None
+        return cls(
+            directory=os.getenv("TRAFFIC_CAPTURE_DIR", "data/traffic"),
+            paths=[p.strip() for p in os.getenv("TRAFFIC_CAPTURE_PATHS", DEFAULT_CAPTURE_PATHS).split(",") if p.strip()],
+            max_bytes=int(os.getenv("TRAFFIC_CAPTURE_MAX_BYTES", str(50 * 1024 * 1024))),
+            max_files=int(os.getenv("TRAFFIC_CAPTURE_MAX_FILES", "10")),
+            sample_rate=float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", "1.0")),
+            salt=os.getenv("TRAFFIC_CAPTURE_SALT") or None
+        )
+
+    def should_record(self, method: str, path: str) -> bool:
+        return method == "POST" and path in self.paths and random.random() < self.sample_rate
+
+    def record(self, path: str, body: bytes, started_at: float, duration_ms: float, status_code: int,
+               response_bytes: Optional[int] = None, headers: Optional[Dict[str, str]] = None):
+        """Queue one request for writing; parsing and anonymizing happen on the writer thread"""
+        item = {
+            "path": path,
+            "body": body,
+            "started_at": started_at,
+            "duration_ms": duration_ms,
+            "status_code": status_code,
+            "response_bytes": response_bytes,
+            "headers": headers or {}
+        }
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._write(item)
+            except Exception as e:
+                logger.error(f"❌ Failed to write traffic record: {e}")
+        if self._file:
+            self._file.close()
+
+    def _write(self, item: Dict[str, Any]):
+        try:
+            body = json.loads(item["body"] or b"null")
+        except ValueError:
+            body = None
+        record = {
+            "ts": item["started_at"],
+            "path": item["path"],
+            "duration_ms": item["duration_ms"],
+            "status_code": item["status_code"],
+            "request_bytes": len(item["body"] or b""),
+            "response_bytes": item["response_bytes"],
+            "headers": item["headers"],
+            "body": anonymize(body, self.salt)
+        }
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        if self._file is None or self._file_bytes + len(line) > self.max_bytes:
+            self._rotate()
+        self._file.write(line)
+        self._file.flush()
+        self._file_bytes += len(line)
+        self.recorded += 1
+
+    def _rotate(self):
+        """Start a new capture file and delete the oldest beyond max_files"""
+        if self._file:
+            self._file.close()
+        self._rotations += 1
+        name = time.strftime("traffic-%Y%m%d-%H%M%S", time.gmtime())
+        path = self.directory / f"{name}-{os.getpid()}-{self._rotations}.jsonl"
+        self._file = open(path, "ab")
+        self._file_bytes = path.stat().st_size
+        files = sorted(self.directory.glob("traffic-*.jsonl"), key=lambda p: p.stat().st_mtime)
+        for old in files[:-self.max_files]:
+            old.unlink(missing_ok=True)
+
+    def close(self):
+        """Write what is queued and close the current file"""
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": str(self.directory),
+            "paths": sorted(self.paths),
+            "sample_rate": self.sample_rate,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "pending": self._queue.qsize()
+        }
+
+
+def load_capture(paths: List[str]) -> List[Dict[str, Any]]:
+    """Read capture records from files or directories, ordered by time"""
+    files: List[Path] = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("traffic-*.jsonl")) if path.is_dir() else [path])
+    records = []
+    for file in files:
+        with open(file, encoding="utf-8") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return sorted(records, key=lambda r: r["ts"])
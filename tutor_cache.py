@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Tutor Answer Cache
+Serves repeated first-turn tutor questions ("what is market segmentation?")
+from memory instead of generating a fresh LLM reply each time.
+
+Only context-free first turns are cached, scoped by topic and learning level.
+A lookup matches the normalized message exactly. Below a similarity threshold
+of 1.0 it may also take the most similar cached question in the same scope by
+character-trigram similarity, but only one with the same content words in the
+same order: "advantages"/"disadvantages" or "internal rather than external"
+and its swap score above 0.9 on trigrams alone yet ask the opposite question.
+"""
+
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Optional, Set, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", (text or "").lower())).strip()
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+# Words that can be added, dropped or reworded without changing what is asked
+STOP_WORDS = frozenset("""
+a an the is are was were be been being do does did of to for in on at by with from as and or
+what whats s how why which who whom when where can could would should will shall may might must
+me my i you your we our us it its this that these those please tell give some any about
+""".split())
+# A word and the same word behind one of these asks the opposite question
+ANTONYM_PREFIXES = ("dis", "un", "in", "im", "il", "ir", "ex", "non", "de", "anti", "mis")
+
+
+def content_words(text: str) -> Tuple[str, ...]:
+    """The words of a normalized message that carry its meaning, in order"""
+    return tuple(word for word in text.split() if word not in STOP_WORDS)
+
+
+def _stem_after_prefix(word: str) -> str:
+    for prefix in ANTONYM_PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= 3:
+            return word[len(prefix):]
+    return word
+
+
+def antonym_pair(a: str, b: str) -> bool:
+    """Whether two words differ only by a negating or opposing prefix (advantages/disadvantages, internal/external)"""
+    if a == b:
+        return False
+    stem_a, stem_b = _stem_after_prefix(a), _stem_after_prefix(b)
+    return stem_a == b or stem_b == a or (stem_a == stem_b and stem_a not in (a, b))
+
+
+def same_question(a: str, b: str) -> bool:
+    """Whether two normalized messages ask the same thing: same content words in the same order, no antonyms"""
+    words_a, words_b = a.split(), b.split()
+    only_a, only_b = set(words_a) - set(words_b), set(words_b) - set(words_a)
+    if any(antonym_pair(x, y) for x in only_a for y in only_b):
+        return False
+    return content_words(a) == content_words(b)
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Jaccard similarity of two trigram sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _Entry:
+    __slots__ = ("response", "grams", "expires_at", "hits")
+
+    def __init__(self, response: str, grams: FrozenSet[str], expires_at: float):
+        self.response = response
+        self.grams = grams
+        self.expires_at = expires_at
+        self.hits = 0
+
+
+class TutorAnswerCache:
+    """LRU cache of first-turn tutor replies keyed by topic, level and normalized message"""
+
+    def __init__(self, enabled: bool = True, max_entries: int = 5000, ttl_seconds: float = 86400,
+                 similarity_threshold: float = 1.0, max_scan: int = 500):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.max_scan = max_scan
+        self._entries: "OrderedDict[Tuple[str, str, str], _Entry]" = OrderedDict()
+        self._scopes: Dict[Tuple[str, str], Set[str]] = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "TutorAnswerCache":
+        """Build a cache from TUTOR_CACHE_* environment variables"""
+        return cls(
+            enabled=os.getenv("TUTOR_CACHE_ENABLED", "true").lower() == "true",
+            max_entries=int(os.getenv("TUTOR_CACHE_MAX_ENTRIES", "5000")),
+            ttl_seconds=float(os.getenv("TUTOR_CACHE_TTL_SECONDS", "86400")),
+            similarity_threshold=float(os.getenv("TUTOR_CACHE_SIMILARITY", "1.0"))
+        )
+
+    @staticmethod
+    def _scope(topic: str, learning_level: Optional[str]) -> Tuple[str, str]:
+        return normalize_message(topic), (learning_level or "intermediate").lower()
+
+    def _remove(self, key: Tuple[str, str, str]):
+        """Drop an entry and its scope index (lock held)"""
+        del self._entries[key]
+        scope = self._scopes.get(key[:2])
+        if scope is not None:
+            scope.discard(key[2])
+            if not scope:
+                del self._scopes[key[:2]]
+
+    def get(self, topic: str, learning_level: Optional[str], message: str) -> Optional[str]:
+        """The cached reply for this first-turn question, or one asking the same thing close enough"""
+        if not self.enabled:
+            return None
+        threshold = self.similarity_threshold
+        scope = self._scope(topic, learning_level)
+        normalized = normalize_message(message)
+        now = time.monotonic()
+        with self._lock:
+            key = (*scope, normalized)
+            entry = self._entries.get(key)
+            if entry is None and threshold < 1.0:
+                key, entry = self._most_similar(scope, normalized, threshold)
+            if entry is not None and entry.expires_at <= now:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            if key[2] == normalized:
+                self.exact_hits += 1
+            else:
+                self.similar_hits += 1
+            return entry.response
+
+    def _most_similar(self, scope: Tuple[str, str], normalized: str, threshold: float):
+        """Best match above the threshold among the cached questions in the scope that ask the same thing (lock held)"""
+        grams = trigrams(normalized)
+        best_key, best_entry, best_score = None, None, threshold
+        for i, candidate in enumerate(self._scopes.get(scope, ())):
+            if i >= self.max_scan:
+                break
+            entry = self._entries[(*scope, candidate)]
+            # Jaccard can only reach the threshold if the set sizes are close enough
+            if min(len(grams), len(entry.grams)) < best_score * max(len(grams), len(entry.grams)):
+                continue
+            score = similarity(grams, entry.grams)
+            if score >= best_score and same_question(normalized, candidate):
+                best_key, best_entry, best_score = (*scope, candidate), entry, score
+        return best_key, best_entry
+
+    def put(self, topic: str, learning_level: Optional[str], message: str, response: str):
+        """Cache the reply to a first-turn question"""
+        if not self.enabled or not response:
+            return
+        scope = self._scope(topic, learning_level)
+        normalized = normalize_message(message)
+        if not normalized:
+            return
+        key = (*scope, normalized)
+        with self._lock:
+            self._entries[key] = _Entry(response, trigrams(normalized), time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            self._scopes.setdefault(scope, set()).add(normalized)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rates and size for health reporting"""
+        lookups = self.exact_hits + self.similar_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "scopes": len(self._scopes),
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.similar_hits) / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "similarity_threshold": self.similarity_threshold
+        }
@@ -5,31 +5,63 @@ Combines AI Tutor and Grading API on a single port (8000)
 """
 
 import os
+import hmac
 import json
-from typing import Dict, List, Optional
-from fastapi import FastAPI, HTTPException
+import uuid
+import time
+import asyncio
+import logging
+from typing import Dict, Iterator, List, Optional
+from fastapi import Depends, FastAPI, HTTPException, Header, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 import uvicorn
 from dotenv import load_dotenv
 
+from deadlines import Deadline
+from model_router import ModelRouter, llm_usage
+from llm_output_parser import IncrementalJSONParser, parse_structured_output
+from response_encoding import json_response, ORJSON_AVAILABLE, BROTLI_AVAILABLE
+from results_store import GradingResultsStore, input_hash
+from idempotency import IdempotencyStore, IdempotencyConflict, resolve_key
+from exam_sessions import ExamSessionManager, ExamSessionError
+from tracing import tracer, span
+from profiler import SamplingProfiler, ProfilerBusy
+from rate_limiting import RateLimiter
+from llm_scheduler import llm_scheduler, scheduling_context
+from readiness import ServiceReadiness, iso_timestamp
+from traffic_capture import TrafficRecorder, RECORDED_HEADERS
+from tutor_cache import TutorAnswerCache
+from request_limits import BodySizeLimitMiddleware, parse_json_body, openapi_body
+from overload import OverloadController
+from output_budgets import output_budgets, is_truncated, length_instruction, trim_to_sentence
+from llm_pool import LLMPool
+from structured_logging import configure_logging, new_request_id, request_id_var
+from memory_diagnostics import memory_monitor
+
 # Load environment variables
 load_dotenv('config.env')
 
+# JSON log lines, written by a background thread so logging never blocks a request
+log_pipeline = configure_logging()
+logger = logging.getLogger(__name__)
+
 # Optional LangChain support
 try:
     from langchain_openai import ChatOpenAI
     LANGCHAIN_AVAILABLE = True
 except ImportError:
     LANGCHAIN_AVAILABLE = False
-    print("LangChain not available - using OpenAI directly")
+    logger.info("LangChain not available - using OpenAI directly")
 
 # Import grading agents
 try:
     from answer_grading_agent import AnswerGradingAgent, GradingResult
     from mock_exam_grading_agent import MockExamGradingAgent, ExamReport, QuestionGrade
     GRADING_AVAILABLE = True
-    print("✅ Grading agents imported successfully")
+    logger.info("✅ Grading agents imported successfully")
 except ImportError as e:
     GRADING_AVAILABLE = False
     MockExamGradingAgent = None
@@ -44,8 +76,8 @@ except ImportError as e:
         areas_for_improvement: List[str] = []
         specific_feedback: str = ""
         suggestions: List[str] = []
-    print(f"❌ Grading agent import failed: {e}")
-    print("Grading agent not available - grading endpoints will be disabled")
+    logger.error(f"❌ Grading agent import failed: {e}")
+    logger.info("Grading agent not available - grading endpoints will be disabled")
 
 # Configuration with better error handling
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -70,10 +102,44 @@ PORT = int(os.getenv("PORT", "8000"))
 # Logging Configuration
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 ENABLE_DEBUG = os.getenv("ENABLE_DEBUG", "true").lower() == "true"
+# Required in the X-Debug-Key header for /debug/* endpoints; without it they stay closed
+DEBUG_API_KEY = os.getenv("DEBUG_API_KEY")
+# Required in the X-Results-Key header for /grading/results/*; without it they stay closed
+RESULTS_API_KEY = os.getenv("RESULTS_API_KEY")
 
 # Performance Configuration
 REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOOUT", "30"))
 MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "10"))
+# Upper bound on how long a mock exam may keep grading before a partial report is returned
+MOCK_EXAM_DEADLINE_SECONDS = float(os.getenv("MOCK_EXAM_DEADLINE_SECONDS", "120"))
+
+# Request Field Limits (body size limits per endpoint are REQUEST_MAX_BODY_BYTES / REQUEST_BODY_LIMITS)
+MAX_QUESTIONS_PER_EXAM = int(os.getenv("MAX_QUESTIONS_PER_EXAM", "60"))
+MAX_QUESTION_CHARS = int(os.getenv("MAX_QUESTION_CHARS", "10000"))
+MAX_ANSWER_CHARS = int(os.getenv("MAX_ANSWER_CHARS", "20000"))
+MAX_TUTOR_MESSAGE_CHARS = int(os.getenv("MAX_TUTOR_MESSAGE_CHARS", "4000"))
+MAX_CONVERSATION_TURNS = int(os.getenv("MAX_CONVERSATION_TURNS", "50"))
+
+# Tutor WebSocket Configuration
+# Sessions with no message for this long are closed
+TUTOR_WS_IDLE_SECONDS = float(os.getenv("TUTOR_WS_IDLE_SECONDS", "600"))
+# Largest client frame accepted (a message plus its JSON envelope)
+TUTOR_WS_MAX_FRAME_BYTES = int(os.getenv("TUTOR_WS_MAX_FRAME_BYTES", str(MAX_TUTOR_MESSAGE_CHARS * 4 + 1024)))
+
+# Overload Configuration (level thresholds are OVERLOAD_* in overload.py)
+OVERLOAD_CHECK_INTERVAL = float(os.getenv("OVERLOAD_CHECK_INTERVAL", "1.0"))
+# Shorter tutor replies while degraded (cache hits stay as strict as when healthy)
+OVERLOAD_TUTOR_MAX_TOKENS = int(os.getenv("OVERLOAD_TUTOR_MAX_TOKENS", "800"))
+# Hand mock exams to a background exam session at the critical level (202 + polling URLs:
+# only for clients that handle them, the web app treats any 2xx as the finished report)
+OVERLOAD_DEFER_MOCK_EXAMS = os.getenv("OVERLOAD_DEFER_MOCK_EXAMS", "false").lower() == "true"
+
+# Rate Limiting Configuration
+# Only trust X-Forwarded-For when running behind a proxy that sets it
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+
+# Results Store Configuration
+RESULTS_STORE_ENABLED = os.getenv("RESULTS_STORE_ENABLED", "true").lower() == "true"
 
 # CORS Configuration
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
@@ -81,8 +147,7 @@ ALLOW_CREDENTIALS = os.getenv("ALLOW_CREDENTIALS", "true").lower() == "true"
 
 # Validate required configuration
 if not OPENAI_API_KEY:
-    print("❌ CRITICAL ERROR: OPENAI_API_KEY not found")
-    print("   Please check config.env and ensure OPENAI_API_KEY is set")
+    logger.critical("❌ CRITICAL ERROR: OPENAI_API_KEY not found - please check config.env and ensure OPENAI_API_KEY is set")
     exit(1)
 
 # Set LangSmith environment variables if available
@@ -91,9 +156,9 @@ if LANGSMITH_API_KEY:
     os.environ["LANGSMITH_PROJECT"] = LANGSMITH_PROJECT
     os.environ["LANGSMITH_ENDPOINT"] = LANGSMITH_ENDPOINT
     os.environ["LANGSMITH_TRACING"] = os.getenv("LANGSMITH_TRACING", "true")
-    print(f"✅ LangSmith configured: {LANGSMITH_PROJECT}")
+    logger.info(f"✅ LangSmith configured: {LANGSMITH_PROJECT}")
 else:
-    print("⚠️  WARNING: LANGSMITH_API_KEY not found - tracing disabled")
+    logger.warning("⚠️  WARNING: LANGSMITH_API_KEY not found - tracing disabled")
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -109,16 +174,77 @@ app.add_middleware(
     allow_credentials=ALLOW_CREDENTIALS,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id", "Retry-After", "RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset",
+                    "X-Service-Level", "X-Degraded-Mode", "X-Request-ID"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Open the root span of each request and return its trace id"""
+    with span("http.request", method=request.method, path=request.url.path,
+              request_id=request_id_var.get()) as request_span:
+        response = await call_next(request)
+        request_span.set(status_code=response.status_code)
+        trace_id = getattr(request_span, "trace_id", None)
+        if trace_id:
+            response.headers["X-Trace-Id"] = trace_id
+        return response
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """Tag every log line of a request with its X-Request-ID (generated when the client sends none)"""
+    request_id = new_request_id(request.headers.get("x-request-id"))
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+@app.middleware("http")
+async def flag_overload(request: Request, call_next):
+    """Tell clients when the service is running in a degraded mode"""
+    response = await call_next(request)
+    if overload.degraded:
+        response.headers["X-Service-Level"] = overload.level
+    return response
+
+# Opt-in recorder of anonymized production traffic for benchmarks/replay_traffic.py
+traffic_recorder = TrafficRecorder.from_env()
+
+@app.middleware("http")
+async def capture_traffic(request: Request, call_next):
+    """Record the body and timing of captured endpoints when traffic capture is on"""
+    if traffic_recorder is None or not traffic_recorder.should_record(request.method, request.url.path):
+        return await call_next(request)
+    body = await request.body()
+    started_at = time.time()
+    start = time.perf_counter()
+    response = await call_next(request)
+    content_length = response.headers.get("content-length")
+    traffic_recorder.record(
+        request.url.path,
+        body,
+        started_at,
+        round((time.perf_counter() - start) * 1000, 3),
+        response.status_code,
+        int(content_length) if content_length else None,
+        {h: request.headers[h] for h in RECORDED_HEADERS if h in request.headers}
+    )
+    return response
+
+# Outermost: reject oversized bodies before any middleware or route buffers them
+app.add_middleware(BodySizeLimitMiddleware, **BodySizeLimitMiddleware.settings_from_env())
+
 # Pydantic models for AI Tutor
 class TutorRequest(BaseModel):
-    message: str
-    topic: str
-    lesson_content: Optional[str] = None
-    user_id: Optional[str] = None
-    conversation_history: Optional[List[Dict[str, str]]] = []
-    learning_level: Optional[str] = "intermediate"
+    message: str = Field(max_length=MAX_TUTOR_MESSAGE_CHARS)
+    topic: str = Field(max_length=200)
+    lesson_content: Optional[str] = Field(default=None, max_length=MAX_ANSWER_CHARS)
+    user_id: Optional[str] = Field(default=None, max_length=255)
+    conversation_history: Optional[List[Dict[str, str]]] = Field(default=[], max_length=MAX_CONVERSATION_TURNS)
+    learning_level: Optional[str] = Field(default="intermediate", max_length=50)
 
 class TutorResponse(BaseModel):
     response: str
@@ -127,9 +253,9 @@ class TutorResponse(BaseModel):
     confidence_score: float
 
 class LessonRequest(BaseModel):
-    topic: str
-    learning_objectives: List[str]
-    difficulty_level: str = "intermediate"
+    topic: str = Field(max_length=200)
+    learning_objectives: List[str] = Field(max_length=20)
+    difficulty_level: str = Field(default="intermediate", max_length=50)
 
 class LessonResponse(BaseModel):
     lesson_content: str
@@ -139,11 +265,14 @@ class LessonResponse(BaseModel):
 
 # Pydantic models for Grading API
 class GradingRequest(BaseModel):
-    question: str
-    model_answer: str
-    student_answer: str
-    subject: str = "Business Studies"
-    topic: str = ""
+    question: str = Field(max_length=MAX_QUESTION_CHARS)
+    model_answer: str = Field(max_length=MAX_ANSWER_CHARS)
+    student_answer: str = Field(max_length=MAX_ANSWER_CHARS)
+    subject: str = Field(default="Business Studies", max_length=100)
+    topic: str = Field(default="", max_length=200)
+    student_id: Optional[str] = Field(default=None, max_length=255)
+    question_id: Optional[str] = Field(default=None, max_length=255)
+    idempotency_key: Optional[str] = None  # Alternative to the Idempotency-Key header
 
 class GradingResponse(BaseModel):
     success: bool
@@ -151,24 +280,57 @@ class GradingResponse(BaseModel):
     message: str = ""
 
 # Pydantic models for Mock Exam Grading
+class AttemptedQuestion(BaseModel):
+    """One attempted question; unknown fields are dropped"""
+    question_id: int = 0
+    question_number: Optional[int] = None  # Defaults to question_id
+    part: str = Field(default="", max_length=16)
+    question: str = Field(default="", max_length=MAX_QUESTION_CHARS)
+    user_answer: str = Field(default="", max_length=MAX_ANSWER_CHARS)
+    solution: Optional[str] = Field(default=None, max_length=MAX_ANSWER_CHARS)
+    model_answer: Optional[str] = Field(default=None, max_length=MAX_ANSWER_CHARS)
+    marks: int = Field(default=0, ge=0, le=100)
+
+    def to_agent_input(self) -> Dict:
+        """The dict shape the grading agents read, without unset optional fields"""
+        return self.model_dump(exclude_none=True)
+
 class MockExamGradingRequest(BaseModel):
-    attempted_questions: List[Dict]
+    attempted_questions: List[AttemptedQuestion] = Field(max_length=MAX_QUESTIONS_PER_EXAM)
+    exam_type: str = Field(default="P1", max_length=10)  # P1 or P2
+    student_id: Optional[str] = Field(default=None, max_length=255)
+    deadline_seconds: Optional[float] = None  # How long the client will wait for the report
+    compact: bool = False  # Omit the question, answer and model answer texts from the response
+    idempotency_key: Optional[str] = None  # Alternative to the Idempotency-Key header
+
+# Pydantic models for incremental exam sessions
+class ExamSessionRequest(BaseModel):
     exam_type: str = "P1"  # P1 or P2
     student_id: Optional[str] = None
 
+class ExamSessionSubmitRequest(BaseModel):
+    attempted_questions: Optional[List[AttemptedQuestion]] = Field(default=None, max_length=MAX_QUESTIONS_PER_EXAM)  # Final answers; only changed ones are regraded
+    deadline_seconds: Optional[float] = None
+    compact: bool = False
+
+# Fields echoed back from the request; omitted from compact responses
+ECHOED_QUESTION_FIELDS = {"question_text", "student_answer", "model_answer"}
+
 class QuestionGradeResponse(BaseModel):
     question_id: int
     question_number: int = 1
     part: str = ""
-    question_text: str
-    student_answer: str
-    model_answer: str
+    question_text: Optional[str] = None  # Omitted in compact mode
+    student_answer: Optional[str] = None  # Omitted in compact mode
+    model_answer: Optional[str] = None  # Omitted in compact mode
     marks_allocated: int
-    marks_awarded: float
-    percentage_score: float
+    marks_awarded: Optional[float]
+    percentage_score: Optional[float]
     feedback: str
     strengths: List[str]
     improvements: List[str]
+    status: str = "graded"  # "graded" or "pending"
+    graded_by: str = "llm"  # "llm", or "local" when scored without an LLM call
 
 class MockExamGradingResponse(BaseModel):
     success: bool
@@ -183,40 +345,109 @@ class MockExamGradingResponse(BaseModel):
     recommendations: List[str]
     strengths_summary: List[str]
     weaknesses_summary: List[str]
+    pending_questions: int = 0
+    is_partial: bool = False
     message: str = ""
 
 # Initialize services
 class SimpleAITutor:
     def __init__(self):
         self.conversations = {}
+        # Replies to context-free first-turn questions, shared across students
+        self.answer_cache = TutorAnswerCache.from_env()
+        # Generated lessons by topic, difficulty and objectives, served while overloaded
+        self.lesson_cache = TutorAnswerCache.from_env()
+        # One client for every tutor call, so requests reuse its warm connection pool
+        self.llm = ChatOpenAI(
+            model=TUTOR_MODEL,
+            temperature=TUTOR_TEMPERATURE,
+            max_tokens=TUTOR_MAX_TOKENS,
+            openai_api_key=OPENAI_API_KEY,
+            # Rate-limit headers, read by the call scheduler to pace calls
+            include_response_headers=True
+        ) if LANGCHAIN_AVAILABLE else None
+    
+    def conversation_stats(self) -> Dict[str, int]:
+        """Size of the server-side conversation history, for memory diagnostics"""
+        histories = list(self.conversations.values())
+        return {
+            "conversations": len(histories),
+            "messages": sum(len(history) for history in histories),
+            "chars": sum(len(message.get("content", "")) for history in histories for message in list(history))
+        }
+    
+    @staticmethod
+    def conversation_key(request: TutorRequest, conversation_id: Optional[str] = None) -> str:
+        """Where the history is kept: the given session's id, else per user and topic"""
+        return conversation_id or f"{request.user_id}_{request.topic}"
     
-    def get_response(self, request: TutorRequest) -> TutorResponse:
-        """Generate AI tutor response using LangChain directly"""
+    def _is_first_turn(self, request: TutorRequest, conversation_id: str) -> bool:
+        """No prior turns from the client or the server, so the reply depends only on topic, level and message"""
+        return not request.conversation_history and not self.conversations.get(conversation_id)
+    
+    def _build_response(self, request: TutorRequest, ai_response: str) -> TutorResponse:
+        """Wrap a reply with suggestions and related concepts"""
+        # Generate suggestions and related concepts
+        suggestions = [
+            f"Ask me more about {request.topic}",
+            "Request practice questions",
+            "Get a lesson overview",
+            "Ask for clarification"
+        ]
         
-        try:
-            # Create conversation context
-            conversation_id = f"{request.user_id}_{request.topic}"
-            
-            if conversation_id not in self.conversations:
-                self.conversations[conversation_id] = []
-            
-            # Add user message to conversation
-            self.conversations[conversation_id].append({
-                "role": "user",
-                "content": request.message
-            })
-            
-            # Generate response using LangChain
-            if LANGCHAIN_AVAILABLE:
-                llm = ChatOpenAI(
-                    model=TUTOR_MODEL,
-                    temperature=TUTOR_TEMPERATURE,
-                    max_tokens=TUTOR_MAX_TOKENS,
-                    openai_api_key=OPENAI_API_KEY
-                )
-                
-                # Create context-aware prompt
-                prompt = f"""
+        related_concepts = [
+            f"Advanced {request.topic} concepts",
+            f"Real-world applications of {request.topic}",
+            f"Common misconceptions about {request.topic}"
+        ]
+        
+        return TutorResponse(
+            response=ai_response,
+            suggestions=suggestions,
+            related_concepts=related_concepts,
+            confidence_score=0.95
+        )
+    
+    def cached_response(self, request: TutorRequest, conversation_id: Optional[str] = None) -> Optional[TutorResponse]:
+        """Answer a first-turn question from the cache, without an LLM call"""
+        conversation_id = self.conversation_key(request, conversation_id)
+        if not self._is_first_turn(request, conversation_id):
+            return None
+        ai_response = self.answer_cache.get(request.topic, request.learning_level, request.message)
+        if ai_response is None:
+            return None
+        self.conversations[conversation_id] = [
+            {"role": "user", "content": request.message},
+            {"role": "assistant", "content": ai_response}
+        ]
+        return self._build_response(request, ai_response)
+    
+    def _start_turn(self, request: TutorRequest, conversation_id: Optional[str] = None):
+        """Record the student's message in the server-side history; returns (conversation_id, first_turn)"""
+        conversation_id = self.conversation_key(request, conversation_id)
+        first_turn = self._is_first_turn(request, conversation_id)
+        history = self.conversations.setdefault(conversation_id, [])
+        history.append({"role": "user", "content": request.message})
+        # Long sessions keep as many turns as a client may upload; only the last few go into the prompt
+        del history[:-MAX_CONVERSATION_TURNS]
+        return conversation_id, first_turn
+    
+    def _finish_turn(self, request: TutorRequest, conversation_id: str, ai_response: str, cacheable: bool) -> TutorResponse:
+        """Record the reply in the history (and the answer cache) and wrap it"""
+        if cacheable:
+            self.answer_cache.put(request.topic, request.learning_level, request.message, ai_response)
+        self.conversations[conversation_id].append({"role": "assistant", "content": ai_response})
+        return self._build_response(request, ai_response)
+    
+    def _budget(self, request: TutorRequest, max_tokens: Optional[int]) -> Optional[int]:
+        budget = output_budgets.max_tokens("tutor_chat", level=request.learning_level)
+        if max_tokens:
+            budget = min(budget, max_tokens) if budget else max_tokens
+        return budget
+    
+    def _prompt(self, request: TutorRequest, conversation_id: str, budget: Optional[int]) -> str:
+        """Create context-aware prompt"""
+        return f"""
                 You are an expert AI tutor specializing in {request.topic}. 
                 The student asks: "{request.message}"
                 
@@ -227,52 +458,88 @@ class SimpleAITutor:
                 2. Uses appropriate difficulty level for {request.learning_level}
                 3. Includes relevant examples and explanations
                 4. Encourages further learning
+                {length_instruction(budget)}
                 
                 Response:
                 """
-                
-                response = llm.invoke(prompt)
-                ai_response = response.content
-                
-            else:
-                # Fallback response if LangChain is not available
-                ai_response = f"I'm here to help you with {request.topic}! Your question: '{request.message}' is important. Let me provide you with a comprehensive explanation..."
-            
-            # Add AI response to conversation
-            self.conversations[conversation_id].append({
-                "role": "assistant",
-                "content": ai_response
-            })
-            
-            # Generate suggestions and related concepts
-            suggestions = [
-                f"Ask me more about {request.topic}",
-                "Request practice questions",
-                "Get a lesson overview",
-                "Ask for clarification"
-            ]
+    
+    def _fallback_reply(self, request: TutorRequest) -> str:
+        """Fallback response if LangChain is not available"""
+        return f"I'm here to help you with {request.topic}! Your question: '{request.message}' is important. Let me provide you with a comprehensive explanation..."
+    
+    def get_response(self, request: TutorRequest, max_tokens: Optional[int] = None) -> TutorResponse:
+        """Generate AI tutor response using LangChain directly (max_tokens shortens the reply under load)"""
+        
+        try:
+            conversation_id, first_turn = self._start_turn(request)
             
-            related_concepts = [
-                f"Advanced {request.topic} concepts",
-                f"Real-world applications of {request.topic}",
-                f"Common misconceptions about {request.topic}"
-            ]
+            # Generate response using LangChain
+            if self.llm is None:
+                return self._finish_turn(request, conversation_id, self._fallback_reply(request), False)
             
-            return TutorResponse(
-                response=ai_response,
-                suggestions=suggestions,
-                related_concepts=related_concepts,
-                confidence_score=0.95
-            )
+            budget = self._budget(request, max_tokens)
+            prompt = self._prompt(request, conversation_id, budget)
+            with span("llm.call", endpoint="tutor_chat", model=TUTOR_MODEL) as call_span:
+                with llm_scheduler.slot("tutor"):
+                    # The student is waiting: a reply cut off at the budget is trimmed, not regenerated
+                    response = output_budgets.run(
+                        "tutor_chat", budget, lambda **limit: llm_scheduler.call(self.llm, prompt, **limit), retry=False
+                    )
+                call_span.set(**llm_usage(response))
+            ai_response = response.content
+            truncated = is_truncated(response)
+            if truncated:
+                ai_response = trim_to_sentence(ai_response)
+            # Shortened replies are not kept for when the service is back to normal
+            return self._finish_turn(request, conversation_id, ai_response, first_turn and not max_tokens and not truncated)
             
         except Exception as e:
-            print(f"Error in AI Tutor: {e}")
-            return TutorResponse(
-                response=f"I apologize, but I encountered an error while processing your request. Please try again or rephrase your question about {request.topic}.",
-                suggestions=["Try rephrasing your question", "Check your internet connection", "Ask a simpler question"],
-                related_concepts=[request.topic],
-                confidence_score=0.1
-            )
+            logger.error(f"Error in AI Tutor: {e}")
+            return self._error_response(request)
+    
+    def stream_response(self, request: TutorRequest, tenant: Optional[str] = None,
+                        max_tokens: Optional[int] = None, conversation_id: Optional[str] = None) -> Iterator[tuple]:
+        """
+        Like get_response, but yields the reply as it is written (blocks, so iterate it off the event loop):
+        ("delta", text) pieces, then ("usage", last chunk with token usage) and ("reply", TutorResponse)
+        """
+        conversation_id, first_turn = self._start_turn(request, conversation_id)
+        if self.llm is None:
+            ai_response = self._fallback_reply(request)
+            yield "delta", ai_response
+            yield "reply", self._finish_turn(request, conversation_id, ai_response, False)
+            return
+        
+        budget = self._budget(request, max_tokens)
+        limit = {"max_tokens": budget} if budget else {}
+        chunks = llm_scheduler.stream(self.llm, self._prompt(request, conversation_id, budget), "tutor", tenant,
+                                      stream_usage=True, **limit)
+        parts, usage_chunk, truncated = [], None, False
+        start = time.perf_counter()
+        try:
+            for chunk in chunks:
+                if getattr(chunk, "usage_metadata", None):
+                    usage_chunk = chunk
+                truncated = truncated or is_truncated(chunk)
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield "delta", chunk.content
+        finally:
+            chunks.close()
+        output_budgets.record("tutor_chat_stream", usage_chunk, time.perf_counter() - start, budget, truncated)
+        ai_response = "".join(parts)
+        if truncated:
+            ai_response = trim_to_sentence(ai_response)
+        yield "usage", usage_chunk
+        yield "reply", self._finish_turn(request, conversation_id, ai_response, first_turn and not max_tokens and not truncated)
+    
+    def _error_response(self, request: TutorRequest) -> TutorResponse:
+        return TutorResponse(
+            response=f"I apologize, but I encountered an error while processing your request. Please try again or rephrase your question about {request.topic}.",
+            suggestions=["Try rephrasing your question", "Check your internet connection", "Ask a simpler question"],
+            related_concepts=[request.topic],
+            confidence_score=0.1
+        )
 
 # Initialize AI Tutor
 ai_tutor = SimpleAITutor()
@@ -281,71 +548,218 @@ ai_tutor = SimpleAITutor()
 grading_agent = None
 mock_exam_grading_agent = None
 
+# Optional pool of API keys / base URLs the LLM clients spread their calls over (LLM_ENDPOINTS)
+llm_pool = LLMPool.from_env(OPENAI_API_KEY)
+if llm_pool and ai_tutor.llm is not None:
+    ai_tutor.llm = llm_pool.bind(ai_tutor.llm)
+
+# Shared model routing policy for all grading calls
+model_router = ModelRouter.from_env()
+
+# Persistent store of past grading results (opened on startup)
+results_store = None
+
+# Resent submissions with the same Idempotency-Key reuse the first grading run
+idempotency_store = IdempotencyStore.from_env()
+
+# Exam sessions grade answers while the student is still writing (created on startup)
+exam_session_manager = None
+
+# Startup, warm-up and shutdown state behind /health/live and /health/ready
+readiness = ServiceReadiness.from_env()
+
+# On-demand sampling profiler for /debug/profile
+profiler = SamplingProfiler.from_env()
+
+# Token-bucket limits per student and per client IP for each endpoint class
+rate_limiter = RateLimiter.from_env()
+
+# Switches endpoints to cheaper modes while the LLM queue is deep or OpenAI is slow
+overload = OverloadController.from_env(llm_scheduler)
+overload.add_listener(lambda level: setattr(model_router, "degraded", level != "normal"))
+
+# In-process stores whose size /debug/memory reports (and the memory alarm logs)
+memory_monitor.register("tutor_conversations", ai_tutor.conversation_stats)
+memory_monitor.register("tutor_answer_cache", lambda: ai_tutor.answer_cache.stats()["entries"])
+memory_monitor.register("tutor_lesson_cache", lambda: ai_tutor.lesson_cache.stats()["entries"])
+memory_monitor.register("idempotency_entries", lambda: len(idempotency_store))
+memory_monitor.register("exam_sessions", lambda: exam_session_manager.stats() if exam_session_manager else None)
+memory_monitor.register("rate_limit_buckets", lambda: rate_limiter.store.stats())
+memory_monitor.register("trace_spans", lambda: len(tracer.buffer.spans()))
+memory_monitor.register("tutor_ws_sessions", lambda: tutor_ws_stats["active"])
+memory_monitor.register("log_queue", lambda: log_pipeline.queue.qsize())
+
+def mark_degraded(response: Response, endpoint: str, mode: str):
+    """Flag a response as served in a degraded mode and count it"""
+    response.headers["X-Degraded-Mode"] = mode
+    overload.record_degraded(f"{endpoint}:{mode}")
+
+def client_ip(http_request: Request) -> Optional[str]:
+    """The caller's IP, from X-Forwarded-For only when configured to trust it"""
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = http_request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return http_request.client.host if http_request.client else None
+
+async def check_rate_limit(endpoint_class: str, student_id: Optional[str], ip: Optional[str]):
+    """rate_limiter.check, in a worker thread when the buckets are in SQLite (its lock wait must not stall the loop)"""
+    if rate_limiter.blocking:
+        return await run_in_threadpool(rate_limiter.check, endpoint_class, student_id, ip)
+    return rate_limiter.check(endpoint_class, student_id, ip)
+
+async def enforce_rate_limit(http_request: Request, endpoint_class: str, student_id: Optional[str],
+                             response: Optional[Response] = None):
+    """Raise 429 with reset headers when the student or IP is over its limit"""
+    decision = await check_rate_limit(endpoint_class, student_id, client_ip(http_request))
+    if decision is None:
+        return
+    if not decision.allowed:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded for {endpoint_class} requests, retry in {decision.headers()['Retry-After']}s",
+            headers=decision.headers()
+        )
+    if response is not None:
+        response.headers.update(decision.headers())
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
-    global grading_agent, mock_exam_grading_agent
+    global grading_agent, mock_exam_grading_agent, results_store, exam_session_manager
     
-    print(f"🔧 GRADING_AVAILABLE: {GRADING_AVAILABLE}")
-    print(f"🔧 OPENAI_API_KEY present: {bool(OPENAI_API_KEY)}")
+    logger.info(
+        f"🔧 GRADING_AVAILABLE: {GRADING_AVAILABLE}, OPENAI_API_KEY present: {bool(OPENAI_API_KEY)}, "
+        f"response encoding: orjson={ORJSON_AVAILABLE}, brotli={BROTLI_AVAILABLE}",
+        extra={"grading_available": GRADING_AVAILABLE, "openai_configured": bool(OPENAI_API_KEY),
+               "orjson": ORJSON_AVAILABLE, "brotli": BROTLI_AVAILABLE}
+    )
     
     if GRADING_AVAILABLE:
         try:
-            print("🚀 Initializing Answer Grading Agent...")
+            logger.info("🚀 Initializing Answer Grading Agent...")
             # Pass grading configuration to the answer grading agent
             grading_agent = AnswerGradingAgent(
                 api_key=OPENAI_API_KEY,
                 model=GRADING_MODEL,
                 temperature=GRADING_TEMPERATURE,
-                max_tokens=GRADING_MAX_TOKENS
+                max_tokens=GRADING_MAX_TOKENS,
+                router=model_router
+            )
+            if llm_pool:
+                grading_agent.llm = llm_pool.bind(grading_agent.llm)
+            logger.info(
+                f"✅ Answer Grading Agent initialized successfully (model {GRADING_MODEL}, "
+                f"temperature {GRADING_TEMPERATURE}, max tokens {GRADING_MAX_TOKENS}, model routing "
+                f"{'enabled' if model_router.enabled else 'disabled'}, small model {model_router.small_model})",
+                extra={"model": GRADING_MODEL, "temperature": GRADING_TEMPERATURE, "max_tokens": GRADING_MAX_TOKENS,
+                       "routing": model_router.enabled, "small_model": model_router.small_model,
+                       "llm_endpoints": [e.name for e in llm_pool.endpoints] if llm_pool else None}
             )
-            print("✅ Answer Grading Agent initialized successfully")
-            print(f"   Model: {GRADING_MODEL}")
-            print(f"   Temperature: {GRADING_TEMPERATURE}")
-            print(f"   Max Tokens: {GRADING_MAX_TOKENS}")
             
             # Initialize mock exam grading agent
             if MockExamGradingAgent:
-                print("🚀 Initializing Mock Exam Grading Agent...")
-                mock_exam_grading_agent = MockExamGradingAgent(api_key=OPENAI_API_KEY)
-                print("✅ Mock Exam Grading Agent initialized successfully")
+                logger.info("🚀 Initializing Mock Exam Grading Agent...")
+                mock_exam_grading_agent = MockExamGradingAgent(api_key=OPENAI_API_KEY, router=model_router)
+                if llm_pool:
+                    mock_exam_grading_agent.llm = llm_pool.bind(mock_exam_grading_agent.llm)
+                exam_session_manager = ExamSessionManager.from_env(mock_exam_grading_agent)
+                logger.info("✅ Mock Exam Grading Agent initialized successfully")
         except Exception as e:
-            print(f"❌ Error initializing grading agent: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"❌ Error initializing grading agent: {e}")
+            readiness.record("grading_agents", False, str(e))
     else:
-        print("⚠️  Grading agent not available - grading endpoints will be disabled")
+        logger.warning("⚠️  Grading agent not available - grading endpoints will be disabled")
+    
+    if RESULTS_STORE_ENABLED:
+        try:
+            results_store = GradingResultsStore.from_env()
+            logger.info(f"✅ Grading results store ready: {results_store.path}")
+        except Exception as e:
+            logger.error(f"❌ Error opening grading results store: {e}")
+            # Grading still works without it: reported, but not a reason to stay out of rotation
+            readiness.record("results_store", False, str(e), required=False)
+    
+    # Serve liveness right away; readiness flips once the LLM connections are warm
+    asyncio.create_task(warm_up())
+    if overload.enabled:
+        asyncio.create_task(monitor_overload())
+    if memory_monitor.enabled:
+        asyncio.create_task(monitor_memory())
+
+async def monitor_overload():
+    """Re-evaluate the overload level until shutdown"""
+    while not readiness.shutting_down:
+        overload.evaluate()
+        await asyncio.sleep(OVERLOAD_CHECK_INTERVAL)
+
+async def monitor_memory():
+    """Sample RSS (and raise the growth alarm) until shutdown"""
+    while not readiness.shutting_down:
+        await run_in_threadpool(memory_monitor.sample)
+        await asyncio.sleep(memory_monitor.sample_seconds)
+
+async def warm_up():
+    """Warm the LLM connection pools off the event loop, retrying failures, then mark the instance ready"""
+    cold = [
+        ("tutor", ai_tutor.llm),
+        ("grading", getattr(grading_agent, "llm", None)),
+        ("mock_exam", getattr(mock_exam_grading_agent, "llm", None))
+    ]
+    while not readiness.shutting_down:
+        cold = [(name, llm) for name, llm in cold if not await run_in_threadpool(readiness.warm_up_llm, name, llm)]
+        if not cold:
+            break
+        logger.warning(f"⚠️ Not ready: retrying warm-up of {', '.join(name for name, _ in cold)} "
+                       f"in {readiness.retry_seconds:g}s")
+        await asyncio.sleep(readiness.retry_seconds)
+    if not readiness.shutting_down:
+        readiness.mark_ready()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush pending writes and stop background grading on shutdown"""
+    readiness.shutting_down = True
+    if traffic_recorder:
+        traffic_recorder.close()
+    if results_store:
+        results_store.close()
+    if exam_session_manager:
+        exam_session_manager.shutdown()
 
 # ===== AI TUTOR ENDPOINTS =====
 
 @app.post("/tutor/chat", response_model=TutorResponse)
-async def chat_with_tutor(request: TutorRequest):
+async def chat_with_tutor(request: TutorRequest, http_request: Request, response: Response):
     """Chat with the AI tutor"""
-    return ai_tutor.get_response(request)
+    await enforce_rate_limit(http_request, "tutor", request.user_id, response)
+    degraded = overload.degraded
+    # Repeated first-turn questions are answered from memory on the event loop
+    cached = ai_tutor.cached_response(request)
+    if cached is not None:
+        if degraded:
+            mark_degraded(response, "tutor", "cache")
+        return cached
+    # Off the event loop: the call may queue behind other students' LLM calls
+    with scheduling_context(tenant=request.user_id or client_ip(http_request)):
+        if degraded:
+            mark_degraded(response, "tutor", "short")
+            return await run_in_threadpool(ai_tutor.get_response, request, OVERLOAD_TUTOR_MAX_TOKENS)
+        return await run_in_threadpool(ai_tutor.get_response, request)
 
-@app.post("/tutor/lesson", response_model=LessonResponse)
-async def create_lesson(request: LessonRequest):
-    """Create a structured lesson"""
-    try:
-        if LANGCHAIN_AVAILABLE:
-            llm = ChatOpenAI(
-                model=TUTOR_MODEL,
-                temperature=0.3,  # Lower temperature for structured content
-                max_tokens=TUTOR_MAX_TOKENS,
-                openai_api_key=OPENAI_API_KEY
-            )
-            
-            prompt = f"""
+def lesson_prompt(request: LessonRequest, max_tokens: Optional[int] = None) -> str:
+    return f"""
             Create a comprehensive lesson on {request.topic} with the following learning objectives:
             {', '.join(request.learning_objectives)}
             
             Difficulty level: {request.difficulty_level}
             
             Provide:
-            1. Lesson content (detailed explanation)
+            1. Lesson content (detailed explanation, in sections separated by blank lines)
             2. Key points (bullet points)
             3. Practice questions (3-5 questions)
             4. Estimated duration in minutes
+            {length_instruction(max_tokens)}
             
             Format as JSON:
             {{
@@ -355,20 +769,64 @@ async def create_lesson(request: LessonRequest):
                 "estimated_duration": 30
             }}
             """
+
+def fallback_lesson(request: LessonRequest) -> LessonResponse:
+    """Lesson returned when the LLM output cannot be salvaged"""
+    return LessonResponse(
+        lesson_content=f"Here's a comprehensive lesson on {request.topic} covering {', '.join(request.learning_objectives)}.",
+        key_points=[f"Understanding {request.topic}", f"Key concepts in {request.topic}", f"Applications of {request.topic}"],
+        practice_questions=[f"What is {request.topic}?", f"How does {request.topic} work?", f"Give examples of {request.topic}"],
+        estimated_duration=45
+    )
+
+def cached_lesson_or_503(request: LessonRequest, http_response: Response) -> LessonResponse:
+    """While overloaded, lessons are the lowest priority work: only previously generated ones are served"""
+    objectives = ", ".join(request.learning_objectives)
+    cached = ai_tutor.lesson_cache.get(request.topic, request.difficulty_level, objectives)
+    if cached is None:
+        overload.record_degraded("lesson:unavailable")
+        raise HTTPException(
+            status_code=503,
+            detail="Lesson generation is paused while the service is under heavy load, please try again shortly",
+            headers={"Retry-After": str(int(overload.recovery_seconds)), "X-Degraded-Mode": "cache-only"}
+        )
+    mark_degraded(http_response, "lesson", "cache-only")
+    return LessonResponse.model_validate_json(cached)
+
+def invoke_lesson(prompt: str, max_tokens: Optional[int], tenant: Optional[str]):
+    """Generate a lesson within its output budget, regenerating once with more room if it was cut off"""
+    with llm_scheduler.slot("lesson", tenant):
+        return output_budgets.run(
+            "tutor_lesson", max_tokens,
+            # Lower temperature for structured content
+            lambda **limit: llm_scheduler.call(ai_tutor.llm, prompt, temperature=0.3, **limit)
+        )
+
+@app.post("/tutor/lesson", response_model=LessonResponse)
+async def create_lesson(request: LessonRequest, http_request: Request, http_response: Response):
+    """Create a structured lesson"""
+    await enforce_rate_limit(http_request, "tutor", None, http_response)
+    objectives = ", ".join(request.learning_objectives)
+    if overload.degraded:
+        return cached_lesson_or_503(request, http_response)
+    try:
+        if ai_tutor.llm is not None:
+            budget = output_budgets.max_tokens("tutor_lesson", level=request.difficulty_level)
+            prompt = lesson_prompt(request, budget)
             
-            response = llm.invoke(prompt)
+            with span("llm.call", endpoint="tutor_lesson", model=TUTOR_MODEL) as call_span:
+                response = await run_in_threadpool(invoke_lesson, prompt, budget, client_ip(http_request))
+                call_span.set(**llm_usage(response))
             
-            try:
-                lesson_data = json.loads(response.content)
-                return LessonResponse(**lesson_data)
-            except json.JSONDecodeError:
-                # Fallback if JSON parsing fails
-                return LessonResponse(
-                    lesson_content=f"Here's a comprehensive lesson on {request.topic} covering {', '.join(request.learning_objectives)}.",
-                    key_points=[f"Understanding {request.topic}", f"Key concepts in {request.topic}", f"Applications of {request.topic}"],
-                    practice_questions=[f"What is {request.topic}?", f"How does {request.topic} work?", f"Give examples of {request.topic}"],
-                    estimated_duration=45
-                )
+            lesson = parse_structured_output(response.content, LessonResponse)
+            if lesson is not None:
+                # A lesson salvaged from cut-off output is served but not reused
+                if not is_truncated(response):
+                    ai_tutor.lesson_cache.put(request.topic, request.difficulty_level, objectives, lesson.model_dump_json())
+                return lesson
+            else:
+                # Fallback if the output cannot be salvaged
+                return fallback_lesson(request)
         else:
             return LessonResponse(
                 lesson_content=f"Lesson on {request.topic} - {', '.join(request.learning_objectives)}",
@@ -378,9 +836,262 @@ async def create_lesson(request: LessonRequest):
             )
             
     except Exception as e:
-        print(f"Error creating lesson: {e}")
+        logger.error(f"Error creating lesson: {e}")
         raise HTTPException(status_code=500, detail="Error creating lesson")
 
+# Lesson array fields and the event type of their items
+LESSON_ITEM_EVENTS = {"key_points": "key_point", "practice_questions": "practice_question"}
+
+def lesson_event(event_type: str, **fields) -> bytes:
+    return (json.dumps({"type": event_type, **fields}, ensure_ascii=False) + "\n").encode("utf-8")
+
+def complete_lesson_events(lesson: LessonResponse):
+    """The events of a lesson that is already complete (served from the cache or as a fallback)"""
+    sections = [section.strip() for section in lesson.lesson_content.split("\n\n") if section.strip()]
+    for index, text in enumerate(sections):
+        yield lesson_event("section", index=index, text=text)
+    for field, event_type in LESSON_ITEM_EVENTS.items():
+        for index, text in enumerate(getattr(lesson, field)):
+            yield lesson_event(event_type, index=index, text=text)
+    yield lesson_event("estimated_duration", value=lesson.estimated_duration)
+    yield lesson_event("complete", lesson=lesson.model_dump())
+
+def parsed_lesson_events(events):
+    """Stream events for the parts of a lesson the incremental parser completed"""
+    for kind, key, index, value in events:
+        if kind == "section":
+            yield lesson_event("section", index=index, text=value)
+        elif kind == "item" and key in LESSON_ITEM_EVENTS:
+            yield lesson_event(LESSON_ITEM_EVENTS[key], index=index, text=value if isinstance(value, str) else json.dumps(value))
+        elif kind == "field" and key == "estimated_duration":
+            yield lesson_event("estimated_duration", value=value)
+
+async def generate_lesson_events(request: LessonRequest, tenant: Optional[str]):
+    """Stream the lesson from the LLM, emitting each section and list item as soon as it is complete"""
+    objectives = ", ".join(request.learning_objectives)
+    parser = IncrementalJSONParser(section_fields=["lesson_content"])
+    budget = output_budgets.max_tokens("tutor_lesson", level=request.difficulty_level)
+    limit = {"max_tokens": budget} if budget else {}
+    chunks = llm_scheduler.stream(ai_tutor.llm, lesson_prompt(request, budget), "lesson", tenant,
+                                  temperature=0.3, stream_usage=True, **limit)
+    usage_chunk = None
+    # Already sent sections cannot be regenerated: a cut-off lesson is completed from what arrived
+    truncated = False
+    start = time.perf_counter()
+    try:
+        with span("llm.call", endpoint="tutor_lesson_stream", model=TUTOR_MODEL) as call_span:
+            async for chunk in iterate_in_threadpool(chunks):
+                if getattr(chunk, "usage_metadata", None):
+                    usage_chunk = chunk
+                truncated = truncated or is_truncated(chunk)
+                for line in parsed_lesson_events(parser.feed(chunk.content or "")):
+                    yield line
+            for line in parsed_lesson_events(parser.close()):
+                yield line
+            call_span.set(**llm_usage(usage_chunk), chars=len(parser.text), truncated=truncated)
+        output_budgets.record("tutor_lesson_stream", usage_chunk, time.perf_counter() - start, budget, truncated)
+    except Exception as e:
+        logger.error(f"Error streaming lesson: {e}")
+        yield lesson_event("error", detail="Error creating lesson")
+        return
+    finally:
+        # Releases the LLM slot if the client went away mid-lesson
+        try:
+            await run_in_threadpool(chunks.close)
+        except ValueError:
+            # Still running in its worker thread; it is closed when collected once that call returns
+            pass
+
+    lesson = parse_structured_output(parser.text, LessonResponse)
+    if lesson is None:
+        yield lesson_event("complete", lesson=fallback_lesson(request).model_dump(), fallback=True)
+        return
+    if truncated:
+        yield lesson_event("complete", lesson=lesson.model_dump(), truncated=True)
+        return
+    ai_tutor.lesson_cache.put(request.topic, request.difficulty_level, objectives, lesson.model_dump_json())
+    yield lesson_event("complete", lesson=lesson.model_dump())
+
+@app.post("/tutor/lesson/stream")
+async def stream_lesson(request: LessonRequest, http_request: Request, http_response: Response):
+    """
+    Create a structured lesson, streamed as newline-delimited JSON events while it is written:
+
+        {"type": "section", "index": 0, "text": "..."}           each lesson_content section
+        {"type": "key_point", "index": 0, "text": "..."}
+        {"type": "practice_question", "index": 0, "text": "..."}
+        {"type": "estimated_duration", "value": 30}
+        {"type": "complete", "lesson": {...}}                     the validated lesson, always last
+                                                                  ("truncated": true if it was cut off)
+        {"type": "error", "detail": "..."}                        instead of complete on failure
+    """
+    await enforce_rate_limit(http_request, "tutor", None, http_response)
+    if overload.degraded:
+        events = complete_lesson_events(cached_lesson_or_503(request, http_response))
+    elif ai_tutor.llm is None:
+        events = complete_lesson_events(fallback_lesson(request))
+    else:
+        events = generate_lesson_events(request, client_ip(http_request))
+    return StreamingResponse(
+        events,
+        media_type="application/x-ndjson",
+        # Rate limit and degraded-mode headers set above, and no proxy buffering so each event arrives as sent
+        headers={**http_response.headers, "Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Open tutor WebSocket sessions and their traffic, for /tutor/health
+tutor_ws_stats = {"active": 0, "sessions": 0, "messages": 0, "bytes_received": 0, "bytes_sent": 0}
+
+async def send_ws(websocket: WebSocket, frame_type: str, **fields):
+    """Send one JSON frame on a tutor session"""
+    text = json.dumps({"type": frame_type, **fields}, ensure_ascii=False)
+    tutor_ws_stats["bytes_sent"] += len(text.encode())
+    await websocket.send_text(text)
+
+async def stream_tutor_reply(websocket: WebSocket, request: TutorRequest, tenant: Optional[str],
+                             conversation_id: str):
+    """Answer one message on a tutor session: delta frames as the reply is written, then the reply"""
+    degraded = overload.degraded
+    cached = ai_tutor.cached_response(request, conversation_id)
+    if cached is not None:
+        if degraded:
+            overload.record_degraded("tutor_ws:cache")
+        await send_ws(websocket, "reply", **cached.model_dump(), cached=True,
+                      **({"degraded_mode": "cache"} if degraded else {}))
+        return
+    max_tokens = None
+    if degraded:
+        overload.record_degraded("tutor_ws:short")
+        max_tokens = OVERLOAD_TUTOR_MAX_TOKENS
+    events = ai_tutor.stream_response(request, tenant, max_tokens, conversation_id)
+    try:
+        with span("llm.call", endpoint="tutor_ws", model=TUTOR_MODEL) as call_span:
+            async for kind, value in iterate_in_threadpool(events):
+                if kind == "delta":
+                    await send_ws(websocket, "delta", text=value)
+                elif kind == "usage":
+                    call_span.set(**llm_usage(value))
+                else:
+                    await send_ws(websocket, "reply", **value.model_dump(), cached=False,
+                                  **({"degraded_mode": "short"} if degraded else {}))
+    finally:
+        # Releases the LLM slot if the client went away mid-reply
+        try:
+            await run_in_threadpool(events.close)
+        except ValueError:
+            # Still running in its worker thread; it is closed when collected once that call returns
+            pass
+
+@app.websocket("/tutor/ws")
+async def tutor_websocket(websocket: WebSocket):
+    """
+    Tutor session over one WebSocket: the conversation history stays on the server, so each
+    message carries only the new text, and replies are streamed as they are written.
+
+    Client frames (JSON text):
+        {"type": "start", "topic": "...", "user_id": "...", "learning_level": "...", "lesson_content": "..."}
+        {"type": "message", "text": "..."}
+        {"type": "ping"}
+    Server frames:
+        {"type": "session", "conversation_id": "...", "turns": 4}    after start; turns already on the server
+        {"type": "delta", "text": "..."}                              reply pieces as they are written
+        {"type": "reply", "response": "...", "suggestions": [...], ...} the full reply, always last for a message
+        {"type": "error", "detail": "...", "retry_after": 3}          the session stays open
+        {"type": "pong"}
+
+    The session settings may also be given as query parameters instead of a start frame. With a
+    user_id the history is the one /tutor/chat keeps for the same user and topic, so a client can switch
+    between the two; anonymous sessions get a history of their own, dropped when the connection closes.
+    """
+    await websocket.accept()
+    # One request id for the whole session's log lines
+    request_id_var.set(new_request_id(websocket.headers.get("x-request-id")))
+    tenant_ip = client_ip(websocket)
+    session: Optional[Dict[str, Optional[str]]] = None
+    conversation_id: Optional[str] = None
+    # Anonymous sessions must not share a "None_<topic>" history with each other
+    connection_id = uuid.uuid4().hex
+    anonymous_conversations = set()
+    tutor_ws_stats["active"] += 1
+    tutor_ws_stats["sessions"] += 1
+
+    async def start(settings: Dict) -> Optional[Dict[str, Optional[str]]]:
+        nonlocal conversation_id
+        if not settings.get("topic"):
+            await send_ws(websocket, "error", detail="A topic is required to start a tutor session")
+            return None
+        started = {
+            "topic": str(settings["topic"]),
+            "user_id": settings.get("user_id"),
+            "learning_level": settings.get("learning_level") or "intermediate",
+            "lesson_content": settings.get("lesson_content")
+        }
+        if started["user_id"]:
+            conversation_id = f"{started['user_id']}_{started['topic']}"
+        else:
+            conversation_id = f"ws-{connection_id}_{started['topic']}"
+            anonymous_conversations.add(conversation_id)
+        await send_ws(websocket, "session", conversation_id=conversation_id,
+                      turns=len(ai_tutor.conversations.get(conversation_id, [])))
+        return started
+
+    try:
+        if websocket.query_params.get("topic"):
+            session = await start(dict(websocket.query_params))
+        while not readiness.shutting_down:
+            try:
+                raw = await asyncio.wait_for(websocket.receive_text(), TUTOR_WS_IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                await websocket.close(code=1000, reason="idle")
+                return
+            tutor_ws_stats["bytes_received"] += len(raw.encode())
+            if len(raw) > TUTOR_WS_MAX_FRAME_BYTES:
+                await websocket.close(code=1009, reason="frame too large")
+                return
+            try:
+                frame = json.loads(raw)
+                frame_type = frame.get("type")
+            except (ValueError, AttributeError):
+                await send_ws(websocket, "error", detail="Frames must be JSON objects")
+                continue
+
+            if frame_type == "ping":
+                await send_ws(websocket, "pong")
+            elif frame_type == "start":
+                session = await start(frame)
+            elif frame_type != "message":
+                await send_ws(websocket, "error", detail=f"Unknown frame type: {frame_type}")
+            elif session is None:
+                await send_ws(websocket, "error", detail="Send a start frame before messages")
+            else:
+                tutor_ws_stats["messages"] += 1
+                decision = await check_rate_limit("tutor", session["user_id"], tenant_ip)
+                if decision is not None and not decision.allowed:
+                    await send_ws(websocket, "error", detail="Rate limit exceeded for tutor requests",
+                                  retry_after=int(decision.headers()["Retry-After"]))
+                    continue
+                try:
+                    request = TutorRequest(message=frame.get("text", ""), **session)
+                except ValidationError as e:
+                    await send_ws(websocket, "error", detail=e.errors(include_url=False, include_context=False))
+                    continue
+                try:
+                    with scheduling_context(tenant=request.user_id or tenant_ip):
+                        await stream_tutor_reply(websocket, request, request.user_id or tenant_ip, conversation_id)
+                except WebSocketDisconnect:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error in AI Tutor session: {e}")
+                    await send_ws(websocket, "error", detail=ai_tutor._error_response(request).response)
+        await websocket.close(code=1001, reason="shutting down")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        tutor_ws_stats["active"] -= 1
+        # Nobody can resume an anonymous session's history
+        for anonymous_id in anonymous_conversations:
+            ai_tutor.conversations.pop(anonymous_id, None)
+
 @app.get("/tutor/health")
 async def tutor_health():
     """Health check for AI Tutor service"""
@@ -388,14 +1099,23 @@ async def tutor_health():
         "status": "healthy",
         "service": "AI Tutor",
         "langchain_available": LANGCHAIN_AVAILABLE,
-        "openai_configured": bool(OPENAI_API_KEY)
+        "openai_configured": bool(OPENAI_API_KEY),
+        "answer_cache": ai_tutor.answer_cache.stats(),
+        "output_budgets": output_budgets.stats(),
+        "websocket": dict(tutor_ws_stats)
     }
 
 # ===== GRADING API ENDPOINTS =====
 
 @app.post("/grade-answer", response_model=GradingResponse)
-async def grade_answer(request: GradingRequest):
+async def grade_answer(
+    request: GradingRequest,
+    http_request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None)
+):
     """Grade a student answer against the model answer"""
+    await enforce_rate_limit(http_request, "grading", request.student_id, response)
     
     if not GRADING_AVAILABLE:
         raise HTTPException(
@@ -423,12 +1143,30 @@ async def grade_answer(request: GradingRequest):
                 detail="Model answer cannot be empty"
             )
         
-        # Grade the answer
-        result = grading_agent.grade_answer(
-            request.question,
-            request.model_answer,
-            request.student_answer
-        )
+        inputs = {"question": request.question, "model_answer": request.model_answer, "student_answer": request.student_answer}
+        
+        async def run_grading():
+            # Grade the answer off the event loop, queued fairly against other students
+            with scheduling_context(tenant=request.student_id or client_ip(http_request)):
+                result = await run_in_threadpool(
+                    grading_agent.grade_answer,
+                    request.question,
+                    request.model_answer,
+                    request.student_answer,
+                    raise_errors=True
+                )
+            if results_store:
+                results_store.save_answer_result(request.student_id, request.question_id, inputs, result)
+            return result
+        
+        # A resent submission reuses the stored (or in-progress) result
+        key = resolve_key(idempotency_key, request.idempotency_key)
+        if key:
+            result, replayed = await idempotency_store.run("grade-answer", key, input_hash(inputs), run_grading)
+            if replayed:
+                response.headers["Idempotent-Replayed"] = "true"
+        else:
+            result = await run_grading()
         
         return GradingResponse(
             success=True,
@@ -436,15 +1174,34 @@ async def grade_answer(request: GradingRequest):
             message="Answer graded successfully"
         )
         
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error during grading: {str(e)}"
         )
 
-@app.post("/grade-mock-exam", response_model=MockExamGradingResponse)
-async def grade_mock_exam(request: MockExamGradingRequest):
+def exam_report_response(http_request: Request, report, compact: bool) -> Response:
+    """Dump an ExamReport straight to JSON; compact mode drops the texts the client already has"""
+    exclude = {"question_grades": {"__all__": ECHOED_QUESTION_FIELDS}} if compact else None
+    content = report.model_dump(exclude=exclude)
+    content["success"] = True
+    content["message"] = "Exam partially graded before the deadline" if report.is_partial else "Exam graded successfully"
+    return json_response(http_request, content)
+
+@app.post("/grade-mock-exam", response_model=MockExamGradingResponse, openapi_extra=openapi_body(MockExamGradingRequest))
+async def grade_mock_exam(
+    http_request: Request,
+    x_request_deadline: Optional[float] = Header(None),
+    idempotency_key: Optional[str] = Header(None)
+):
     """Grade a complete mock exam with all attempted questions"""
+    # Large papers are validated from the raw bytes straight into typed models
+    request = await parse_json_body(http_request, MockExamGradingRequest)
+    await enforce_rate_limit(http_request, "mock_exam", request.student_id)
     
     if not GRADING_AVAILABLE or not mock_exam_grading_agent:
         raise HTTPException(
@@ -460,53 +1217,213 @@ async def grade_mock_exam(request: MockExamGradingRequest):
                 detail="No attempted questions provided"
             )
         
-        print(f"📝 Grading {request.exam_type} mock exam with {len(request.attempted_questions)} questions")
+        logger.info(f"📝 Grading {request.exam_type} mock exam with {len(request.attempted_questions)} questions",
+                    extra={"exam_type": request.exam_type, "questions": len(request.attempted_questions)})
+        questions = [q.to_agent_input() for q in request.attempted_questions]
+        key = resolve_key(idempotency_key, request.idempotency_key)
         
-        # Grade the exam
-        report = mock_exam_grading_agent.grade_exam(request.attempted_questions)
+        # Under critical load, grade in a background exam session instead of holding the request open
+        # (not for idempotent submissions, whose resends must return the same report)
+        if overload.critical and OVERLOAD_DEFER_MOCK_EXAMS and exam_session_manager and not key:
+            deferred = defer_mock_exam(request, questions)
+            if deferred is not None:
+                return deferred
+        degraded = overload.degraded
         
-        # Convert QuestionGrade to QuestionGradeResponse
-        question_grades_response = [
-            QuestionGradeResponse(
-                question_id=g.question_id,
-                question_number=g.question_number,
-                part=g.part,
-                question_text=g.question_text,
-                student_answer=g.student_answer,
-                model_answer=g.model_answer,
-                marks_allocated=g.marks_allocated,
-                marks_awarded=g.marks_awarded,
-                percentage_score=g.percentage_score,
-                feedback=g.feedback,
-                strengths=g.strengths,
-                improvements=g.improvements
-            )
-            for g in report.question_grades
-        ]
-        
-        return MockExamGradingResponse(
-            success=True,
-            total_questions=report.total_questions,
-            questions_attempted=report.questions_attempted,
-            total_marks=report.total_marks,
-            marks_obtained=report.marks_obtained,
-            percentage_score=report.percentage_score,
-            overall_grade=report.overall_grade,
-            question_grades=question_grades_response,
-            overall_feedback=report.overall_feedback,
-            recommendations=report.recommendations,
-            strengths_summary=report.strengths_summary,
-            weaknesses_summary=report.weaknesses_summary,
-            message="Exam graded successfully"
+        # Stop grading once the client has given up (header or body), capped by the server limit
+        deadline = Deadline.from_budget(
+            x_request_deadline or request.deadline_seconds,
+            MOCK_EXAM_DEADLINE_SECONDS
         )
         
+        async def run_grading():
+            # Grade the exam off the event loop so other requests keep being served
+            with scheduling_context(tenant=request.student_id or client_ip(http_request)):
+                report = await run_in_threadpool(
+                    mock_exam_grading_agent.grade_exam,
+                    questions,
+                    deadline,
+                    request.exam_type,
+                    raise_errors=True
+                )
+            if results_store:
+                results_store.save_exam_report(request.student_id, request.exam_type, questions, report)
+            return report
+        
+        # A resent submission reuses the stored (or in-progress) report
+        replayed = False
+        if key:
+            fingerprint = input_hash({
+                "attempted_questions": questions,
+                "exam_type": request.exam_type,
+                "student_id": request.student_id
+            })
+            # A report cut short by the deadline is not replayed: the retry grades the rest
+            report, replayed = await idempotency_store.run("grade-mock-exam", key, fingerprint, run_grading,
+                                                           keep=lambda report: not report.is_partial)
+        else:
+            report = await run_grading()
+        
+        http_response = exam_report_response(http_request, report, request.compact)
+        if replayed:
+            http_response.headers["Idempotent-Replayed"] = "true"
+        if degraded:
+            mark_degraded(http_response, "mock_exam", "small-model")
+        return http_response
+        
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Error during mock exam grading: {e}")
+        logger.error(f"❌ Error during mock exam grading: {e}")
         raise HTTPException(
             status_code=500,
             detail=f"Error during grading: {str(e)}"
         )
 
+def defer_mock_exam(request: MockExamGradingRequest, questions: List[Dict]) -> Optional[Response]:
+    """Queue the questions in a new exam session and return 202 with where to collect the report"""
+    try:
+        session = exam_session_manager.open_session(request.student_id, request.exam_type)
+        for question in questions:
+            exam_session_manager.submit_answer(session.session_id, question)
+    except ExamSessionError as e:
+        logger.warning(f"⚠️  Could not defer mock exam, grading inline: {e}")
+        return None
+    response = JSONResponse(status_code=202, content={
+        "success": True,
+        "deferred": True,
+        "session_id": session.session_id,
+        "status_url": f"/exam-sessions/{session.session_id}",
+        "submit_url": f"/exam-sessions/{session.session_id}/submit",
+        "message": "The service is under heavy load; the exam is being graded in the background"
+    })
+    mark_degraded(response, "mock_exam", "deferred")
+    return response
+
+# ===== INCREMENTAL EXAM SESSION ENDPOINTS =====
+
+def require_exam_sessions() -> ExamSessionManager:
+    """The session manager, or 503 if mock exam grading is unavailable"""
+    if not GRADING_AVAILABLE or not exam_session_manager:
+        raise HTTPException(status_code=503, detail="Mock exam grading service not available")
+    return exam_session_manager
+
+@app.post("/exam-sessions")
+async def open_exam_session(request: ExamSessionRequest, http_request: Request, response: Response):
+    """Open an exam session; answers submitted to it are graded in the background"""
+    manager = require_exam_sessions()
+    # A session is a mock exam's worth of grading: it shares the mock exam limit
+    await enforce_rate_limit(http_request, "mock_exam", request.student_id, response)
+    try:
+        session = manager.open_session(request.student_id, request.exam_type)
+    except ExamSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return {"success": True, "session_id": session.session_id, "exam_type": session.exam_type}
+
+@app.put("/exam-sessions/{session_id}/answers")
+async def submit_exam_session_answer(session_id: str, question: AttemptedQuestion, http_request: Request, response: Response):
+    """Add or update one attempted question (same shape as in /grade-mock-exam); changed answers are regraded"""
+    manager = require_exam_sessions()
+    try:
+        session = manager.get_session(session_id)
+        await enforce_rate_limit(http_request, "grading", session.student_id, response)
+        return {"success": True, **manager.submit_answer(session_id, question.to_agent_input())}
+    except ExamSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@app.delete("/exam-sessions/{session_id}/answers/{question_key}")
+async def remove_exam_session_answer(session_id: str, question_key: str):
+    """Withdraw an answer from the session"""
+    manager = require_exam_sessions()
+    try:
+        removed = manager.remove_answer(session_id, question_key)
+    except ExamSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if not removed:
+        raise HTTPException(status_code=404, detail="Answer not found in session")
+    return {"success": True, "question_key": question_key}
+
+@app.get("/exam-sessions/{session_id}")
+async def get_exam_session(session_id: str):
+    """Grading progress of every answer in the session"""
+    manager = require_exam_sessions()
+    try:
+        return manager.status(session_id)
+    except ExamSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@app.post("/exam-sessions/{session_id}/submit", response_model=MockExamGradingResponse)
+async def submit_exam_session(
+    session_id: str,
+    request: ExamSessionSubmitRequest,
+    http_request: Request,
+    x_request_deadline: Optional[float] = Header(None)
+):
+    """Submit the paper and assemble the ExamReport from the grades computed so far"""
+    manager = require_exam_sessions()
+    deadline = Deadline.from_budget(x_request_deadline or request.deadline_seconds, MOCK_EXAM_DEADLINE_SECONDS)
+    try:
+        session = manager.get_session(session_id)
+        already_submitted = session.report is not None
+        questions = [q.to_agent_input() for q in request.attempted_questions] if request.attempted_questions else None
+        report = await run_in_threadpool(manager.submit, session_id, questions, deadline)
+    except ExamSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    if results_store and not already_submitted:
+        questions = [a.question for a in session.answers.values()]
+        results_store.save_exam_report(session.student_id, session.exam_type, questions, report)
+    
+    return exam_report_response(http_request, report, request.compact)
+
+def require_results_access(x_results_key: Optional[str] = Header(None)):
+    """Stored answers and feedback are only served to callers holding RESULTS_API_KEY (closed when unset)"""
+    if not RESULTS_API_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_results_key or "", RESULTS_API_KEY):
+        raise HTTPException(status_code=403, detail="Invalid results key")
+
+@app.get("/grading/results/{student_id}", dependencies=[Depends(require_results_access)])
+async def get_student_results(
+    student_id: str,
+    http_request: Request,
+    kind: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0
+):
+    """Past grading results for a student, newest first (kind: answer, exam_p1, exam_p2)"""
+    if not results_store:
+        raise HTTPException(status_code=503, detail="Grading results store not available")
+    
+    results = await run_in_threadpool(
+        results_store.results_for_student, student_id, kind, min(max(limit, 1), 100), max(offset, 0)
+    )
+    return json_response(http_request, {"student_id": student_id, "count": len(results), "results": results})
+
+@app.get("/grading/results/{student_id}/questions/{question_id}", dependencies=[Depends(require_results_access)])
+async def get_student_question_results(student_id: str, question_id: str, http_request: Request, limit: int = 20):
+    """Past grading results for a student that include a given question"""
+    if not results_store:
+        raise HTTPException(status_code=503, detail="Grading results store not available")
+    
+    results = await run_in_threadpool(
+        results_store.results_for_question, student_id, question_id, min(max(limit, 1), 100)
+    )
+    return json_response(http_request, {"student_id": student_id, "question_id": question_id, "count": len(results), "results": results})
+
+@app.get("/grading/results/{student_id}/{result_id}", dependencies=[Depends(require_results_access)])
+async def get_student_result(student_id: str, result_id: int, http_request: Request):
+    """A single stored grading result"""
+    if not results_store:
+        raise HTTPException(status_code=503, detail="Grading results store not available")
+    
+    result = await run_in_threadpool(results_store.get_result, result_id)
+    if not result or result["student_id"] != student_id:
+        raise HTTPException(status_code=404, detail="Result not found")
+    return json_response(http_request, result)
+
 @app.get("/grading/health")
 async def grading_health():
     """Health check for grading service"""
@@ -514,9 +1431,91 @@ async def grading_health():
         "status": "healthy" if GRADING_AVAILABLE else "unavailable",
         "grading_agent_ready": grading_agent is not None,
         "mock_exam_grading_agent_ready": mock_exam_grading_agent is not None,
+        "model_routing": model_router.stats(),
+        "output_budgets": output_budgets.stats(),
+        "local_scoring": mock_exam_grading_agent.local_scorer.stats() if mock_exam_grading_agent else None,
+        "results_store": await run_in_threadpool(results_store.stats) if results_store else None,
+        "idempotency": idempotency_store.stats(),
+        "exam_sessions": exam_session_manager.stats() if exam_session_manager else None,
+        "rate_limits": await run_in_threadpool(rate_limiter.stats),
+        "llm_scheduler": llm_scheduler.stats(),
+        "llm_pool": llm_pool.stats() if llm_pool else None,
         "service": "Answer Grading API"
     }
 
+# ===== DEBUG ENDPOINTS =====
+
+def require_debug_access(x_debug_key: Optional[str] = Header(None)):
+    """Hide /debug/* unless ENABLE_DEBUG is on and DEBUG_API_KEY is set, and check the key"""
+    # Fail closed: the profiler and tracemalloc must not be open to anyone who can reach the service
+    if not ENABLE_DEBUG or not DEBUG_API_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_debug_key or "", DEBUG_API_KEY):
+        raise HTTPException(status_code=403, detail="Invalid debug key")
+
+@app.get("/debug/traces", dependencies=[Depends(require_debug_access)])
+async def list_traces(limit: int = 20, name: Optional[str] = None):
+    """Recent request traces as span waterfalls, optionally filtered by path or root span name"""
+    return {
+        "enabled": tracer.enabled,
+        "traces": tracer.traces(limit=max(1, min(limit, 200)), name=name)
+    }
+
+@app.get("/debug/traces/{trace_id}", dependencies=[Depends(require_debug_access)])
+async def get_trace(trace_id: str):
+    """One trace as a span waterfall"""
+    trace = tracer.trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+@app.get("/debug/profile", dependencies=[Depends(require_debug_access)])
+async def profile_live_traffic(seconds: float = 10, interval_ms: Optional[float] = None,
+                               include_idle: bool = False, format: str = "collapsed"):
+    """
+    Sample live traffic for a number of seconds and return the profile
+
+    format=collapsed returns folded stacks for flamegraph.pl or speedscope;
+    format=json wraps them with the sampling statistics.
+    """
+    if format not in ("collapsed", "json"):
+        raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'json'")
+    try:
+        result = await run_in_threadpool(profiler.profile, seconds, interval_ms, include_idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "json":
+        return result
+    return PlainTextResponse(result["collapsed"] + "\n", headers={
+        "X-Profile-Samples": str(result["samples"]),
+        "X-Profile-Seconds": str(result["seconds"])
+    })
+
+@app.get("/debug/memory", dependencies=[Depends(require_debug_access)])
+async def memory_report(objects: bool = False, points: int = 120):
+    """
+    RSS history, in-process store sizes and the memory alarm
+
+    objects=true adds instance counts per type (walks every object, so it pauses the process briefly).
+    """
+    return await run_in_threadpool(memory_monitor.report, objects, max(2, min(points, 1440)))
+
+@app.post("/debug/memory/snapshot", dependencies=[Depends(require_debug_access)])
+async def memory_snapshot(limit: int = 25, group_by: str = "lineno"):
+    """
+    Take a tracemalloc snapshot and return the allocation sites that grew most since the previous one
+
+    The first call starts tracemalloc and takes the baseline; call again after some traffic to see the diff.
+    """
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="group_by must be 'lineno', 'filename' or 'traceback'")
+    return await run_in_threadpool(memory_monitor.snapshot_diff, max(1, min(limit, 200)), group_by)
+
+@app.delete("/debug/memory/snapshot", dependencies=[Depends(require_debug_access)])
+async def stop_memory_tracing():
+    """Stop tracemalloc, which slows every allocation while it runs"""
+    return {"stopped": memory_monitor.stop_tracemalloc()}
+
 # ===== UNIFIED ENDPOINTS =====
 
 @app.get("/")
@@ -531,6 +1530,8 @@ async def root():
                 "endpoints": {
                     "chat": "/tutor/chat",
                     "lesson": "/tutor/lesson",
+                    "lesson_stream": "/tutor/lesson/stream",
+                    "websocket": "/tutor/ws",
                     "health": "/tutor/health"
                 }
             },
@@ -538,19 +1539,85 @@ async def root():
                 "status": "available" if GRADING_AVAILABLE else "unavailable",
                 "endpoints": {
                     "grade_answer": "/grade-answer",
+                    "grade_mock_exam": "/grade-mock-exam",
+                    "exam_sessions": "/exam-sessions",
+                    "results": "/grading/results/{student_id}",
                     "health": "/grading/health"
                 }
+            },
+            "debug": {
+                "status": "available" if ENABLE_DEBUG and DEBUG_API_KEY else "disabled",
+                "endpoints": {
+                    "traces": "/debug/traces",
+                    "profile": "/debug/profile"
+                }
             }
         },
+        "health": {
+            "live": "/health/live",
+            "ready": "/health/ready"
+        },
         "port": 8000,
         "documentation": "/docs"
     }
 
+def degradation_state() -> List[str]:
+    """Reasons this instance is serving with reduced functionality"""
+    reasons = []
+    if not GRADING_AVAILABLE or not grading_agent:
+        reasons.append("grading_unavailable")
+    if not mock_exam_grading_agent:
+        reasons.append("mock_exam_grading_unavailable")
+    if RESULTS_STORE_ENABLED and not results_store:
+        reasons.append("results_store_unavailable")
+    reasons.extend(f"{name}_failed" for name in readiness.failed_components())
+    if overload.degraded:
+        reasons.append(f"overload_{overload.level}")
+    return reasons
+
+def queue_depths() -> Dict[str, int]:
+    """Work waiting inside this instance"""
+    return {
+        "llm_calls_waiting": llm_scheduler.queue_depth(),
+        "exam_questions_grading": exam_session_manager.stats()["questions_grading"] if exam_session_manager else 0,
+        "results_pending_writes": results_store.pending_writes() if results_store else 0
+    }
+
+@app.get("/health/live")
+async def liveness_probe():
+    """Liveness: the process is up and the event loop is responding"""
+    return readiness.liveness()
+
+@app.get("/health/ready")
+async def readiness_probe(response: Response):
+    """Readiness: agents constructed and LLM connections warmed; 503 while starting, failed or shutting down"""
+    degradation = degradation_state()
+    if not readiness.ready:
+        response.status_code = 503
+    return {
+        "status": readiness.state(),
+        "ready": readiness.ready,
+        "degraded": bool(degradation),
+        "degradation": degradation,
+        "uptime_seconds": readiness.uptime_seconds(),
+        "ready_at": iso_timestamp(readiness.ready_at) if readiness.ready_at else None,
+        "not_ready_reasons": readiness.not_ready_reasons(),
+        "queue_depth": queue_depths(),
+        "components": readiness.components,
+        "timestamp": iso_timestamp()
+    }
+
 @app.get("/health")
 async def unified_health():
     """Unified health check for all services"""
+    degradation = degradation_state()
     return {
-        "status": "healthy",
+        "status": readiness.state() if not readiness.ready else ("degraded" if degradation else "healthy"),
+        "uptime_seconds": readiness.uptime_seconds(),
+        "degradation": degradation,
+        "overload": overload.stats(),
+        "logging": log_pipeline.stats(),
+        "memory": memory_monitor.summary(),
         "services": {
             "ai_tutor": {
                 "status": "healthy",
@@ -562,14 +1629,14 @@ async def unified_health():
                 "agent_ready": grading_agent is not None
             }
         },
-        "timestamp": "2025-08-22T22:45:00Z"
+        "timestamp": iso_timestamp()
     }
 
 if __name__ == "__main__":
     print("🚀 Starting Unified Backend Service...")
     print("📚 AI Tutor endpoints: /tutor/*")
     print("📊 Grading endpoints: /grade-answer, /grading/health")
-    print("🔍 Health checks: /health, /tutor/health, /grading/health")
+    print("🔍 Health checks: /health, /health/live, /health/ready, /tutor/health, /grading/health")
     print("📖 Documentation: http://localhost:8000/docs")
     print("🌐 Server: http://localhost:8000")
     
@@ -577,5 +1644,7 @@ if __name__ == "__main__":
         app, 
         host=HOST, 
         port=PORT,
-        log_level=LOG_LEVEL.lower()
+        log_level=LOG_LEVEL.lower(),
+        # Server and access logs go through the same queue-backed JSON pipeline
+        log_config=None
     )